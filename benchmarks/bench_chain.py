@@ -0,0 +1,49 @@
+"""Measure per-edge scheduling overhead of Runner.launch on a deep chain.
+
+Every stage in the chain is a no-op, so the wall time of the run is almost
+entirely scheduler overhead: the time between a parent finishing and its
+child being submitted, plus the pool round-trip.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_chain.py --length 200 -j 2
+"""
+
+import argparse
+import time
+
+from dag import runner
+
+
+def make_chain(length: int) -> dict:
+    """Return a merged-style dict describing a linear chain of no-op stages."""
+    stages = {}
+    for i in range(length):
+        stages[f"chain:{i}"] = {
+            "command": {},
+            "post": {},
+            "before": [],
+            "after": [f"chain:{i - 1}"] if i else [],
+        }
+    return stages
+
+
+def main():
+    """Run the chain benchmark and print the per-edge overhead."""
+    par = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    par.add_argument("--length", "-n", type=int, default=200, help="Number of stages in the chain")
+    par.add_argument("--max_workers", "-j", type=int, default=2, help="Number of parallel workers")
+    args = par.parse_args()
+
+    dag = runner.Runner.create_from_dict(make_chain(args.length))
+    start = time.perf_counter()
+    dag.launch(max_workers=args.max_workers)
+    elapsed = time.perf_counter() - start
+
+    edges = max(args.length - 1, 1)
+    print(f"stages={args.length} workers={args.max_workers} "
+          f"total={elapsed:.3f}s per_edge={elapsed / edges * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""Benchmark merge, load and scheduling on synthetic DAGs, writing the results as JSON.
+
+Each case generates stage templates and targets of a given shape, then measures,
+in a fresh process so memory figures do not leak between cases:
+
+- ``merge_s``: Builder.build of the templates and targets
+- ``write_s``/``load_s``: writing the merged DAG as indexed JSON Lines and loading it back
+- ``graph_s``: Runner.create_from_dict
+- ``peak_rss_mb``: peak RSS of the process after merge and load
+- ``launch_s``, ``per_node_ms``: wall time of Runner.launch and its share per node;
+  with ``--sleep 0`` stages have no command, so this is pure scheduler and pool overhead
+- ``ideal_s``, ``efficiency``: lower bound of the makespan for ``-j`` workers,
+  max(critical path, nodes / workers) times the stage duration, over the observed one
+
+Shapes (``name:AxB``):
+
+- ``chain:N``: N stages in a line
+- ``fanout:N``: one stage with N children
+- ``diamond:N``: N diamonds in series, each a fork into two stages and a join
+- ``layered:LxW``: L layers of W stages, each depending on up to 3 random stages
+  of the layer before
+- ``matrix:TxS``: T targets of S stages each, the flow of one target chained with
+  a skip edge every third stage, e.g. ``matrix:50000x20`` for 1M nodes
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_dag.py --suite quick -o bench.json
+    PYTHONPATH=src python benchmarks/bench_dag.py --case matrix:50000x20 --max-run-nodes 0
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from dag import builder, runner, store
+
+Workload = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+
+SUITES = {
+    "quick": ["chain:1000", "fanout:10000", "diamond:1000", "layered:20x100", "matrix:1000x10"],
+    "full": [
+        "chain:10000", "fanout:100000", "diamond:10000", "layered:100x1000",
+        "matrix:10000x20", "matrix:50000x20",
+    ],
+}
+
+
+def template(after: List[str], sleep: float) -> Dict[str, Any]:
+    """Return a stage template running ``sleep`` seconds, or nothing for 0."""
+    info: Dict[str, Any] = {"variables": {"DIR": "."}, "after": after}
+    if sleep:
+        info["run"] = {"directory": "${DIR}", "command": f"sleep {sleep}"}
+    return info
+
+
+def chain(length: int, sleep: float) -> Workload:
+    """N stages in a line."""
+    stages = {f"S{i}": template([f"S{i - 1}"] if i else [], sleep) for i in range(length)}
+    return stages, [{"target": "chain"}]
+
+
+def fanout(width: int, sleep: float) -> Workload:
+    """One stage with N children."""
+    stages = {"root": template([], sleep)}
+    stages.update({f"S{i}": template(["root"], sleep) for i in range(width)})
+    return stages, [{"target": "fanout"}]
+
+
+def diamond(count: int, sleep: float) -> Workload:
+    """N diamonds in series: fork into two stages, then join."""
+    stages = {"J0": template([], sleep)}
+    for i in range(count):
+        stages[f"L{i}"] = template([f"J{i}"], sleep)
+        stages[f"R{i}"] = template([f"J{i}"], sleep)
+        stages[f"J{i + 1}"] = template([f"L{i}", f"R{i}"], sleep)
+    return stages, [{"target": "diamond"}]
+
+
+def layered(layers: int, width: int, sleep: float) -> Workload:
+    """L layers of W stages, each depending on up to 3 random stages of the previous layer."""
+    rng = random.Random(layers * 1000003 + width)
+    stages = {}
+    for layer in range(layers):
+        for i in range(width):
+            parents = []
+            if layer:
+                parents = [f"N{layer - 1}_{j}" for j in sorted(set(
+                    rng.randrange(width) for _ in range(3)))]
+            stages[f"N{layer}_{i}"] = template(parents, sleep)
+    return stages, [{"target": "layered"}]
+
+
+def matrix(targets: int, stages_per_target: int, sleep: float) -> Workload:
+    """T targets of the same S-stage flow: a chain with a skip edge every third stage."""
+    stages = {}
+    for i in range(stages_per_target):
+        after = [f"S{i - 1}"] if i else []
+        if i >= 2 and i % 3 == 0:
+            after.append(f"S{i - 2}")
+        stages[f"S{i}"] = template(after, sleep)
+    return stages, [{"target": f"T{t}"} for t in range(targets)]
+
+
+GENERATORS: Dict[str, Callable[..., Workload]] = {
+    "chain": chain, "fanout": fanout, "diamond": diamond, "layered": layered, "matrix": matrix,
+}
+
+
+def parse_case(case: str) -> Tuple[str, List[int]]:
+    """Split a ``name:AxB`` case into its shape and sizes."""
+    name, _, size = case.partition(":")
+    if name not in GENERATORS:
+        raise ValueError(f"Unknown shape '{name}', expected one of {', '.join(GENERATORS)}")
+    try:
+        sizes = [int(n) for n in size.split("x")]
+    except ValueError:
+        raise ValueError(f"Invalid size in case '{case}'") from None
+    expected = GENERATORS[name].__code__.co_argcount - 1
+    if len(sizes) != expected:
+        raise ValueError(f"Case '{case}' needs {expected} sizes")
+    return name, sizes
+
+
+def generate(case: str, sleep: float) -> Workload:
+    """Return the templates and targets of a ``name:AxB`` case."""
+    name, sizes = parse_case(case)
+    return GENERATORS[name](*sizes, sleep)
+
+
+def critical_path(graph) -> int:
+    """Return the number of stages on the longest path of the graph."""
+    depth = [1] * len(graph)
+    for i in graph.order:
+        for child in graph.children(i):
+            depth[child] = max(depth[child], depth[i] + 1)
+    return max(depth, default=0)
+
+
+def peak_rss_mb() -> float:
+    """Return this process's peak RSS in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(case: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one case and return its measurements."""
+    result: Dict[str, Any] = {"case": case, "workers": args.max_workers, "sleep": args.sleep,
+                              "engine": args.engine}
+    templates, targets = generate(case, args.sleep)
+
+    start = time.perf_counter()
+    merged = builder.Builder(templates, targets).build()
+    result["merge_s"] = time.perf_counter() - start
+    result["nodes"] = len(merged)
+    del templates, targets
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "merged.jsonl")
+        start = time.perf_counter()
+        store.write(path, merged, store.JSONL)
+        result["write_s"] = time.perf_counter() - start
+        del merged
+        start = time.perf_counter()
+        merged = store.load(path)
+        result["load_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dag = runner.Runner.create_from_dict(merged)
+    result["graph_s"] = time.perf_counter() - start
+    result["edges"] = len(dag.graph.child_ids)
+    result["critical_path"] = critical_path(dag.graph)
+    result["peak_rss_mb"] = peak_rss_mb()
+    del merged
+
+    nodes = result["nodes"]
+    result.update(launch_s=None, per_node_ms=None, ideal_s=None, efficiency=None)
+    if nodes > args.max_run_nodes:
+        return result
+    start = time.perf_counter()
+    summary = dag.launch(max_workers=args.max_workers, engine=args.engine)
+    launch = time.perf_counter() - start
+    result.update(launch_s=launch, per_node_ms=launch / nodes * 1000, summary=summary)
+    if args.sleep:
+        ideal = max(result["critical_path"], math.ceil(nodes / args.max_workers)) * args.sleep
+        result.update(ideal_s=ideal, efficiency=ideal / launch)
+    return result
+
+
+def _child(case: str, args: argparse.Namespace, conn) -> None:
+    try:
+        conn.send(measure(case, args))
+    except Exception as e:  # pylint: disable=broad-except
+        conn.send({"case": case, "error": repr(e)})
+    conn.close()
+
+
+def run_case(case: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Measure a case in a child process of its own."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_child, args=(case, args, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {"case": case, "error": "benchmark process died"}
+    process.join()
+    return result
+
+
+def environment() -> Dict[str, Any]:
+    """Describe where the benchmark ran, to tell comparable results apart."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _format(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def main():
+    """Run the selected cases and write their results as JSON."""
+    par = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    par.add_argument("--suite", choices=sorted(SUITES), help="Predefined list of cases")
+    par.add_argument("--case", action="append", default=[],
+                     help="Case as shape:AxB, e.g. layered:20x100; may be repeated")
+    par.add_argument("--max_workers", "-j", type=int, default=4, help="Number of workers")
+    par.add_argument("--engine", choices=["process", "async"], default="process",
+                     help="Execution engine used for the launch")
+    par.add_argument("--sleep", type=float, default=0.0,
+                     help="Seconds each stage sleeps; 0 runs no command at all")
+    par.add_argument("--max-run-nodes", type=int, default=20000,
+                     help="Only merge and load cases with more nodes than this, without launching")
+    par.add_argument("--output", "-o", help="JSON file to write the results to")
+    args = par.parse_args()
+
+    cases = list(SUITES[args.suite]) if args.suite else []
+    cases += args.case
+    if not cases:
+        cases = SUITES["quick"]
+    for case in cases:
+        try:
+            parse_case(case)
+        except ValueError as e:
+            par.error(str(e))
+
+    columns = ["case", "nodes", "merge_s", "load_s", "graph_s", "peak_rss_mb",
+               "launch_s", "per_node_ms", "efficiency"]
+    print(" ".join(f"{c:>14}" for c in columns))
+    results = []
+    for case in cases:
+        result = run_case(case, args)
+        results.append(result)
+        if "error" in result:
+            print(f"{case:>14} error: {result['error']}", file=sys.stderr)
+            continue
+        print(" ".join(f"{_format(result.get(c)):>14}" for c in columns))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Adaptive concurrency: the number of stages dispatched at once follows the load of this host.
+
+Every few seconds the load average, CPU utilization and iowait (``/proc/loadavg``,
+``/proc/stat``) and available memory (``/proc/meminfo``) are sampled. The limit is
+raised by one while the machine is idle and every slot is in use, and lowered by a
+quarter while it is overloaded; between the two thresholds it is held, and a change
+needs the same verdict on consecutive samples, so it does not oscillate. Below a
+floor of available memory dispatch is paused altogether until memory recovers past
+the floor.
+"""
+
+import os
+import time
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from . import logger as lg
+
+logger = lg.get_logger(__name__)
+
+# Seconds between samples.
+INTERVAL = 2.0
+# Consecutive samples with the same verdict needed to change the limit.
+SETTLE = 2
+# Raise while below all of these: busy CPU share, 1-minute load per CPU, iowait share...
+RAISE_BUSY = 0.75
+RAISE_LOAD = 1.0
+RAISE_IOWAIT = 0.10
+# ...and while more than this share of memory is available.
+RAISE_MEMORY = 0.20
+# Lower when any of these is exceeded, or less than LOWER_MEMORY of memory is available.
+LOWER_LOAD = 1.5
+LOWER_IOWAIT = 0.25
+LOWER_MEMORY = 0.10
+# Dispatch resumes once available memory is this factor above the floor.
+RESUME_FACTOR = 1.25
+
+
+class Sample(NamedTuple):
+    """System state at one point in time; shares are over the time since the previous sample."""
+    load: float
+    busy: float
+    iowait: float
+    mem_available: int
+    mem_total: int
+
+
+class SystemMonitor:
+    """Reads the load and memory of this host from ``/proc``."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, proc: str = "/proc", cpus: Optional[int] = None):
+        self.proc = proc
+        self.cpus = cpus or os.cpu_count() or 1
+        self._times = self._cpu_times()
+
+    def _read(self, name: str) -> str:
+        with open(os.path.join(self.proc, name), encoding="ascii") as f:
+            return f.read()
+
+    def _cpu_times(self) -> Tuple[int, int, int]:
+        """Return the total, idle and iowait jiffies of all CPUs."""
+        fields = [int(v) for v in self._read("stat").split("\n", 1)[0].split()[1:]]
+        idle, iowait = fields[3], fields[4]
+        return sum(fields), idle, iowait
+
+    def sample(self) -> Sample:
+        """Return the current load per CPU, CPU shares since the last sample, and memory."""
+        load = float(self._read("loadavg").split()[0]) / self.cpus
+        times = self._cpu_times()
+        total, idle, iowait = (now - before for now, before in zip(times, self._times))
+        self._times = times
+        memory = {}
+        for line in self._read("meminfo").splitlines():
+            key, _, value = line.partition(":")
+            if key in ("MemTotal", "MemAvailable"):
+                memory[key] = int(value.split()[0]) * 1024
+        total = max(total, 1)
+        return Sample(
+            load=load,
+            busy=1.0 - (idle + iowait) / total,
+            iowait=iowait / total,
+            mem_available=memory["MemAvailable"],
+            mem_total=memory["MemTotal"],
+        )
+
+
+class AdaptiveLimit:
+    """Number of stages to run at once, moved between a minimum and maximum by system load."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        min_workers: int,
+        max_workers: int,
+        mem_floor: int = 0,
+        interval: float = INTERVAL,
+        monitor: Optional[SystemMonitor] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        :param min_workers: Lowest limit, also the starting one.
+        :param max_workers: Highest limit.
+        :param mem_floor: Pause dispatch while fewer bytes of memory are available.
+        :param interval: Seconds between samples.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        if not 1 <= min_workers <= max_workers:
+            raise ValueError(f"Invalid adaptive range {min_workers}..{max_workers}")
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.mem_floor = mem_floor
+        self.interval = interval
+        self.monitor = monitor or SystemMonitor()
+        self.clock = clock
+        self.limit = min_workers
+        self.paused = False
+        # Consecutive samples asking to raise (positive) or lower (negative) the limit.
+        self._streak = 0
+        self._due = clock() + interval
+
+    def current(self, running: int) -> int:
+        """
+        Return the number of stages that may run now, given the number running,
+        sampling the system when due.
+        """
+        if self.clock() >= self._due:
+            self._due = self.clock() + self.interval
+            self.update(self.monitor.sample(), running)
+        return 0 if self.paused else self.limit
+
+    @staticmethod
+    def _verdict(sample: Sample) -> int:
+        """Return 1 to raise the limit, -1 to lower it, 0 to hold it."""
+        memory = sample.mem_available / max(sample.mem_total, 1)
+        if sample.load > LOWER_LOAD or sample.iowait > LOWER_IOWAIT or memory < LOWER_MEMORY:
+            return -1
+        if (sample.busy < RAISE_BUSY and sample.load < RAISE_LOAD
+                and sample.iowait < RAISE_IOWAIT and memory > RAISE_MEMORY):
+            return 1
+        return 0
+
+    def update(self, sample: Sample, running: int) -> None:
+        """
+        Adjust the limit and the pause to a new sample. The limit is only raised
+        while ``running`` fills it and dispatch is not paused, so an idle phase does not
+        open the way to a burst.
+        """
+        state = (f"load {sample.load:.2f}/CPU, busy {sample.busy:.0%}, "
+                 f"iowait {sample.iowait:.0%}, {sample.mem_available / 2**30:.1f} GiB available")
+        if not self.paused and sample.mem_available < self.mem_floor:
+            self.paused = True
+            logger.warning("Pausing dispatch: %s, below the %.1f GiB floor",
+                           state, self.mem_floor / 2**30)
+        elif self.paused and sample.mem_available >= self.mem_floor * RESUME_FACTOR:
+            self.paused = False
+            logger.warning("Resuming dispatch: %s", state)
+
+        verdict = self._verdict(sample)
+        if verdict > 0 and (self.paused or running < self.limit):
+            verdict = 0
+        if verdict == 0 or verdict * self._streak < 0:
+            self._streak = verdict
+        else:
+            self._streak += verdict
+        if abs(self._streak) < SETTLE:
+            return
+        self._streak = 0
+        if verdict > 0:
+            limit = min(self.limit + 1, self.max_workers)
+        else:
+            limit = max(self.limit - max(1, self.limit // 4), self.min_workers)
+        if limit != self.limit:
+            logger.warning("Concurrency %d -> %d: %s", self.limit, limit, state)
+            self.limit = limit
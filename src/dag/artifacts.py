@@ -0,0 +1,244 @@
+"""
+Shared content-addressed cache of stage outputs, enabled with ``--artifact-cache``.
+
+A stage that declares output files (``outputs``, and its post ``output``) is keyed by
+a hash of its resolved run and post commands, its declared output paths and the
+content of its declared inputs.
+Paths enter the key and the cache relative to the stage's directory, so targets that
+run the same commands on identical inputs in their own directories share entries.
+After a stage succeeds its outputs are stored under its key; a stage whose key is
+stored has its outputs restored instead of running.
+
+The cache directory may be shared by concurrent processes and hosts, e.g. on NFS:
+
+- ``entries/<key[:2]>/<key>/``: ``manifest.json`` with the output paths and their
+  total size, and the files, named by their position in the manifest
+- ``tmp/``: entries being written or removed
+
+An entry appears by renaming a complete directory into place and disappears by
+renaming it out first, so readers never see half an entry. Every hit touches the
+manifest; eviction removes the least recently used entries beyond the size limit.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import logger as lg
+from .merge_cache import digest
+from .stamps import expand_inputs, hash_file
+
+logger = lg.get_logger(__name__)
+
+# Bump when the key or entry layout changes so stale entries are not reused.
+CACHE_VERSION = 2
+MANIFEST = "manifest.json"
+# Leftovers of writers that died are removed after this many seconds.
+STALE_SECONDS = 24 * 3600
+
+
+class ArtifactCache:
+    """Stage outputs by key, with hit/miss counters for the run summary."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: Optional[int] = None,
+        workdir: Optional[str] = None
+    ):
+        """
+        :param directory: Cache directory.
+        :param max_bytes: Size evict() trims the cache to.
+        :param workdir: Directory relative stage paths are found from (default: the current one).
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workdir = workdir
+        self.entries = os.path.join(directory, "entries")
+        self.tmp = os.path.join(directory, "tmp")
+        os.makedirs(self.entries, exist_ok=True)
+        os.makedirs(self.tmp, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    @staticmethod
+    def base(node) -> str:
+        """Return the directory a node's paths are stored relative to."""
+        return node.command.get("directory") or node.post.get("directory") or "."
+
+    def _path(self, path: str) -> str:
+        """Return a stage path as found from the working directory."""
+        return os.path.join(self.workdir, path) if self.workdir else path
+
+    @staticmethod
+    def outputs(node, mode: str) -> List[str]:
+        """Return the output paths or globs a node declares for ``mode``."""
+        paths = list(node.outputs) if mode != "post" else []
+        output = node.post.get("output")
+        if output and mode != "command":
+            paths.append(os.path.join(node.post.get("directory", ""), output))
+        return paths
+
+    def key(self, node, mode: str) -> Optional[str]:
+        """
+        Return a node's cache key: a hash of the commands run for ``mode``, the
+        output paths it declares and the content of its declared inputs. None if the
+        node declares no outputs.
+        """
+        declared = self.outputs(node, mode)
+        if not declared:
+            return None
+        run = node.command.get("command", "") if mode != "post" else ""
+        post = node.post.get("command", "") if mode != "command" else ""
+        base = self._path(self.base(node))
+        outputs = sorted(os.path.relpath(self._path(path), base) for path in declared)
+        inputs = []
+        for path in expand_inputs(node.inputs, self.workdir):
+            path = self._path(path)
+            try:
+                state = hash_file(path) if os.path.isfile(path) else "missing"
+            except OSError:
+                state = "missing"
+            inputs.append((os.path.relpath(path, base), state))
+        return digest([CACHE_VERSION, run, post, outputs, inputs])
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.entries, key[:2], key)
+
+    def restore(self, node, key: str) -> bool:
+        """Copy the stored outputs of ``key`` into the node's directory; False on a miss."""
+        entry = self._entry(key)
+        manifest = os.path.join(entry, MANIFEST)
+        base = self._path(self.base(node))
+        try:
+            with open(manifest, encoding="utf-8") as f:
+                files = json.load(f)["files"]
+            for i, relative in enumerate(files):
+                _copy(os.path.join(entry, str(i)), os.path.normpath(os.path.join(base, relative)))
+            os.utime(manifest)
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Cannot restore %s from the artifact cache: %s", node.name, e)
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def _files(self, node, mode: str) -> Optional[List[str]]:
+        """Return the files matching the node's declared outputs, None if one is missing."""
+        files = []
+        for path in expand_inputs(self.outputs(node, mode), self.workdir):
+            path = self._path(path)
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    files.extend(os.path.join(root, name) for name in sorted(names))
+            elif os.path.isfile(path):
+                files.append(path)
+            else:
+                return None
+        return files
+
+    def store(self, node, mode: str, key: str) -> None:
+        """Store the outputs of a node that succeeded under ``key``."""
+        entry = self._entry(key)
+        if os.path.isdir(entry):
+            return
+        files = self._files(node, mode)
+        if files is None:
+            logger.info("Not caching %s: a declared output is missing", node.name)
+            return
+        base = self._path(self.base(node))
+        tmp = tempfile.mkdtemp(prefix=f"{key}.", dir=self.tmp)
+        try:
+            size = 0
+            for i, path in enumerate(files):
+                shutil.copyfile(path, os.path.join(tmp, str(i)))
+                shutil.copymode(path, os.path.join(tmp, str(i)))
+                size += os.path.getsize(path)
+            with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump({"files": [os.path.relpath(p, base) for p in files], "size": size}, f)
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # Another process stored the same key first.
+                return
+            self.stored += 1
+        except OSError as e:
+            logger.warning("Cannot store %s in the artifact cache: %s", node.name, e)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """Return (last use, size, path) of every entry."""
+        found = []
+        for shard in os.listdir(self.entries):
+            shard_path = os.path.join(self.entries, shard)
+            for key in os.listdir(shard_path):
+                entry = os.path.join(shard_path, key)
+                manifest = os.path.join(entry, MANIFEST)
+                try:
+                    with open(manifest, encoding="utf-8") as f:
+                        size = json.load(f)["size"]
+                    found.append((os.stat(manifest).st_mtime, size, entry))
+                except (OSError, ValueError, KeyError):
+                    continue
+        return found
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used entries until the cache fits ``max_bytes``,
+        and leftovers of dead writers. Returns the number of entries removed.
+        """
+        now = time.time()
+        for name in os.listdir(self.tmp):
+            path = os.path.join(self.tmp, name)
+            try:
+                if now - os.stat(path).st_mtime > STALE_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue
+        if self.max_bytes is None:
+            return 0
+
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            doomed = os.path.join(self.tmp, f"{os.path.basename(entry)}.{os.getpid()}.evict")
+            try:
+                os.rename(entry, doomed)
+            except OSError:
+                continue  # removed by another process
+            shutil.rmtree(doomed, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def summary(self) -> Dict[str, int]:
+        """Return the hit, miss and store counters."""
+        return {"hits": self.hits, "misses": self.misses, "stored": self.stored}
+
+
+def _copy(source: str, target: str) -> None:
+    """Copy a file atomically, so a reader of ``target`` sees either version whole."""
+    directory = os.path.dirname(target) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(target)}.", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp)
+        shutil.copymode(source, tmp)
+        os.replace(tmp, target)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -1,98 +1,200 @@
 """
 Builder for generating resolved stage definitions from stage templates and target overrides.
+
+Each stage template is compiled once: ``${VAR}`` references in the command, post,
+inputs and outputs sections are split into literal and variable slots, ``@{target}`` slots and
+``@{Stage.VAR}`` cross references in variables are located. Expanding a target then
+only fills in the slots, sharing the template's sections unless a target overrides them.
 """
 
 import re
-import copy
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import exceptions
 from . import logger as lg
 
 logger = lg.get_logger(__name__)
 
+VAR_PATTERN = re.compile(r"\$\{(\w+)\}")
+CROSS_REF_PATTERN = re.compile(r"^@\{(.+?)\.(.+?)\}$")
+TARGET_SLOT = "@{target}"
+# Execution policy fields copied as-is into the merged stage when set.
+POLICY_KEYS = ("timeout", "retries", "retry_backoff", "lightweight")
+# Lists of file paths or globs, rendered with the stage's variables.
+PATH_KEYS = ("inputs", "outputs")
+OVERRIDE_KEYS = ("variables", "post", "command", "resources") + PATH_KEYS + POLICY_KEYS
+# Version of the merged stage format; bump when its keys or their rendering change,
+# so stages cached by an older Builder are expanded again.
+OUTPUT_VERSION = 2
 
-class Stage:
-    """Represents a single stage, including its commands, dependencies, and variables."""
-    # pylint: disable=too-many-instance-attributes
 
-    VAR_PATTERN = re.compile(r"\$\{(\w+)\}")
-    CROSS_REF_PATTERN = re.compile(r"^@\{(.+?)\.(.+?)\}$")
+class Template:
+    """A string split into literal parts and ${VAR} slots."""
+    # pylint: disable=too-few-public-methods
 
-    def __init__(self, name: str, info: Dict[str, Any], target: str):
-        self.name = name
-        self.target = target
-        self.info = copy.deepcopy(info)
-        self.command: Dict[str, str] = self.info.get("run", {})
-        self.post: Dict[str, str] = self.info.get("post", {})
-        self.variables: Dict[str, str] = self.info.get("variables", {})
-        self.before = self.info.get("before", [])
-        self.after = self.info.get("after", [])
-
-    def apply_target(self) -> None:
-        """Replace @{target} in variable values with the actual target name."""
-        for key, value in self.variables.items():
-            self.variables[key] = value.replace("@{target}", self.target)
-
-    def override_values(self, override_vars: Dict[str, Any]) -> None:
-        """Apply overrides to variables, command, and post sections."""
-        if "variables" in override_vars:
-            self.variables.update(override_vars.pop("variables"))
-        if "post" in override_vars:
-            self.post.update(override_vars.pop("post"))
-        if "command" in override_vars:
-            self.command.update(override_vars.pop("command"))
-        if override_vars:
-            raise ValueError(f"Unrecognized override keys: {list(override_vars.keys())}")
-
-    def update_dependencies(self) -> None:
-        """Add full target-qualified names to before/after dependencies."""
-        self.before = [f"{self.target}:{stage}" for stage in self.before]
-        self.after = [f"{self.target}:{stage}" for stage in self.after]
-
-    def apply_variable_extend(self, stages: Dict[str, "Stage"]) -> None:
-        """Resolve variables referencing other stages via @{StageName.VAR}."""
-        for key, value in list(self.variables.items()):
-            match = self.CROSS_REF_PATTERN.match(value)
+    __slots__ = ("source", "parts", "names")
+
+    def __init__(self, source: str):
+        self.source = source
+        # Even indices are literals, odd indices are variable names.
+        self.parts: List[str] = VAR_PATTERN.split(source)
+        self.names: List[str] = self.parts[1::2]
+
+    def render(self, variables: Dict[str, str], stage_name: str, nested: bool = True) -> str:
+        """
+        Substitute every ${VAR} slot with the stage variable.
+        ``nested`` tells whether any variable value may itself contain "${".
+        """
+        if not self.names:
+            return self.source
+        try:
+            values = [variables[var_name] for var_name in self.names]
+        except KeyError as e:
+            raise KeyError(f"Missing variable '{e.args[0]}' in stage '{stage_name}'") from None
+        if nested and any("${" in value for value in values):
+            return self._render_sequential(variables)
+        parts = list(self.parts)
+        parts[1::2] = values
+        return "".join(parts)
+
+    def _render_sequential(self, variables: Dict[str, str]) -> str:
+        """
+        Replace variables one after another, so a ${VAR} introduced by an earlier
+        variable's value is substituted too. Only needed when a value contains "${".
+        """
+        value = self.source
+        for var_name in self.names:
+            value = value.replace(f"${{{var_name}}}", variables[var_name])
+        return value
+
+
+class Variable:
+    """A compiled variable value: its @{target} slots and @{Stage.VAR} cross reference."""
+    # pylint: disable=too-few-public-methods
+
+    __slots__ = ("source", "target_parts", "cross_ref")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.target_parts: Optional[List[str]] = (
+            source.split(TARGET_SLOT) if TARGET_SLOT in source else None
+        )
+        self.cross_ref: Optional[Tuple[str, str]] = None
+        if self.target_parts is None:
+            match = CROSS_REF_PATTERN.match(source)
             if match:
-                ref_stage_name, ref_var = match.groups()
-                full_stage_name = f"{self.target}:{ref_stage_name}"
-                ref_stage = stages.get(full_stage_name)
-                if not ref_stage:
-                    raise exceptions.NoSuchStage(full_stage_name, stages)
-                if ref_var not in ref_stage.variables:
-                    raise KeyError(f"Variable '{ref_var}' not found in stage '{full_stage_name}'")
-                ref_value = ref_stage.variables[ref_var]
-                self.variables[key] = ref_value
-                logger.debug("Resolved variable @{%s.%s} -> %s", ref_stage_name, ref_var, ref_value)
-
-    def normalize_run_post(self) -> None:
-        """Substitute ${VAR} inside command and post sections."""
-
-        def replace_vars(section: Dict[str, str]) -> Dict[str, str]:
-            result = {}
-            for key, value in section.items():
-                new_value = value
-                for var_name in self.VAR_PATTERN.findall(value):
-                    if var_name not in self.variables:
-                        raise KeyError(f"Missing variable '{var_name}' in stage '{self.name}'")
-                    new_value = new_value.replace(f"${{{var_name}}}", self.variables[var_name])
-                result[key] = new_value
-            return result
-
-        self.command = replace_vars(self.command)
-        self.post = replace_vars(self.post)
-
-    def serialize(self) -> Dict[str, Any]:
-        """Convert the stage to a serializable dictionary."""
+                self.cross_ref = match.groups()
+
+    def fill(self, target: str) -> Tuple[str, Optional[Tuple[str, str]]]:
+        """Return the value for a target and the cross reference it makes, if any."""
+        if self.target_parts is None:
+            return self.source, self.cross_ref
+        value = target.join(self.target_parts)
+        match = CROSS_REF_PATTERN.match(value)
+        return value, match.groups() if match else None
+
+
+class StageTemplate:
+    """A stage definition compiled once and expanded for every target."""
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, name: str, info: Dict[str, Any]):
+        self.name = name
+        self.command = self._compile_section(info.get("run", {}))
+        self.post = self._compile_section(info.get("post", {}))
+        self.variables = {k: Variable(v) for k, v in info.get("variables", {}).items()}
+        self.before: List[str] = info.get("before", [])
+        self.after: List[str] = info.get("after", [])
+        self.paths = {
+            key: [Template(v) for v in info[key]] for key in PATH_KEYS if info.get(key) is not None
+        }
+        self.resources: Optional[Dict[str, Any]] = info.get("resources")
+        self.policy = {key: info[key] for key in POLICY_KEYS if key in info}
+
+    @staticmethod
+    def _compile_section(section: Dict[str, Any]) -> Dict[str, Any]:
+        # Only strings are templates; structured values such as post rules pass through.
         return {
-            "command": self.command,
-            "post": self.post,
-            "before": self.before,
-            "after": self.after,
-            "variables": self.variables,
+            key: Template(value) if isinstance(value, str) else value
+            for key, value in section.items()
         }
 
+    @staticmethod
+    def _render_section(
+        section: Dict[str, Any],
+        variables: Dict[str, str],
+        stage_name: str,
+        nested: bool
+    ) -> Dict[str, Any]:
+        return {
+            key: (value.render(variables, stage_name, nested)
+                  if isinstance(value, Template) else value)
+            for key, value in section.items()
+        }
+
+    def variables_for(
+        self,
+        target: str,
+        override: Dict[str, Any]
+    ) -> Tuple[Dict[str, str], Dict[str, Tuple[str, str]]]:
+        """
+        Return the target's variable values, with overrides and @{target} applied,
+        and the unresolved @{Stage.VAR} references among them.
+        """
+        compiled = self.variables
+        if "variables" in override:
+            compiled = {**compiled, **{k: Variable(v) for k, v in override["variables"].items()}}
+        values = {}
+        refs = {}
+        for key, variable in compiled.items():
+            values[key], ref = variable.fill(target)
+            if ref:
+                refs[key] = ref
+        return values, refs
+
+    def render(
+        self,
+        target: str,
+        override: Dict[str, Any],
+        variables: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """Return the serialized stage for a target, given its fully resolved variables."""
+        command = self.command
+        if "command" in override:
+            command = {**command, **self._compile_section(override["command"])}
+        post = self.post
+        if "post" in override:
+            post = {**post, **self._compile_section(override["post"])}
+
+        nested = any("${" in value for value in variables.values())
+        output = {
+            "command": self._render_section(command, variables, self.name, nested),
+            "post": self._render_section(post, variables, self.name, nested),
+            "before": [f"{target}:{stage}" for stage in self.before],
+            "after": [f"{target}:{stage}" for stage in self.after],
+            "variables": variables,
+        }
+
+        for key in PATH_KEYS:
+            paths = self.paths.get(key)
+            if key in override:
+                paths = [Template(v) for v in override[key]]
+            if paths is not None:
+                output[key] = [t.render(variables, self.name, nested) for t in paths]
+
+        resources = self.resources
+        if "resources" in override:
+            resources = {**(resources or {}), **override["resources"]}
+        if resources is not None:
+            output["resources"] = dict(resources)
+
+        for key in POLICY_KEYS:
+            value = override.get(key, self.policy.get(key))
+            if value is not None:
+                output[key] = value
+        return output
+
 
 class Target:
     """Represents a target with optional stage-specific overrides."""
@@ -104,17 +206,86 @@ class Target:
 
     def get_stage_override(self, stage_name: str) -> Dict[str, Any]:
         """Return overrides for a specific stage if available."""
-        return self.overrides.get(stage_name, {})
+        override = self.overrides.get(stage_name, {})
+        unknown = [key for key in override if key not in OVERRIDE_KEYS]
+        if unknown:
+            raise ValueError(f"Unrecognized override keys: {unknown}")
+        return override
+
+
+def compile_stages(stages: Dict[str, Any]) -> Dict[str, StageTemplate]:
+    """Compile every stage template."""
+    return {name: StageTemplate(name, info) for name, info in stages.items()}
+
+
+def expand_target(templates: Dict[str, StageTemplate], target: Target) -> Dict[str, Any]:
+    """Expand every stage template for one target."""
+    overrides = {name: target.get_stage_override(name) for name in templates}
+
+    values: Dict[str, Dict[str, str]] = {}
+    refs: Dict[str, Dict[str, Tuple[str, str]]] = {}
+    for name, template in templates.items():
+        values[name], refs[name] = template.variables_for(target.name, overrides[name])
+
+    # @{Stage.VAR} references only point into the same target; resolve them as a
+    # dependency graph so chained references resolve regardless of stage order.
+    def resolve(stage_name: str, var: str, visiting: tuple) -> str:
+        full_stage_name = f"{target.name}:{stage_name}"
+        if stage_name not in values:
+            raise exceptions.NoSuchStage(
+                full_stage_name, {f"{target.name}:{name}": None for name in values}
+            )
+        if var not in values[stage_name]:
+            raise KeyError(f"Variable '{var}' not found in stage '{full_stage_name}'")
+        ref = refs[stage_name].get(var)
+        if ref is None:
+            return values[stage_name][var]
+        if (stage_name, var) in visiting:
+            raise ValueError(f"Circular variable reference @{{{stage_name}.{var}}} "
+                             f"in target '{target.name}'")
+        value = resolve(*ref, visiting + ((stage_name, var),))
+        values[stage_name][var] = value
+        del refs[stage_name][var]
+        logger.debug("Resolved variable @{%s.%s} -> %s", ref[0], ref[1], value)
+        return value
+
+    outputs = {}
+    for name, template in templates.items():
+        for var in list(refs[name]):
+            if var in refs[name]:
+                resolve(name, var, ())
+        outputs[f"{target.name}:{name}"] = template.render(
+            target.name, overrides[name], values[name]
+        )
+    return outputs
+
+
+_worker_templates: Dict[str, StageTemplate] = {}
+
+
+def _init_worker(stages: Dict[str, Any]) -> None:
+    """Compile the stage templates once per worker process."""
+    global _worker_templates  # pylint: disable=global-statement
+    _worker_templates = compile_stages(stages)
+
+
+def _expand_chunk(targets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Expand a chunk of targets in a worker process."""
+    outputs: Dict[str, Any] = {}
+    for target_info in targets:
+        outputs.update(expand_target(_worker_templates, Target(target_info)))
+    return outputs
 
 
 class Builder:
     """Main class for building fully-expanded, target-specific stage definitions."""
     # pylint: disable=too-few-public-methods
 
-    def __init__(self, stages: Dict[str, Any], targets: list[Dict[str, Any]]):
+    def __init__(self, stages: Dict[str, Any], targets: List[Dict[str, Any]], jobs: int = 1):
         self.original_stages = stages
+        self.original_targets = targets
         self.targets = [Target(t) for t in targets]
-        self.combined_stages: Dict[str, Stage] = {}
+        self.jobs = jobs
 
     def build(self) -> Dict[str, Any]:
         """
@@ -122,25 +293,30 @@ class Builder:
         - Applies overrides
         - Resolves dependencies
         - Handles variable substitutions
+        Targets are expanded across ``jobs`` processes when more than one is requested.
         """
-        outputs: Dict[str, Any] = {}
+        if self.jobs > 1 and len(self.targets) > 1:
+            return self._build_parallel()
 
+        templates = compile_stages(self.original_stages)
+        outputs: Dict[str, Any] = {}
         for target in self.targets:
-            for stage_name, stage_info in self.original_stages.items():
-                full_stage_name = f"{target.name}:{stage_name}"
-                stage = Stage(stage_name, stage_info, target.name)
-
-                override_vars = target.get_stage_override(stage_name)
-                stage.override_values(copy.deepcopy(override_vars))
-
-                stage.apply_target()
-                stage.update_dependencies()
-
-                self.combined_stages[full_stage_name] = stage
-
-        for name, stage in self.combined_stages.items():
-            stage.apply_variable_extend(self.combined_stages)
-            stage.normalize_run_post()
-            outputs[name] = stage.serialize()
+            outputs.update(expand_target(templates, target))
+        return outputs
 
+    def _build_parallel(self) -> Dict[str, Any]:
+        """Expand contiguous chunks of targets in worker processes, keeping target order."""
+        chunk_size = -(-len(self.original_targets) // (self.jobs * 4))
+        chunks = [
+            self.original_targets[i:i + chunk_size]
+            for i in range(0, len(self.original_targets), chunk_size)
+        ]
+        outputs: Dict[str, Any] = {}
+        with ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=_init_worker,
+            initargs=(self.original_stages,)
+        ) as executor:
+            for chunk_outputs in executor.map(_expand_chunk, chunks):
+                outputs.update(chunk_outputs)
         return outputs
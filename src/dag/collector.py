@@ -0,0 +1,149 @@
+"""Parallel, streaming collection of post output files."""
+
+import collections
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from . import logger as lg
+from . import rules
+from . import store
+
+logger = lg.get_logger(__name__)
+
+HEAD = "head"
+TAIL = "tail"
+
+
+def post_output_files(
+    merged: store.MergedFile
+) -> Iterable[Tuple[str, str, Optional[rules.RuleSet]]]:
+    """
+    Yield (node name, post output path, compiled rules) for every node that has
+    a post section.
+    """
+    for name, data in merged.items():
+        post = data.get("post")
+        if post:
+            directory = post.get("directory", "")
+            output = post.get("output", "")
+            try:
+                ruleset = rules.compile_rules(post.get("rules"))
+            except ValueError as e:
+                raise ValueError(f"Invalid rules in stage '{name}': {e}") from e
+            yield name, f"{directory}/{output}", ruleset
+
+
+def read_output(
+    filename: str,
+    max_bytes: Optional[int] = None,
+    mode: str = HEAD,
+    ruleset: Optional[rules.RuleSet] = None
+) -> Dict[str, Any]:
+    """
+    Read one post output file into a collect entry.
+    With ``max_bytes``, only the first (``head``) or last (``tail``) bytes are kept.
+    With ``ruleset``, the whole file is validated and the entry is ``passed`` or
+    ``failed`` with the per-rule evidence; otherwise it stays ``unverified``.
+    """
+    if not os.path.isfile(filename):
+        return {"status": "failed", "content": "File not found", "filename": filename}
+
+    truncated = False
+    with open(filename, "rb") as f:
+        if max_bytes is None:
+            data = f.read()
+        else:
+            size = os.fstat(f.fileno()).st_size
+            truncated = size > max_bytes
+            if truncated and mode == TAIL:
+                f.seek(size - max_bytes)
+            data = f.read(max_bytes)
+
+    entry = {
+        "status": "unverified",
+        "content": data.decode("utf-8", errors="replace"),
+        "filename": filename
+    }
+    if truncated:
+        entry["truncated"] = mode
+    if ruleset is not None:
+        passed, entry["rules"] = ruleset.check(filename)
+        entry["status"] = "passed" if passed else "failed"
+    return entry
+
+
+class JsonObjectWriter:
+    """Write a JSON object one member at a time, formatted like json.dump(..., indent=4)."""
+
+    def __init__(self, f: TextIO):
+        self._file = f
+        self._count = 0
+
+    def __enter__(self) -> "JsonObjectWriter":
+        self._file.write("{")
+        return self
+
+    def write(self, key: str, value: Any) -> None:
+        """Append one member."""
+        self._file.write(",\n    " if self._count else "\n    ")
+        self._file.write(json.dumps(key))
+        self._file.write(": ")
+        self._file.write(json.dumps(value, indent=4).replace("\n", "\n    "))
+        self._count += 1
+
+    def __exit__(self, *exc_info) -> None:
+        self._file.write("\n}" if self._count else "}")
+
+
+def _submit_reads(
+    merged: store.MergedFile,
+    executor: ThreadPoolExecutor,
+    max_bytes: Optional[int],
+    mode: str
+) -> Iterator[Tuple[str, Future]]:
+    """
+    Yield (node name, future collect entry) for every post output file, read and
+    checked against its rules by ``executor``. Each read is submitted only when the
+    next entry is asked for, so the caller bounds how many are outstanding.
+    """
+    for name, filename, ruleset in post_output_files(merged):
+        yield name, executor.submit(read_output, filename, max_bytes, mode, ruleset)
+
+
+def collect(
+    merged: store.MergedFile,
+    output: str,
+    jobs: int = 8,
+    max_bytes: Optional[int] = None,
+    mode: str = HEAD
+) -> Dict[str, int]:
+    """
+    Read every post output file with a pool of ``jobs`` threads and stream the entries
+    to ``output`` in node order. At most a few reads per thread are outstanding, so
+    memory stays bounded regardless of the number of nodes.
+    Returns the number of entries per status.
+    """
+    window = max(jobs, 1) * 4
+    pending: collections.deque = collections.deque()
+    statuses: Dict[str, int] = collections.Counter()
+
+    def flush_one(writer: JsonObjectWriter) -> None:
+        name, future = pending.popleft()
+        entry = future.result()
+        writer.write(name, entry)
+        statuses[entry["status"]] += 1
+
+    with open(output, "w", encoding="utf-8") as f, \
+            JsonObjectWriter(f) as writer, \
+            ThreadPoolExecutor(max_workers=jobs) as executor:
+        for read in _submit_reads(merged, executor, max_bytes, mode):
+            pending.append(read)
+            if len(pending) >= window:
+                flush_one(writer)
+        while pending:
+            flush_one(writer)
+
+    logger.info("Collected %d post output files into %s", sum(statuses.values()), output)
+    return dict(statuses)
@@ -0,0 +1,35 @@
+"""Progress events emitted while a DAG is being executed."""
+
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+SUBMITTED = "submitted"
+STARTED = "started"
+FINISHED = "finished"
+FAILED = "failed"
+SKIPPED = "skipped"
+CANCELLED = "cancelled"
+RETRYING = "retrying"
+
+
+class Event(NamedTuple):
+    """A single state transition of a node, stamped with wall-clock time."""
+
+    kind: str
+    node: str
+    timestamp: float
+    returncode: Optional[int] = None
+
+    @classmethod
+    def now(cls, kind: str, node: str, returncode: Optional[int] = None) -> "Event":
+        """Create an event for ``node`` stamped with the current time."""
+        return cls(kind, node, time.time(), returncode)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the event to a JSON-serializable dictionary."""
+        return {
+            "kind": self.kind,
+            "node": self.node,
+            "timestamp": self.timestamp,
+            "returncode": self.returncode,
+        }
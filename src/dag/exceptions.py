@@ -12,3 +12,26 @@ class NoSuchStage(Exception):
     def __str__(self) -> str:
         available = ', '.join(self.stages.keys())
         return f"No such stage: '{self.stage}'. Available stages: [{available}]"
+
+
+class UnknownDependency(Exception):
+    """Exception raised when a stage's before/after list names a stage that does not exist."""
+
+    def __init__(self, stage: str, dependency: str):
+        self.stage = stage
+        self.dependency = dependency
+        super().__init__(self.__str__())
+
+    def __str__(self) -> str:
+        return f"Stage '{self.stage}' depends on unknown stage '{self.dependency}'"
+
+
+class CyclicDependency(Exception):
+    """Exception raised when the stage dependencies form a cycle."""
+
+    def __init__(self, cycle: list):
+        self.cycle = cycle
+        super().__init__(self.__str__())
+
+    def __str__(self) -> str:
+        return f"Dependency cycle: {' -> '.join(self.cycle)}"
@@ -0,0 +1,347 @@
+"""Running a stage's shell steps, in pool worker processes or as asyncio subprocesses."""
+
+import asyncio
+import os
+import shlex
+import signal
+import socket
+import sys
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from . import logger as lg
+from .logs import CHUNK_SIZE, LogCapture, StageLog
+
+logger = lg.get_logger(__name__)
+# Directory that relative stage directories are resolved from.
+cwd = os.getcwd()
+HOST = socket.gethostname()
+# Return code of a stage killed by its timeout, as with timeout(1).
+TIMEOUT_RETURNCODE = 124
+
+# (node name, command, directory, post command, post directory, timeout in seconds)
+CommandInfo = Tuple[str, str, str, str, str, Optional[float]]
+
+
+# The stage subprocess currently run by this pool worker, killed on SIGTERM.
+_active_process: Optional[subprocess.Popen] = None  # pylint: disable=invalid-name
+# Long-lived shell of this pool worker for batched stages, and the pipe it reports
+# exit statuses on (the path of the writing end in the shell, our reading end).
+_shell: Optional[subprocess.Popen] = None  # pylint: disable=invalid-name
+_status: Optional[Tuple[str, BinaryIO]] = None  # pylint: disable=invalid-name
+# Environment the batch shell was started with.
+_shell_environ: Dict[str, str] = {}  # pylint: disable=invalid-name
+
+
+def kill_group(pid: int) -> None:
+    """Kill a stage's process group: the shell and everything it started."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _terminate_worker(signum, _frame) -> None:
+    """SIGTERM handler of pool workers: stop the running stage before exiting."""
+    if _active_process is not None and _active_process.poll() is None:
+        kill_group(_active_process.pid)
+    os._exit(128 + signum)  # pylint: disable=protected-access
+
+
+def init_worker() -> None:
+    """Pool worker initializer."""
+    signal.signal(signal.SIGTERM, _terminate_worker)
+
+
+def _exit_code(status: int) -> int:
+    """Convert a wait status to a return code like Popen's: -N when killed by signal N."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_step(
+    cmd: str,
+    log: Optional[StageLog] = None,
+    timeout: Optional[float] = None
+) -> Tuple[int, float, int]:
+    """
+    Run one shell step in its own process group; output goes to the log if given.
+    After ``timeout`` seconds the whole group is killed.
+    Returns its exit status (TIMEOUT_RETURNCODE on timeout), and the CPU seconds and
+    peak RSS (KiB) of the step and the processes it waited for, from wait4.
+    """
+    global _active_process  # pylint: disable=global-statement
+    output = subprocess.PIPE if log else sys.stdout
+    error = subprocess.STDOUT if log else sys.stderr
+    with subprocess.Popen(
+        cmd, shell=True, cwd=cwd, stdout=output, stderr=error, start_new_session=True
+    ) as proc:
+        _active_process = proc
+        timer = None
+        expired = threading.Event()
+        if timeout is not None:
+            def expire():
+                expired.set()
+                kill_group(proc.pid)
+            timer = threading.Timer(max(timeout, 0.0), expire)
+            timer.start()
+        try:
+            if log:
+                log.mark(cmd)
+                # Drain the pipe continuously so a chatty stage never blocks on it.
+                for chunk in iter(lambda: proc.stdout.read1(CHUNK_SIZE), b""):
+                    log.write(chunk)
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = _exit_code(status)
+            if expired.is_set():
+                proc.returncode = TIMEOUT_RETURNCODE
+            return proc.returncode, usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+        finally:
+            if timer is not None:
+                timer.cancel()
+            _active_process = None
+
+
+def _steps(command_info: CommandInfo) -> List[str]:
+    """Return the shell commands to run for a node, run step first."""
+    _, command, directory, post_command, post_directory, _ = command_info
+    return [
+        f"cd {step_directory}; {step_command}"
+        for step_directory, step_command in ((directory, command), (post_directory, post_command))
+        if step_command
+    ]
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def execute_command(
+    command_info: CommandInfo,
+    logs: Optional[LogCapture] = None
+) -> Tuple[str, int, List[str], Dict[str, Any]]:
+    """
+    Executes a stage's run and/or post command in a separate process.
+    With ``logs``, the output of both steps goes to the node's own log file.
+    The stage timeout covers both steps.
+    Returns (node name, return code of the first failing step or 0, last log lines, usage).
+    The usage holds the worker, start and end times, CPU seconds and peak RSS in KiB.
+    """
+    name, timeout = command_info[0], command_info[5]
+    deadline = None if timeout is None else time.monotonic() + timeout
+    usage = {
+        "worker": f"{HOST}:{os.getpid()}", "started": time.time(), "cpu": 0.0, "max_rss_kb": 0
+    }
+    log = logs.open(name) if logs else None
+    returncode = 0
+    try:
+        for cmd in _steps(command_info):
+            try:
+                returncode, cpu, max_rss = _run_step(cmd, log, _remaining(deadline))
+            except OSError as e:
+                logger.error("OS error for node %s: %s", name, e)
+                returncode = -1
+                break
+            usage["cpu"] += cpu
+            usage["max_rss_kb"] = max(usage["max_rss_kb"], max_rss)
+            if returncode == TIMEOUT_RETURNCODE and deadline is not None \
+                    and time.monotonic() >= deadline:
+                logger.error("Timeout for node %s: killed after %ss", name, timeout)
+                break
+            if returncode:
+                logger.error("Execution failed for node %s: Command '%s' returned "
+                             "non-zero exit status %d.", name, cmd, returncode)
+                break
+    finally:
+        usage["ended"] = time.time()
+        if log:
+            log.close()
+    return name, returncode, log.tail() if log else [], usage
+
+
+def _batch_shell() -> subprocess.Popen:
+    """
+    Return this worker's long-lived shell for batched stages, starting it if needed
+    along with the pipe it writes exit statuses to.
+    """
+    global _shell, _status, _shell_environ  # pylint: disable=global-statement
+    if _shell is not None and _shell.poll() is None and _shell_environ != os.environ:
+        # The launch runs with another environment: end the shell started with the old one.
+        _shell.stdin.close()
+        _shell.wait()
+    if _shell is None or _shell.poll() is not None:
+        _shell_environ = dict(os.environ)
+        read_fd, write_fd = os.pipe()
+        # pylint: disable-next=consider-using-with
+        _shell = subprocess.Popen(
+            ["/bin/sh"], stdin=subprocess.PIPE, pass_fds=(write_fd,), start_new_session=True
+        )
+        os.close(write_fd)
+        if _status is not None:
+            _status[1].close()
+        # Opened by path: dash only redirects to single-digit descriptors.
+        _status = (f"/dev/fd/{write_fd}", os.fdopen(read_fd, "rb"))
+    return _shell
+
+
+def _batch_step(cmd: str, redirect: str) -> Optional[int]:
+    """
+    Run one step in a subshell of the batch shell, from ``cwd`` with stdin from
+    /dev/null. Returns its exit status, or None if the shell is gone.
+    """
+    status_path, status = _status
+    try:
+        _shell.stdin.write(
+            f"( cd {shlex.quote(cwd)}; eval {shlex.quote(cmd)} ) </dev/null "
+            f"{redirect}; echo $? >{status_path}\n".encode()
+        )
+        _shell.stdin.flush()
+        line = status.readline()
+    except OSError:
+        return None
+    return int(line) if line else None
+
+
+def execute_batch(
+    command_infos: List[CommandInfo],
+    logs: Optional[LogCapture] = None
+) -> List[Tuple[str, int, List[str], Dict[str, Any]]]:
+    """
+    Executes several short stages one after another in this worker's long-lived
+    shell, saving a process pool round-trip and a shell start per stage. Each step
+    runs in a subshell with stdin from /dev/null; stage timeouts are not applied.
+    Returns one execute_command result per stage; CPU time and peak RSS are not
+    measured per stage.
+    """
+    global _active_process  # pylint: disable=global-statement
+    _active_process = _batch_shell()
+    results = []
+    output = None
+    try:
+        for command_info in command_infos:
+            name = command_info[0]
+            usage: Dict[str, Any] = {"worker": f"{HOST}:{os.getpid()}", "started": time.time(),
+                                     "cpu": None, "max_rss_kb": None}
+            log = logs.open(name) if logs else None
+            if log and output is None:
+                fd, output = tempfile.mkstemp(prefix="workscript-batch-")
+                os.close(fd)
+            redirect = f">{shlex.quote(output)} 2>&1" if log else ""
+            returncode = 0
+            for cmd in _steps(command_info):
+                returncode = _batch_step(cmd, redirect)
+                if returncode is None:
+                    logger.error("Batch shell exited while running node %s", name)
+                    returncode = -1
+                    break
+                if log:
+                    log.mark(cmd)
+                    with open(output, "rb") as f:
+                        for chunk in iter(lambda f=f: f.read(CHUNK_SIZE), b""):
+                            log.write(chunk)
+                if returncode:
+                    logger.error("Execution failed for node %s: Command '%s' returned "
+                                 "non-zero exit status %d.", name, cmd, returncode)
+                    break
+            usage["ended"] = time.time()
+            if log:
+                log.close()
+            results.append((name, returncode, log.tail() if log else [], usage))
+    finally:
+        _active_process = None
+        if output is not None:
+            os.unlink(output)
+    return results
+
+
+def _enter(workdir: str, environment: Optional[Dict[str, str]]) -> None:
+    """Resolve relative directories from ``workdir``, and run stages with ``environment``."""
+    global cwd  # pylint: disable=global-statement
+    cwd = workdir
+    if environment is not None and environment != os.environ:
+        os.environ.clear()
+        os.environ.update(environment)
+
+
+def execute_in(
+    workdir: str,
+    command_info: CommandInfo,
+    logs: Optional[LogCapture] = None,
+    environment: Optional[Dict[str, str]] = None
+) -> Tuple[str, int, List[str], Dict[str, Any]]:
+    """
+    Executes a stage for a remote coordinator or a daemon client, resolving relative
+    directories from its working directory instead of this worker's, and with its
+    environment if given.
+    """
+    _enter(workdir, environment)
+    return execute_command(command_info, logs)
+
+
+def execute_batch_in(
+    workdir: str,
+    command_infos: List[CommandInfo],
+    logs: Optional[LogCapture] = None,
+    environment: Optional[Dict[str, str]] = None
+) -> List[Tuple[str, int, List[str], Dict[str, Any]]]:
+    """Executes a batch of stages like execute_batch, from ``workdir`` and ``environment``."""
+    _enter(workdir, environment)
+    return execute_batch(command_infos, logs)
+
+
+# pylint resolves asyncio.subprocess to the subprocess module.
+# pylint: disable-next=no-member
+async def _drain_and_wait(proc: asyncio.subprocess.Process, log: Optional[StageLog]) -> int:
+    if log:
+        while True:
+            chunk = await proc.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            log.write(chunk)
+    return await proc.wait()
+
+
+async def execute_command_async(
+    command_info: CommandInfo,
+    log: Optional[StageLog] = None
+) -> Tuple[str, int]:
+    """
+    Executes a stage's run and/or post command as an asyncio subprocess in its own
+    process group. With ``log``, the output of both steps goes to it.
+    Returns (node name, return code of the first failing step or 0).
+    """
+    name, timeout = command_info[0], command_info[5]
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for cmd in _steps(command_info):
+        try:
+            proc = await asyncio.create_subprocess_shell(
+                cmd,
+                cwd=cwd,
+                stdout=subprocess.PIPE if log else sys.stdout,
+                stderr=subprocess.STDOUT if log else sys.stderr,
+                start_new_session=True
+            )
+        except OSError as e:
+            logger.error("OS error for node %s: %s", name, e)
+            return name, -1
+        if log:
+            log.mark(cmd)
+        try:
+            returncode = await asyncio.wait_for(_drain_and_wait(proc, log), _remaining(deadline))
+        except asyncio.TimeoutError:
+            kill_group(proc.pid)
+            await proc.wait()
+            logger.error("Timeout for node %s: killed after %ss", name, timeout)
+            return name, TIMEOUT_RETURNCODE
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                kill_group(proc.pid)
+            raise
+        if returncode:
+            logger.error("Execution failed for node %s: exit status %d", name, returncode)
+            return name, returncode
+    return name, 0
@@ -0,0 +1,376 @@
+"""
+Executors that run node commands for Runner.launch: a local process pool, a share
+of a pool kept warm by the ``serve`` daemon, or ``workscript worker`` agents on other
+hosts reached over TCP.
+
+The remote protocol is one JSON object per line. The coordinator opens each
+connection with ``{"type": "hello", "token": ...}``; a worker holding the same shared
+token answers ``{"type": "hello", "capacity": N, "host": ...}``, any other gets an
+``error`` and is disconnected. The coordinator then sends ``{"type": "run", "id",
+"command", "cwd", "logs"}`` and ``{"type": "cancel"}``; the worker answers each run
+with ``started`` when it begins and ``finished`` messages carrying the id.
+"""
+
+import itertools
+import json
+import os
+import socket
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from . import logger as lg
+from .execution import (
+    CommandInfo, cwd, execute_batch, execute_batch_in, execute_command, execute_in, init_worker
+)
+from .logs import LogCapture
+
+logger = lg.get_logger(__name__)
+
+DEFAULT_PORT = 7071
+# Where workers and coordinators read their shared token from, in this order.
+TOKEN_ENV = "WORKSCRIPT_TOKEN"
+TOKEN_FILE = os.path.join("~", ".workscript", "token")
+
+
+class Executor:
+    """
+    Where launch runs node commands. ``capacity`` is the number of nodes it can
+    run at once; ``submit`` returns a future of (node name, return code, log tail,
+    usage), see execute_command.
+    """
+
+    capacity: int = 1
+    # Whether submit_batch is supported.
+    batching: bool = False
+
+    def submit(
+        self,
+        command_info: CommandInfo,
+        logs: Optional[LogCapture] = None
+    ) -> Future:
+        """Start running a node's commands."""
+        raise NotImplementedError
+
+    def submit_batch(
+        self,
+        command_infos: List[CommandInfo],
+        logs: Optional[LogCapture] = None
+    ) -> Future:
+        """
+        Start running several short nodes one after another in one slot; the future
+        holds a list of submit results, see execute_batch.
+        """
+        raise NotImplementedError
+
+    def cancel(self) -> None:
+        """Drop queued work and kill the running commands."""
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        """Release the executor once every submitted node has completed or was cancelled."""
+
+    def __enter__(self) -> "Executor":
+        return self
+
+    def __exit__(self, *exc_info: Optional[object]) -> None:
+        self.shutdown()
+
+
+def terminate_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop queued work and terminate the pool workers along with their running stages."""
+    pool.shutdown(wait=False, cancel_futures=True)
+    # pylint: disable-next=protected-access
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        process.terminate()
+
+
+class LocalExecutor(Executor):
+    """Runs nodes in a pool of local worker processes."""
+
+    batching = True
+
+    def __init__(self, max_workers: int):
+        self.capacity = max_workers
+        self._pool = ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker)
+
+    def submit(self, command_info, logs=None) -> Future:
+        return self._pool.submit(execute_command, command_info, logs)
+
+    def submit_batch(self, command_infos, logs=None) -> Future:
+        return self._pool.submit(execute_batch, command_infos, logs)
+
+    def cancel(self) -> None:
+        terminate_pool(self._pool)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+class SharedPool:
+    """
+    A warm pool of worker processes shared by several launches, e.g. those of the
+    ``serve`` daemon; its size is the limit on stages running at once across all of them.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pool = self._create()
+
+    def _create(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue a call in the pool, replacing the pool if its workers died."""
+        with self._lock:
+            try:
+                return self._pool.submit(fn, *args)
+            except BrokenProcessPool:
+                logger.warning("Worker pool broke, starting a new one")
+                self._pool = self._create()
+                return self._pool.submit(fn, *args)
+
+    def shutdown(self) -> None:
+        """Stop the workers, killing the stages still running."""
+        terminate_pool(self._pool)
+
+
+class SharedExecutor(Executor):
+    """
+    One launch's share of a SharedPool; relative directories resolve from ``workdir``
+    and stages run with ``environment`` (default: the pool workers' own). Cancelling
+    drops the launch's queued nodes; nodes already running in the shared workers are
+    left to finish.
+    """
+
+    batching = True
+
+    def __init__(
+        self,
+        pool: SharedPool,
+        workdir: str,
+        max_workers: int = 0,
+        environment: Optional[Dict[str, str]] = None
+    ):
+        self._pool = pool
+        self._workdir = workdir
+        self._environment = environment
+        self._futures: Set[Future] = set()
+        self.capacity = min(max_workers, pool.max_workers) if max_workers > 0 \
+            else pool.max_workers
+
+    def submit(self, command_info, logs=None) -> Future:
+        return self._track(self._pool.submit(
+            execute_in, self._workdir, command_info, logs, self._environment
+        ))
+
+    def submit_batch(self, command_infos, logs=None) -> Future:
+        return self._track(self._pool.submit(
+            execute_batch_in, self._workdir, command_infos, logs, self._environment
+        ))
+
+    def _track(self, future: Future) -> Future:
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def cancel(self) -> None:
+        for future in list(self._futures):
+            future.cancel()
+
+    def shutdown(self) -> None:
+        wait(list(self._futures))
+
+
+def parse_workers(spec: str) -> List[Tuple[str, int]]:
+    """Parse a comma-separated ``host[:port]`` list of worker addresses."""
+    addresses = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        host, sep, port = item.rpartition(":")
+        if not sep:
+            host, port = item, str(DEFAULT_PORT)
+        if not port.isdigit():
+            raise ValueError(f"Invalid worker address '{item}', expected host[:port]")
+        addresses.append((host, int(port)))
+    return addresses
+
+
+def read_token() -> str:
+    """Return the shared worker token from ``$WORKSCRIPT_TOKEN`` or ``~/.workscript/token``."""
+    token = os.environ.get(TOKEN_ENV, "").strip()
+    if not token:
+        try:
+            with open(os.path.expanduser(TOKEN_FILE), encoding="utf-8") as f:
+                token = f.read().strip()
+        except FileNotFoundError:
+            pass
+    if not token:
+        raise ValueError(f"No worker token: set {TOKEN_ENV} or write one to {TOKEN_FILE}")
+    return token
+
+
+def send_message(stream, lock: threading.Lock, message: Dict[str, Any]) -> None:
+    """Write one protocol message; ``lock`` serializes writers sharing the stream."""
+    data = (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+    with lock:
+        stream.write(data)
+        stream.flush()
+
+
+class RemoteWorker:
+    """Connection to one ``workscript worker`` agent."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, host: str, port: int, timeout: float, token: str):
+        self.name = f"{host}:{port}"
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.socket.makefile("rb")
+        self.writer = self.socket.makefile("wb")
+        self.lock = threading.Lock()
+        self.send({"type": "hello", "token": token})
+        hello = json.loads(self.reader.readline() or b"{}")
+        self.socket.settimeout(None)
+        if hello.get("type") == "error":
+            raise ConnectionError(f"{self.name} refused the connection: {hello['message']}")
+        if hello.get("type") != "hello":
+            raise ConnectionError(f"{self.name} is not a workscript worker")
+        self.capacity = int(hello["capacity"])
+        self.running = 0
+        self.alive = True
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """Send one protocol message."""
+        send_message(self.writer, self.lock, message)
+
+    def close(self) -> None:
+        """Close the connection, which also ends the reader thread."""
+        self.alive = False
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+class RemoteExecutor(Executor):
+    """
+    Runs nodes on ``workscript worker`` agents; each node goes to the connected
+    worker with the most free slots. Stage directories and log directories are
+    used as-is on the workers, so they are expected on a shared file system.
+    """
+
+    def __init__(
+        self,
+        addresses: List[Tuple[str, int]],
+        timeout: float = 10.0,
+        token: Optional[str] = None
+    ):
+        """
+        :param addresses: Host and port of each worker.
+        :param timeout: Seconds to wait for a worker to accept and greet.
+        :param token: Shared token the workers expect (default: read_token()).
+        """
+        token = token or read_token()
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._jobs: Dict[int, Tuple[RemoteWorker, Future]] = {}
+        # Worker that ran each node, by node name.
+        self.assignments: Dict[str, str] = {}
+        self.workers = [RemoteWorker(host, port, timeout, token) for host, port in addresses]
+        self.capacity = sum(worker.capacity for worker in self.workers)
+        for worker in self.workers:
+            threading.Thread(target=self._receive, args=(worker,), daemon=True).start()
+        logger.info("Connected to %d workers with %d slots", len(self.workers), self.capacity)
+
+    def submit(self, command_info, logs=None) -> Future:
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            alive = [worker for worker in self.workers if worker.alive]
+            if not alive:
+                future.set_exception(ConnectionError("No remote worker is connected"))
+                return future
+            worker = max(alive, key=lambda w: w.capacity - w.running)
+            job = next(self._ids)
+            worker.running += 1
+            self._jobs[job] = (worker, future)
+        self.assignments[command_info[0]] = worker.name
+        try:
+            worker.send({
+                "type": "run",
+                "id": job,
+                "command": list(command_info),
+                "cwd": cwd,
+                "logs": vars(logs) if logs else None
+            })
+        except OSError as e:
+            self._lost(worker, e)
+        return future
+
+    def submit_batch(self, command_infos, logs=None) -> Future:
+        """
+        Run the nodes one after another through submit, in one slot. Remote stages
+        save nothing by batching, so launch does not batch for this executor.
+        """
+        batch: Future = Future()
+        batch.set_running_or_notify_cancel()
+        results: List[Any] = []
+
+        def submit_next(previous: Optional[Future] = None) -> None:
+            if previous is not None:
+                if previous.exception() is not None:
+                    batch.set_exception(previous.exception())
+                    return
+                results.append(previous.result())
+            if len(results) == len(command_infos):
+                batch.set_result(results)
+            else:
+                self.submit(command_infos[len(results)], logs).add_done_callback(submit_next)
+
+        submit_next()
+        return batch
+
+    def _receive(self, worker: RemoteWorker) -> None:
+        """Resolve the futures of one worker's nodes as its status messages arrive."""
+        error: Exception = ConnectionError(f"Lost connection to worker {worker.name}")
+        try:
+            for line in worker.reader:
+                message = json.loads(line)
+                if message["type"] == "started":
+                    logger.debug("Started job %d on %s", message["id"], worker.name)
+                elif message["type"] == "finished":
+                    with self._lock:
+                        _, future = self._jobs.pop(message["id"])
+                        worker.running -= 1
+                    future.set_result((message["name"], message["returncode"],
+                                       message["tail"], message.get("usage")))
+        except (OSError, ValueError) as e:
+            error = e
+        if worker.alive:
+            self._lost(worker, error)
+
+    def _lost(self, worker: RemoteWorker, error: Exception) -> None:
+        """Fail the nodes running on a worker that went away."""
+        logger.error("Worker %s disconnected: %s", worker.name, error)
+        worker.alive = False
+        with self._lock:
+            lost = [job for job, (owner, _) in self._jobs.items() if owner is worker]
+            futures = [self._jobs.pop(job)[1] for job in lost]
+            worker.running = 0
+        for future in futures:
+            future.set_exception(ConnectionError(f"Lost worker {worker.name}: {error}"))
+
+    def cancel(self) -> None:
+        for worker in self.workers:
+            if worker.alive:
+                try:
+                    worker.send({"type": "cancel"})
+                except OSError:
+                    pass
+
+    def shutdown(self) -> None:
+        for worker in self.workers:
+            worker.close()
@@ -0,0 +1,117 @@
+"""Compact integer-indexed DAG structure shared by the runner and the schedulers."""
+
+from array import array
+from typing import Dict, List
+
+from . import exceptions
+
+
+def _csr(count: int, sources: array, targets: array):
+    """Group edge targets by source into (offsets, ids) arrays with a counting sort."""
+    offsets = array("i", bytes(4 * (count + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    ids = array("i", bytes(4 * len(targets)))
+    position = array("i", offsets[:count])
+    for source, target in zip(sources, targets):
+        ids[position[source]] = target
+        position[source] += 1
+    return offsets, ids
+
+
+class Graph:
+    """
+    Immutable DAG over integer node ids, the positions of ``names``.
+    Adjacency is kept in CSR form: the children of node ``i`` are
+    ``child_ids[child_offsets[i]:child_offsets[i + 1]]``, and likewise for parents.
+    Edges declared through both ``before`` and ``after`` appear twice, consistently
+    in both directions.
+    """
+
+    __slots__ = ("names", "ids", "child_offsets", "child_ids",
+                 "parent_offsets", "parent_ids", "order")
+
+    def __init__(self, names: List[str], ids: Dict[str, int], sources: array, targets: array):
+        self.names = names
+        self.ids = ids
+        self.child_offsets, self.child_ids = _csr(len(names), sources, targets)
+        self.parent_offsets, self.parent_ids = _csr(len(names), targets, sources)
+        self.order = self._topological_order()
+
+    @staticmethod
+    def from_dict(dct: dict) -> "Graph":
+        """
+        Build the graph from merged stages.
+        Raises UnknownDependency for a reference to a missing stage and
+        CyclicDependency if the stages do not form a DAG.
+        """
+        names = list(dct)
+        ids = {name: i for i, name in enumerate(names)}
+        sources = array("i")
+        targets = array("i")
+        for i, data in enumerate(dct.values()):
+            for child_name in data.get("before", []):
+                child = ids.get(child_name)
+                if child is None:
+                    raise exceptions.UnknownDependency(names[i], child_name)
+                sources.append(i)
+                targets.append(child)
+            for parent_name in data.get("after", []):
+                parent = ids.get(parent_name)
+                if parent is None:
+                    raise exceptions.UnknownDependency(names[i], parent_name)
+                sources.append(parent)
+                targets.append(i)
+        return Graph(names, ids, sources, targets)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def children(self, i: int) -> array:
+        """Return the ids of the children of node ``i``."""
+        return self.child_ids[self.child_offsets[i]:self.child_offsets[i + 1]]
+
+    def parents(self, i: int) -> array:
+        """Return the ids of the parents of node ``i``."""
+        return self.parent_ids[self.parent_offsets[i]:self.parent_offsets[i + 1]]
+
+    def in_degree(self, i: int) -> int:
+        """Return the number of parent edges of node ``i``."""
+        return self.parent_offsets[i + 1] - self.parent_offsets[i]
+
+    def in_degrees(self) -> array:
+        """Return the number of parent edges of every node."""
+        offsets = self.parent_offsets
+        return array("i", (offsets[i + 1] - offsets[i] for i in range(len(self.names))))
+
+    def _topological_order(self) -> array:
+        """Return node ids parents-first (Kahn's algorithm); raise on a cycle."""
+        remaining = self.in_degrees()
+        order = array("i", (i for i, degree in enumerate(remaining) if degree == 0))
+        child_offsets, child_ids = self.child_offsets, self.child_ids
+        head = 0
+        while head < len(order):
+            i = order[head]
+            head += 1
+            for k in range(child_offsets[i], child_offsets[i + 1]):
+                child = child_ids[k]
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    order.append(child)
+        if len(order) < len(self.names):
+            raise exceptions.CyclicDependency(self._find_cycle(remaining))
+        return order
+
+    def _find_cycle(self, remaining: array) -> List[str]:
+        """Walk parents among the nodes Kahn's algorithm could not order until one repeats."""
+        current = next(i for i, degree in enumerate(remaining) if degree > 0)
+        seen: Dict[int, int] = {}
+        path: List[int] = []
+        while current not in seen:
+            seen[current] = len(path)
+            path.append(current)
+            current = next(p for p in self.parents(current) if remaining[p] > 0)
+        cycle = path[seen[current]:] + [current]
+        return [self.names[i] for i in reversed(cycle)]
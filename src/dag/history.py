@@ -0,0 +1,61 @@
+"""Persistent record of stage wall times from previous runs."""
+
+import json
+import os
+import statistics
+import tempfile
+from typing import Dict, Optional
+
+from . import logger as lg
+
+logger = lg.get_logger(__name__)
+
+
+class History:
+    """Wall time in seconds per fully-qualified stage name (``target:stage``)."""
+
+    DEFAULT_DURATION = 1.0
+
+    def __init__(self, durations: Optional[Dict[str, float]] = None):
+        self.durations: Dict[str, float] = dict(durations or {})
+        self._default: Optional[float] = None
+
+    @staticmethod
+    def load(path: str) -> "History":
+        """Load a history file, returning an empty history if it does not exist yet."""
+        if not os.path.isfile(path):
+            return History()
+        with open(path, encoding="utf-8") as f:
+            return History(json.load(f))
+
+    def save(self, path: str) -> None:
+        """Write the history atomically so a concurrent reader never sees a partial file."""
+        fd, tmp = tempfile.mkstemp(
+            prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or "."
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.durations, f, indent=4, sort_keys=True)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def record(self, name: str, seconds: float) -> None:
+        """Store the latest observed wall time of a stage."""
+        self.durations[name] = seconds
+        self._default = None
+        logger.debug("Recorded duration %s: %.3fs", name, seconds)
+
+    def estimate(self, name: str) -> float:
+        """
+        Return the expected wall time of a stage.
+        Unknown stages fall back to the median of all known durations,
+        or DEFAULT_DURATION when nothing has been recorded yet.
+        """
+        if name in self.durations:
+            return self.durations[name]
+        if self._default is None:
+            self._default = (statistics.median(self.durations.values())
+                             if self.durations else self.DEFAULT_DURATION)
+        return self._default
@@ -0,0 +1,91 @@
+"""Append-only run journal used to resume an interrupted DAG run."""
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from . import events
+from . import logger as lg
+
+logger = lg.get_logger(__name__)
+
+
+class Journal:
+    """
+    One JSON record per node state transition, appended to a file.
+    Records are flushed and fsync'ed in batches: at most every ``sync_interval``
+    seconds or ``sync_every`` records, so a crash loses only the last batch
+    and large DAGs never rewrite the file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        resume: bool = False,
+        sync_interval: float = 0.5,
+        sync_every: int = 1024
+    ):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.sync_every = sync_every
+        # pylint: disable-next=consider-using-with
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def records(path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the records of a journal file in order.
+        A truncated trailing record left by a crash is ignored.
+        """
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Ignoring corrupt journal record in %s: %r", path, line)
+
+    @staticmethod
+    def replay(path: str) -> Dict[str, str]:
+        """Return the last recorded event kind per node."""
+        states: Dict[str, str] = {}
+        if not os.path.isfile(path):
+            return states
+        for record in Journal.records(path):
+            states[record["node"]] = record["kind"]
+        return states
+
+    @staticmethod
+    def completed(path: str) -> set:
+        """Return the names of nodes that finished successfully according to the journal."""
+        return {name for name, kind in Journal.replay(path).items() if kind == events.FINISHED}
+
+    def record(self, event: events.Event) -> None:
+        """Append one event; syncs to disk when the current batch is due."""
+        self._file.write(json.dumps(event.to_dict(), separators=(",", ":")) + "\n")
+        self._pending += 1
+        if (self._pending >= self.sync_every
+                or time.monotonic() - self._last_sync >= self.sync_interval):
+            self.sync()
+
+    def sync(self) -> None:
+        """Flush buffered records and fsync them to disk."""
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        """Sync outstanding records and close the file."""
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc_info: Optional[object]) -> None:
+        self.close()
@@ -0,0 +1,82 @@
+"""Per-stage log files with buffered writes and a bounded in-memory tail."""
+
+import collections
+import gzip
+import os
+from typing import Deque, List
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LogCapture:
+    """Where and how stage output is captured; passed to pool workers, so it stays picklable."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(
+        self,
+        directory: str,
+        compress: bool = False,
+        tail_lines: int = 20,
+        buffer_size: int = 1 << 20
+    ):
+        self.directory = directory
+        self.compress = compress
+        self.tail_lines = tail_lines
+        self.buffer_size = buffer_size
+
+    def path_for(self, name: str) -> str:
+        """Return the log file of a node; ``target:stage`` becomes ``target.stage.log``."""
+        filename = name.replace(os.sep, "_").replace(":", ".")
+        return os.path.join(self.directory, f"{filename}.log{'.gz' if self.compress else ''}")
+
+    def open(self, name: str) -> "StageLog":
+        """Open a node's log for writing, replacing the log of a previous run."""
+        os.makedirs(self.directory, exist_ok=True)
+        return StageLog(self.path_for(name), self.compress, self.tail_lines, self.buffer_size)
+
+
+class StageLog:
+    """A node's log file, remembering the last ``tail_lines`` lines written to it."""
+
+    def __init__(self, path: str, compress: bool, tail_lines: int, buffer_size: int):
+        self.path = path
+        raw = open(path, "wb", buffering=buffer_size)  # pylint: disable=consider-using-with
+        # gzip buffers internally; the raw file then receives large compressed writes.
+        self._file = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if compress else raw
+        self._raw = raw
+        self.lines: Deque[str] = collections.deque(maxlen=tail_lines)
+        self._partial = b""
+
+    def write(self, data: bytes) -> None:
+        """Append output to the file and update the tail."""
+        self._file.write(data)
+        if not self.lines.maxlen:
+            return
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        # A chunk holding a very long partial line must not grow without bound.
+        self._partial = self._partial[-CHUNK_SIZE:]
+        self.lines.extend(line.decode(errors="replace") for line in lines[-self.lines.maxlen:])
+
+    def mark(self, text: str) -> None:
+        """Write a separator line, e.g. before each step."""
+        self.write(f"=== {text}\n".encode())
+
+    def tail(self) -> List[str]:
+        """Return the last lines, including an unterminated final line."""
+        lines = list(self.lines)
+        if self._partial:
+            lines = (lines + [self._partial.decode(errors="replace")])[-self.lines.maxlen:]
+        return lines
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.close()
+
+    def __enter__(self) -> "StageLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
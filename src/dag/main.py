@@ -1,12 +1,31 @@
 """Main entry point for DAG build and execution tool."""
 
+import asyncio
 import json
 import os
+import time
 
 from . import logger as lg
 from . import parser
 from . import runner
+from . import store
 from . import builder
+from . import collector
+from . import merge_cache
+from . import reach
+from . import report as report_db
+from . import serve
+from . import worker
+from .watch import WatchSession
+from .adaptive import AdaptiveLimit
+from .artifacts import ArtifactCache
+from .executors import RemoteExecutor, parse_workers, read_token
+from .history import History
+from .journal import Journal
+from .logs import LogCapture
+from .resources import parse_capacity
+from .stamps import StampStore
+from .trace import Trace
 
 logger = lg.get_logger(__name__)
 
@@ -24,7 +43,7 @@ def set_logger(args):
 
 
 def main():
-    """Parse arguments and dispatch commands."""
+    """Parse arguments and dispatch commands. Returns the process exit code."""
     parserd = parser.parser
     args = parserd.parse_args()
     set_logger(args)
@@ -33,11 +52,24 @@ def main():
     if args.command == "merge":
         merge(args)
     if args.command == "run":
-        run(args)
+        return dispatch(args)
     if args.command == "collect":
         collect(args)
     if args.command == "post":
-        run(args, "post")
+        return dispatch(args, "post")
+    if args.command == "report":
+        report(args)
+    if args.command == "worker":
+        try:
+            token = read_token()
+        except ValueError as e:
+            parser.parser.error(str(e))
+        worker.serve(args.host, args.port, args.jobs, token)
+    if args.command == "watch":
+        watch(args)
+    if args.command == "serve":
+        serve.serve(args.socket or serve.socket_path(), args.jobs, run)
+    return 0
 
 
 def merge_items(args):
@@ -46,80 +78,220 @@ def merge_items(args):
         stages = json.load(f)
     with open(args.targets, encoding="utf-8") as f:
         targets = json.load(f)
-    b = builder.Builder(stages, targets)
+    if args.cache:
+        cache = merge_cache.MergeCache(args.cache)
+        combined, keys = merge_cache.build(stages, targets, cache, jobs=args.jobs)
+        cache.prune(keys)
+        if args.stats:
+            logger.warning("Merge cache: %d hits, %d misses", cache.hits, cache.misses)
+        return combined
+    b = builder.Builder(stages, targets, jobs=args.jobs)
     return b.build()
 
 
 def merge(args):
-    """Write merged stage definitions to output JSON."""
+    """Write merged stage definitions to the output file."""
     combined = merge_items(args)
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(combined, f, indent=4)
+    store.write(args.output, combined, store.format_for(args.output, args.format))
 
 
-def run(args, mode="all"):
-    """Execute DAG stages or post steps."""
-    with open(args.stages, encoding="utf-8") as f:
-        all_stages = json.load(f)
+def sidecar_path(stages: str, suffix: str) -> str:
+    """Return the path of a file kept next to the merged file, e.g. merged.<suffix>."""
+    root, _ = os.path.splitext(stages)
+    return f"{root}.{suffix}"
 
-    stages = all_stages
 
-    if args.only:
-        if args.only not in all_stages:
-            raise ValueError(f"Stage '{args.only}' not found in merged file")
+def load_stages(args, cached=None):
+    """
+    Load the merged stages, or only those picked by --only/--start/--end,
+    from the file or from a merged file the daemon keeps loaded.
+    """
+    selected = args.only or args.start or args.end
+    if cached is not None:
+        if not selected:
+            return cached.stages
+        index = cached.index
+    elif not selected:
+        return store.load(args.stages)
+    else:
+        index = reach.open_index(args.stages, sidecar_path(args.stages, "reach"))
+    names = reach.select(
+        index,
+        only=args.only,
+        with_deps=args.with_deps,
+        with_children=args.with_children,
+        start=args.start,
+        end=args.end
+    )
+    logger.info("Selected %d of %d stages", len(names), len(index.names))
+    if cached is not None:
+        return store.subset(cached.stages, names)
+    with store.MergedFile(args.stages) as merged:
+        return store.subset(merged, names)
 
-        def collect_with_deps(stage_name, visited):
-            if stage_name in visited:
-                return
-            visited.add(stage_name)
-            stage = all_stages[stage_name]
-            for dep in stage.get("after", []):
-                collect_with_deps(dep, visited)
 
-        selected = set()
-        if args.with_deps:
-            collect_with_deps(args.only, selected)
-        selected.add(args.only)
+def dispatch(args, mode="all"):
+    """
+    Run through the `serve` daemon when one is listening, else in this process.
+    Runs on remote workers, with the async engine or with --fail-fast always stay in
+    this process: the daemon cannot stop a request's running stages.
+    """
+    if args.adaptive and (args.workers or args.engine != "process"):
+        parser.parser.error("--adaptive needs the process engine on this host")
+    if args.adaptive and not 1 <= args.min_workers <= args.max_workers:
+        parser.parser.error("--min-workers must be between 1 and -j")
+    if not args.no_daemon and not args.workers and args.engine == "process" \
+            and args.on_failure != runner.FAIL_FAST:
+        code = serve.request(serve.socket_path(), args, mode)
+        if code is not None:
+            return code
+    return run(args, mode)
 
-        stages = {k: all_stages[k] for k in selected}
 
-        for v in stages.values():
-            v["before"] = [b for b in v.get("before", []) if b in stages]
-            v["after"] = [a for a in v.get("after", []) if a in stages]
+def _launch_options(args, executor=None, workdir=None):
+    """
+    Build the launch options that need setting up from the arguments: the log capture,
+    the executor (workers given with --workers), the trace, the artifact cache and
+    the adaptive concurrency limit.
+    """
+    if executor is None and args.workers:
+        executor = RemoteExecutor(parse_workers(args.workers))
+    artifacts = None
+    if args.artifact_cache:
+        artifacts = ArtifactCache(
+            args.artifact_cache, int(args.artifact_cache_size * 2**30), workdir
+        )
+    adaptive = None
+    if args.adaptive:
+        adaptive = AdaptiveLimit(args.min_workers, args.max_workers, int(args.mem_floor * 2**30))
+    logs = LogCapture(args.log_dir, args.log_compress, args.log_tail) if args.log_dir else None
+    return {
+        "logs": logs,
+        "executor": executor,
+        "trace": Trace() if args.trace else None,
+        "artifacts": artifacts,
+        "adaptive": adaptive,
+    }
 
-    runner.Runner.create_from_dict(stages).launch(
-        max_workers=args.max_workers,
-        mode=mode
-    )
+
+def _report_run(args, dag, options):
+    """
+    Show the last output of failed stages, save and summarize the trace, and trim
+    the artifact cache after a launch with ``options`` from _launch_options.
+    """
+    for name, node in dag.nodes.items():
+        if node.status == runner.FAILED and dag.tails.get(name):
+            logger.error("Last output of %s (%s):\n%s",
+                         name, options["logs"].path_for(name), "\n".join(dag.tails[name]))
+    trace = options["trace"]
+    if trace is not None:
+        trace.save(args.trace)
+        logger.warning("%s", trace.summary(dag.graph))
+    artifacts = options["artifacts"]
+    if artifacts is not None:
+        evicted = artifacts.evict()
+        logger.warning("Artifact cache: %s, evicted=%d",
+                       ", ".join(f"{k}={v}" for k, v in artifacts.summary().items()), evicted)
+
+
+def run(args, mode="all", cached=None, executor=None, workdir=None):
+    """
+    Execute DAG stages or post steps. Returns 1 if any stage failed, else 0.
+    The daemon passes the merged file it keeps loaded, an executor on its pool and
+    the client's directory, which relative stage paths resolve from.
+    """
+    stages = load_stages(args, cached)
+
+    history_path = args.history or sidecar_path(args.stages, "history.json")
+    if report_db.is_database(history_path):
+        history = report_db.load_history(history_path)
+    else:
+        history = History.load(history_path)
+
+    dag = runner.Runner.create_from_dict(stages)
+
+    stamps = None
+    stamps_path = sidecar_path(args.stages, "stamps.json")
+    if args.incremental:
+        stamps = StampStore.load(stamps_path, args.checksum, workdir)
+        if not args.force:
+            logger.info("Skipping %d up-to-date stages", dag.skip_up_to_date(stamps, mode))
+
+    journal_path = sidecar_path(args.stages, "journal")
+    if args.resume:
+        logger.info("Resuming: %d stages already completed",
+                    dag.restore(Journal.completed(journal_path)))
+
+    options = _launch_options(args, executor, workdir)
+    with Journal(journal_path, resume=args.resume) as journal:
+        summary = dag.launch(
+            max_workers=args.max_workers,
+            mode=mode,
+            engine=args.engine,
+            schedule=args.schedule,
+            history=history,
+            stamps=stamps,
+            listeners=[journal.record],
+            on_failure=args.on_failure,
+            capacity=parse_capacity(args.resources) if args.resources else None,
+            batch_under=args.batch_under,
+            batch_size=args.batch_size,
+            **options
+        )
+    if stamps is not None:
+        stamps.save(stamps_path)
+    # Post-only runs would overwrite full-stage wall times with post-step times.
+    # A report database is only updated through `report`.
+    if mode == "all" and not report_db.is_database(history_path):
+        history.save(history_path)
+
+    _report_run(args, dag, options)
+    logger.warning("Summary: %s", ", ".join(f"{k}={v}" for k, v in summary.items()))
+    return 1 if summary[runner.FAILED] or summary[runner.CANCELLED] else 0
 
 
 def collect(args):
     """Collect post outputs from executed stages into a single JSON report."""
-    with open(args.stages, encoding="utf-8") as f:
-        stages = json.load(f)
+    with store.MergedFile(args.stages) as merged:
+        statuses = collector.collect(
+            merged,
+            args.output,
+            jobs=args.jobs,
+            max_bytes=args.max_bytes,
+            mode=collector.TAIL if args.tail else collector.HEAD
+        )
+    logger.warning("Collect: %s", ", ".join(f"{k}={v}" for k, v in sorted(statuses.items())))
+
 
-    runs = runner.Runner.create_from_dict(stages)
-    outputs = {}
-
-    for name, node in runs.nodes.items():
-        if node.post:
-            directory = node.post.get("directory", "")
-            output = node.post.get("output", "")
-            filename = f"{directory}/{output}"
-            if not os.path.isfile(filename):
-                outputs[name] = {
-                    "status": "failed",
-                    "content": "File not found",
-                    "filename": filename
-                }
-                continue
-
-            with open(filename, encoding="utf-8") as f:
-                outputs[name] = {
-                    "status": "unverified",
-                    "content": f.read(),
-                    "filename": filename
-                }
-
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(outputs, f, indent=4)
+def report(args):
+    """Store the journal and collect results of one run in the report database."""
+    rows = {}
+    if args.journal:
+        rows = report_db.journal_rows(args.journal)
+    if os.path.isfile(args.analyzed):
+        for name, row in report_db.analyzed_rows(args.analyzed).items():
+            rows.setdefault(name, {}).update(row)
+    else:
+        logger.warning("No analyzed file at %s", args.analyzed)
+
+    run_id = args.run_id or time.strftime("%Y%m%d-%H%M%S")
+    with report_db.ReportDB(args.db) as db:
+        count = db.ingest(run_id, rows)
+    logger.warning("Report: %d stages of run %s written to %s", count, run_id, args.db)
+
+
+def watch(args):
+    """Run the stages, then keep re-running those affected by file changes until interrupted."""
+    dag = runner.Runner.create_from_dict(load_stages(args))
+    session = WatchSession(
+        dag,
+        max_workers=args.max_workers,
+        logs=LogCapture(args.log_dir) if args.log_dir else None,
+        debounce=args.debounce,
+        polling=args.poll,
+        interval=args.poll_interval
+    )
+    try:
+        asyncio.run(session.run())
+    except KeyboardInterrupt:
+        logger.warning("Stopped watching after %d stage runs", session.runs)
@@ -0,0 +1,96 @@
+"""On-disk cache of each target's expanded stages, used to make merge incremental."""
+
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import builder
+from . import logger as lg
+
+logger = lg.get_logger(__name__)
+
+# Follows the Builder output format, so entries it wrote in an older one are not reused.
+CACHE_VERSION = builder.OUTPUT_VERSION
+# Names of cache entries; other files in the directory are left alone.
+ENTRY_PATTERN = re.compile(r"^[0-9a-f]{64}\.json$")
+
+
+def digest(obj: Any) -> str:
+    """Return a stable sha256 digest of a JSON-serializable object."""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+class MergeCache:
+    """One JSON file per target, named by the hash of the stage templates and the target entry."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(templates_digest: str, target_info: Dict[str, Any]) -> str:
+        """Return the cache key of a target: templates hash plus its own entry with overrides."""
+        return digest([CACHE_VERSION, templates_digest, target_info])
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached stages for a key, or None."""
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                stages = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return stages
+
+    def put(self, key: str, stages: Dict[str, Any]) -> None:
+        """Store a target's stages atomically."""
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stages, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def prune(self, keep: Iterable[str]) -> int:
+        """Remove cache entries not in ``keep``; returns the number removed."""
+        keep_files = {f"{key}.json" for key in keep}
+        removed = 0
+        for filename in os.listdir(self.directory):
+            if ENTRY_PATTERN.match(filename) and filename not in keep_files:
+                os.remove(os.path.join(self.directory, filename))
+                removed += 1
+        return removed
+
+
+def build(
+    stages: Dict[str, Any],
+    targets: List[Dict[str, Any]],
+    cache: MergeCache,
+    jobs: int = 1
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Build the merged stages, re-expanding only the targets whose key is not cached.
+    Returns the merged stages in target order and the keys used.
+    """
+    templates_digest = digest(stages)
+    keys = [MergeCache.key(templates_digest, t) for t in targets]
+    cached = [cache.get(key) for key in keys]
+
+    missing = [t for t, c in zip(targets, cached) if c is None]
+    built = builder.Builder(stages, missing, jobs=jobs).build() if missing else {}
+
+    outputs: Dict[str, Any] = {}
+    for target_info, key, target_stages in zip(targets, keys, cached):
+        if target_stages is None:
+            name = target_info["target"]
+            target_stages = {f"{name}:{s}": built[f"{name}:{s}"] for s in stages}
+            cache.put(key, target_stages)
+        outputs.update(target_stages)
+    return outputs, keys
@@ -36,6 +36,57 @@ merge_parser.add_argument(
     default="merged.json",
     help="Output file path"
 )
+merge_parser.add_argument(
+    "--jobs", "-j",
+    default=1,
+    type=int,
+    help="Number of processes to expand targets with"
+)
+merge_parser.add_argument(
+    "--format",
+    choices=["json", "jsonl"],
+    help="Output format: pretty JSON, or compact indexed JSON Lines that run/post "
+         "can load lazily (default: jsonl for a .jsonl output, json otherwise)"
+)
+merge_parser.add_argument(
+    "--cache",
+    help="Directory caching each target's expanded stages; only targets whose "
+         "stage templates or target entry changed are expanded again"
+)
+merge_parser.add_argument(
+    "--stats",
+    action="store_true",
+    help="Report merge cache hits and misses"
+)
+
+# --- Stage selection shared by run/post/watch ---
+def add_selection(par, verb):
+    """Add the stage selection arguments to a subparser."""
+    par.add_argument(
+        "--only",
+        type=str,
+        help=f"{verb} only these stages: names or globs (format: target:stage), "
+             "comma-separated, e.g. '*:RTL-LINT'"
+    )
+    par.add_argument(
+        "--with-deps",
+        action="store_true",
+        help="With --only, also select the stages they depend on, recursively"
+    )
+    par.add_argument(
+        "--with-children",
+        action="store_true",
+        help="With --only, also select the stages that depend on them, recursively"
+    )
+    par.add_argument(
+        "--start",
+        help="Select these stages (names or globs) and everything downstream of them"
+    )
+    par.add_argument(
+        "--end",
+        help="Select these stages (names or globs) and everything upstream of them; "
+             "with --start, only the stages on paths between the two"
+    )
 
 # --- Run/Post shared options ---
 def add_to_parser(par):
@@ -47,19 +98,147 @@ def add_to_parser(par):
     )
     par.add_argument(
         "--max_workers", "-j",
-        default=os.cpu_count() // 2,
+        default=max(1, os.cpu_count() // 2),
         type=int,
-        help="Number of parallel workers to run"
+        help="Number of parallel workers to run; with --adaptive, the most run at once"
     )
+    add_selection(par, "Run")
     par.add_argument(
-        "--only",
-        type=str,
-        help="Run only a specific stage (format: target:stage)"
+        "--engine",
+        choices=["process", "async"],
+        default="process",
+        help="Execution engine: process pool workers, or asyncio subprocesses "
+             "from a single event loop (-j then limits concurrent stages)"
     )
     par.add_argument(
-        "--with-deps",
+        "--schedule",
+        choices=["critical-path", "lifo"],
+        default="critical-path",
+        help="Order in which ready stages are dispatched: longest expected remaining "
+             "path first, or most recently readied first"
+    )
+    par.add_argument(
+        "--history",
+        help="Stage duration history file, or a report database (default: <merged>.history.json)"
+    )
+    par.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip stages that are up to date since their last successful run"
+    )
+    par.add_argument(
+        "--force",
         action="store_true",
-        help="Also run dependent posts recursively"
+        help="With --incremental, run every stage anyway and refresh its stamp"
+    )
+    par.add_argument(
+        "--checksum",
+        action="store_true",
+        help="With --incremental, compare input files by content hash instead of mtime"
+    )
+    par.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run: stages completed according to the run "
+             "journal (<merged>.journal) are not run again"
+    )
+    par.add_argument(
+        "--resources",
+        help="Resource capacity as a JSON file or name=amount list, e.g. "
+             "'cores=16,mem_gb=64,license.vcs=2'; stages only start while their "
+             "declared resources fit"
+    )
+    par.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Adjust the number of stages run at once between --min-workers and -j "
+             "to the load average, iowait and available memory of this host"
+    )
+    par.add_argument(
+        "--min-workers",
+        default=1,
+        type=int,
+        help="With --adaptive, the fewest stages run at once, also the starting number"
+    )
+    par.add_argument(
+        "--mem-floor",
+        default=1.0,
+        type=float,
+        help="With --adaptive, pause dispatch while less than this many GiB of memory "
+             "are available (default: 1)"
+    )
+    par.add_argument(
+        "--batch-under",
+        type=float,
+        help="Also run stages whose recorded duration is below this many seconds "
+             "in batches, like stages marked lightweight"
+    )
+    par.add_argument(
+        "--batch-size",
+        default=16,
+        type=int,
+        help="Most lightweight stages run in one batch (default: 16)"
+    )
+    par.add_argument(
+        "--artifact-cache",
+        help="Directory of a cache of stage outputs, possibly shared: stages whose commands "
+             "and declared inputs match a stored entry get their outputs restored instead "
+             "of running"
+    )
+    par.add_argument(
+        "--artifact-cache-size",
+        default=10.0,
+        type=float,
+        help="With --artifact-cache, size in GiB the cache is trimmed to after the run, "
+             "least recently used entries first (default: 10)"
+    )
+    par.add_argument(
+        "--trace",
+        help="Write per-stage timing (ready, dispatch, start, end, worker, CPU time, "
+             "peak RSS) as a Chrome/Perfetto trace JSON to this file and print a summary"
+    )
+    par.add_argument(
+        "--workers",
+        help="Run stages on `workscript worker` agents instead of local processes, "
+             "as a host[:port] list, e.g. 'node1:7071,node2:7071' (process engine only)"
+    )
+    par.add_argument(
+        "--log-dir",
+        help="Write each stage's run and post output to its own log file in this "
+             "directory instead of the terminal"
+    )
+    par.add_argument(
+        "--log-compress",
+        action="store_true",
+        help="With --log-dir, gzip the log files on the fly"
+    )
+    par.add_argument(
+        "--log-tail",
+        default=20,
+        type=int,
+        help="With --log-dir, number of last log lines shown for failed stages"
+    )
+    par.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Run in this process even when a `workscript serve` daemon is listening"
+    )
+    failure = par.add_mutually_exclusive_group()
+    failure.add_argument(
+        "--keep-going", "-k",
+        dest="on_failure",
+        action="store_const",
+        const="keep-going",
+        default="keep-going",
+        help="When a stage fails, skip its descendants and keep running "
+             "independent stages (default)"
+    )
+    failure.add_argument(
+        "--fail-fast",
+        dest="on_failure",
+        action="store_const",
+        const="fail-fast",
+        help="When a stage fails, stop submitting stages and cancel running ones"
     )
 
 # --- Run ---
@@ -70,6 +249,44 @@ add_to_parser(run_parser)
 post_parser = subparsers.add_parser("post", help="Run only post-processing stages")
 add_to_parser(post_parser)
 
+# --- Watch ---
+watch_parser = subparsers.add_parser(
+    "watch", help="Run stages, then re-run those affected by file changes"
+)
+watch_parser.add_argument(
+    "--stages", "-s",
+    default="merged.json",
+    help="Path to the merged file"
+)
+watch_parser.add_argument(
+    "--max_workers", "-j",
+    default=max(1, os.cpu_count() // 2),
+    type=int,
+    help="Number of stages run at once"
+)
+add_selection(watch_parser, "Watch")
+watch_parser.add_argument(
+    "--log-dir",
+    help="Write each stage's output to its own log file in this directory"
+)
+watch_parser.add_argument(
+    "--debounce",
+    default=0.3,
+    type=float,
+    help="Seconds without further changes before affected stages are re-run"
+)
+watch_parser.add_argument(
+    "--poll",
+    action="store_true",
+    help="Poll directory listings instead of using inotify"
+)
+watch_parser.add_argument(
+    "--poll-interval",
+    default=1.0,
+    type=float,
+    help="Seconds between directory scans when polling"
+)
+
 # --- Collect ---
 collect_parser = subparsers.add_parser("collect", help="Collect analyzed post output files")
 collect_parser.add_argument(
@@ -82,6 +299,22 @@ collect_parser.add_argument(
     default="analyzed.json",
     help="Output file path"
 )
+collect_parser.add_argument(
+    "--jobs", "-j",
+    default=8,
+    type=int,
+    help="Number of post output files read concurrently"
+)
+collect_parser.add_argument(
+    "--max-bytes",
+    type=int,
+    help="Keep at most this many bytes of each post output file"
+)
+collect_parser.add_argument(
+    "--tail",
+    action="store_true",
+    help="With --max-bytes, keep the end of each file instead of its beginning"
+)
 
 # --- Report ---
 report_parser = subparsers.add_parser("report", help="Report based on analyzed file")
@@ -90,3 +323,52 @@ report_parser.add_argument(
     default="analyzed.json",
     help="Path to the analyzed file"
 )
+report_parser.add_argument(
+    "--journal",
+    help="Run journal (<merged>.journal) with per-stage status and timing"
+)
+report_parser.add_argument(
+    "--db",
+    default="report.db",
+    help="SQLite database to write to"
+)
+report_parser.add_argument(
+    "--run-id",
+    help="Identifier of the reported run (default: current date and time)"
+)
+
+# --- Worker ---
+worker_parser = subparsers.add_parser("worker", help="Run stages for remote `run`/`post` commands")
+worker_parser.add_argument(
+    "--host",
+    default="127.0.0.1",
+    help="Address to listen on; use 0.0.0.0 or a host address to accept other hosts"
+)
+worker_parser.add_argument(
+    "--port", "-p",
+    default=7071,
+    type=int,
+    help="Port to listen on"
+)
+worker_parser.add_argument(
+    "--jobs", "-j",
+    default=os.cpu_count(),
+    type=int,
+    help="Number of stages run at once for a coordinator"
+)
+
+# --- Serve ---
+serve_parser = subparsers.add_parser(
+    "serve", help="Run `run`/`post` requests from local clients on a warm worker pool"
+)
+serve_parser.add_argument(
+    "--socket",
+    help="Unix socket to listen on (default: $WORKSCRIPT_SOCKET, or "
+         "workscript-<uid>.sock in $XDG_RUNTIME_DIR or the temp directory)"
+)
+serve_parser.add_argument(
+    "--jobs", "-j",
+    default=os.cpu_count(),
+    type=int,
+    help="Number of worker processes, the limit on stages running at once across requests"
+)
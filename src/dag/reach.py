@@ -0,0 +1,248 @@
+"""
+Reachability index of a merged DAG, used to select subgraphs without walking it.
+
+Each node is labelled with the postorder intervals of a spanning-forest DFS that
+cover all of its descendants (tree-cover interval labelling); a second labelling
+on the reversed graph covers its ancestors. Descendants or ancestors of any set of
+nodes are then the merged intervals of their labels, read off the postorder
+arrays. The index is built once per merged file and cached next to it.
+"""
+
+import fnmatch
+import json
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import logger as lg
+from . import store
+from .graph import Graph
+
+logger = lg.get_logger(__name__)
+
+HEADER = {"format": "workscript-reach", "version": 1}
+GLOB_CHARS = "*?["
+
+Labels = Tuple[array, array, array]
+
+
+def _label(count: int, order: List[int], offsets: array, ids: array) -> Labels:
+    """
+    Label every node with the intervals of postorder numbers covering the nodes
+    it reaches through ``offsets``/``ids``, given ``order`` with each node before
+    all the nodes it reaches.
+    Returns (interval offsets, interval bounds as lo/hi pairs, node of each postorder number).
+    """
+    # pylint: disable=too-many-locals
+    low = array("i", bytes(4 * count))
+    post = array("i", [-1]) * count
+    nodes = array("i", bytes(4 * count))
+    counter = 0
+    # Iterative DFS over the spanning forest: a node's subtree gets consecutive numbers.
+    for root in order:
+        if post[root] != -1:
+            continue
+        post[root] = -2
+        low[root] = counter
+        stack = [(root, offsets[root])]
+        while stack:
+            node, k = stack[-1]
+            end = offsets[node + 1]
+            while k < end and post[ids[k]] != -1:
+                k += 1
+            if k < end:
+                child = ids[k]
+                stack[-1] = (node, k + 1)
+                post[child] = -2
+                low[child] = counter
+                stack.append((child, offsets[child]))
+                continue
+            stack.pop()
+            post[node] = counter
+            nodes[counter] = node
+            counter += 1
+
+    labels: List[List[int]] = [[] for _ in range(count)]
+    for node in reversed(order):
+        intervals = [(low[node], post[node])]
+        for k in range(offsets[node], offsets[node + 1]):
+            child = labels[ids[k]]
+            intervals.extend(zip(child[::2], child[1::2]))
+        labels[node] = _merge(intervals)
+
+    label_offsets = array("i", [0])
+    bounds = array("i")
+    for flat in labels:
+        bounds.extend(flat)
+        label_offsets.append(len(bounds))
+    return label_offsets, bounds, nodes
+
+
+def _merge(intervals: List[Tuple[int, int]]) -> List[int]:
+    """Sort and coalesce overlapping or adjacent intervals; return them as flat lo/hi pairs."""
+    intervals.sort()
+    flat: List[int] = []
+    for lo, hi in intervals:
+        if flat and lo <= flat[-1] + 1:
+            if hi > flat[-1]:
+                flat[-1] = hi
+        else:
+            flat.extend((lo, hi))
+    return flat
+
+
+def source_of(path: str) -> Dict[str, int]:
+    """Return what identifies a version of the merged file: its size and mtime."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class ReachIndex:
+    """Ancestor and descendant interval labels of every node, in merged-file order."""
+
+    def __init__(self, names: List[str], down: Labels, up: Labels):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.down = down
+        self.up = up
+
+    @staticmethod
+    def from_graph(graph: Graph) -> "ReachIndex":
+        """Label a graph's nodes with their descendants and ancestors."""
+        count = len(graph)
+        order = list(graph.order)
+        down = _label(count, order, graph.child_offsets, graph.child_ids)
+        up = _label(count, order[::-1], graph.parent_offsets, graph.parent_ids)
+        return ReachIndex(graph.names, down, up)
+
+    @staticmethod
+    def _reached(labels: Labels, ids: Iterable[int]) -> Set[int]:
+        offsets, bounds, nodes = labels
+        intervals = []
+        for i in ids:
+            flat = bounds[offsets[i]:offsets[i + 1]]
+            intervals.extend(zip(flat[::2], flat[1::2]))
+        flat = _merge(intervals)
+        reached: Set[int] = set()
+        for k in range(0, len(flat), 2):
+            reached.update(nodes[flat[k]:flat[k + 1] + 1])
+        return reached
+
+    def descendants(self, ids: Iterable[int]) -> Set[int]:
+        """Return the given nodes and every node that depends on them."""
+        return self._reached(self.down, ids)
+
+    def ancestors(self, ids: Iterable[int]) -> Set[int]:
+        """Return the given nodes and every node they depend on."""
+        return self._reached(self.up, ids)
+
+    def match(self, selector: str) -> List[int]:
+        """
+        Return the nodes named by a comma-separated list of names or globs such as
+        ``*:RTL-LINT``; raise ValueError for an item that matches nothing.
+        """
+        matched: List[int] = []
+        for item in filter(None, (part.strip() for part in selector.split(","))):
+            if not any(c in item for c in GLOB_CHARS):
+                if item not in self.ids:
+                    raise ValueError(f"Stage '{item}' not found in merged file")
+                matched.append(self.ids[item])
+                continue
+            found = fnmatch.filter(self.names, item)
+            if not found:
+                raise ValueError(f"No stage matches '{item}'")
+            matched.extend(self.ids[name] for name in found)
+        return matched
+
+    def save(self, path: str, source: Dict[str, int]) -> None:
+        """
+        Write the index atomically: a JSON header line with the merged file's
+        size and mtime, a JSON line of names, then the label arrays.
+        """
+        arrays = [*self.down, *self.up]
+        header = dict(HEADER, source=source, lengths=[len(a) for a in arrays])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(json.dumps(self.names, separators=(",", ":")).encode() + b"\n")
+            for a in arrays:
+                a.tofile(f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: str, source: Dict[str, int]) -> Optional["ReachIndex"]:
+        """Read a saved index; None if it is missing, unreadable or of another merged file."""
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                if {k: header.get(k) for k in HEADER} != HEADER or header["source"] != source:
+                    return None
+                names = json.loads(f.readline())
+                arrays = []
+                for length in header["lengths"]:
+                    a = array("i")
+                    a.fromfile(f, length)
+                    arrays.append(a)
+        except (OSError, ValueError, KeyError, EOFError):
+            return None
+        return ReachIndex(names, tuple(arrays[:3]), tuple(arrays[3:]))
+
+
+def open_index(merged_path: str, index_path: str) -> ReachIndex:
+    """Return the cached index of a merged file, rebuilding it if the file changed."""
+    source = source_of(merged_path)
+    index = ReachIndex.load(index_path, source)
+    if index is not None:
+        return index
+    logger.info("Building reachability index %s", index_path)
+    with store.MergedFile(merged_path) as merged:
+        edges = {
+            name: {"before": data.get("before", []), "after": data.get("after", [])}
+            for name, data in merged.items()
+        }
+    index = ReachIndex.from_graph(Graph.from_dict(edges))
+    try:
+        index.save(index_path, source)
+    except OSError as e:
+        logger.warning("Cannot cache reachability index %s: %s", index_path, e)
+    return index
+
+
+def select(
+    index: ReachIndex,
+    only: Optional[str] = None,
+    with_deps: bool = False,
+    with_children: bool = False,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> List[str]:
+    """
+    Return the names of the selected stages in merged-file order. Each given
+    selector narrows the selection:
+    :param only: Stages to run, as names or globs, with their ancestors if ``with_deps``
+        and their descendants if ``with_children``.
+    :param start: Stages to start from: they and everything downstream of them.
+    :param end: Stages to end at: they and everything upstream of them.
+    """
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    selected: Optional[Set[int]] = None
+
+    def narrow(ids: Set[int]) -> None:
+        nonlocal selected
+        selected = ids if selected is None else selected & ids
+
+    if only:
+        matched = index.match(only)
+        ids = set(matched)
+        if with_deps:
+            ids |= index.ancestors(matched)
+        if with_children:
+            ids |= index.descendants(matched)
+        narrow(ids)
+    if start:
+        narrow(index.descendants(index.match(start)))
+    if end:
+        narrow(index.ancestors(index.match(end)))
+    if selected is None:
+        return list(index.names)
+    return [index.names[i] for i in sorted(selected)]
@@ -0,0 +1,197 @@
+"""Local SQLite store of run and collect results across runs."""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import events
+from . import logger as lg
+from .history import History
+from .journal import Journal
+
+logger = lg.get_logger(__name__)
+
+DATABASE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id TEXT NOT NULL,
+    target TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    run_status TEXT,
+    returncode INTEGER,
+    started REAL,
+    ended REAL,
+    duration REAL,
+    post_status TEXT,
+    filename TEXT,
+    rules TEXT,
+    PRIMARY KEY (run_id, target, stage)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS stages_by_target ON stages (target, stage, run_id);
+CREATE INDEX IF NOT EXISTS stages_by_stage ON stages (stage, run_id);
+"""
+
+COLUMNS = (
+    "run_status", "returncode", "started", "ended", "duration",
+    "post_status", "filename", "rules"
+)
+
+# A row reported twice for the same run (e.g. journal first, collect later) is
+# merged: values that the new report does not carry are kept.
+UPSERT = (
+    f"INSERT INTO stages (run_id, target, stage, {', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(COLUMNS) + 3))}) "
+    "ON CONFLICT (run_id, target, stage) DO UPDATE SET "
+    + ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in COLUMNS)
+)
+
+
+def is_database(path: str) -> bool:
+    """Return True if a path names a report database rather than a JSON file."""
+    return path.endswith(DATABASE_SUFFIXES)
+
+
+def split_name(name: str) -> Tuple[str, str]:
+    """Split a fully-qualified node name into (target, stage)."""
+    target, _, stage = name.rpartition(":")
+    return target, stage
+
+
+def journal_rows(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Summarize a run journal per node: last event kind, return code, and the time
+    from the start of its last run to the final event. Nodes without a recorded
+    start are timed from their submission.
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    for record in Journal.records(path):
+        row = rows.setdefault(record["node"], {})
+        kind = record["kind"]
+        row["run_status"] = kind
+        if kind == events.SUBMITTED:
+            row.setdefault("started", record["timestamp"])
+        elif kind == events.STARTED:
+            row["started"] = record["timestamp"]
+        else:
+            row["ended"] = record["timestamp"]
+            row["returncode"] = record.get("returncode")
+            if "started" in row:
+                row["duration"] = row["ended"] - row["started"]
+    return rows
+
+
+def analyzed_rows(path: str) -> Dict[str, Dict[str, Any]]:
+    """Summarize a collect report per node: status, file and rule results."""
+    with open(path, encoding="utf-8") as f:
+        analyzed = json.load(f)
+    return {
+        name: {
+            "post_status": entry.get("status"),
+            "filename": entry.get("filename"),
+            "rules": json.dumps(entry["rules"]) if "rules" in entry else None
+        }
+        for name, entry in analyzed.items()
+    }
+
+
+class ReportDB:
+    """
+    Run results indexed by run id, target and stage.
+    The database runs in WAL mode so reports can be written while other
+    processes query it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.connection.close()
+
+    def __enter__(self) -> "ReportDB":
+        return self
+
+    def __exit__(self, *exc_info: Optional[object]) -> None:
+        self.close()
+
+    def ingest(self, run_id: str, rows: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Insert or update the rows of one run, BATCH_SIZE rows per transaction.
+        Returns the number of rows written.
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO runs (run_id, created) VALUES (?, ?)", (run_id, time.time())
+            )
+        count = 0
+        for batch in _batches(self._values(run_id, rows), BATCH_SIZE):
+            with self.connection:
+                self.connection.executemany(UPSERT, batch)
+            count += len(batch)
+        logger.info("Reported %d stages for run %s into %s", count, run_id, self.path)
+        return count
+
+    @staticmethod
+    def _values(run_id: str, rows: Dict[str, Dict[str, Any]]) -> Iterator[tuple]:
+        for name, row in rows.items():
+            target, stage = split_name(name)
+            yield (run_id, target, stage) + tuple(row.get(c) for c in COLUMNS)
+
+    def runs(self) -> List[str]:
+        """Return the run ids, oldest first."""
+        cursor = self.connection.execute("SELECT run_id FROM runs ORDER BY created, run_id")
+        return [run_id for (run_id,) in cursor]
+
+    def stage_history(self, target: str, stage: str) -> List[Dict[str, Any]]:
+        """Return every recorded result of one stage, oldest run first."""
+        cursor = self.connection.execute(
+            f"SELECT s.run_id, {', '.join(COLUMNS)} FROM stages s "
+            "JOIN runs r ON r.run_id = s.run_id "
+            "WHERE s.target = ? AND s.stage = ? ORDER BY r.created, s.run_id",
+            (target, stage)
+        )
+        return [dict(zip(("run_id",) + COLUMNS, row)) for row in cursor]
+
+    def history(self) -> History:
+        """Return the duration of each stage's latest successful run."""
+        cursor = self.connection.execute(
+            "SELECT target, stage, duration FROM ("
+            "  SELECT s.target, s.stage, s.duration, ROW_NUMBER() OVER ("
+            "    PARTITION BY s.target, s.stage ORDER BY r.created DESC, s.run_id DESC) AS latest"
+            "  FROM stages s JOIN runs r ON r.run_id = s.run_id"
+            "  WHERE s.run_status = ? AND s.duration IS NOT NULL"
+            ") WHERE latest = 1",
+            (events.FINISHED,)
+        )
+        return History({f"{target}:{stage}": duration for target, stage, duration in cursor})
+
+
+def _batches(values: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    batch: List[tuple] = []
+    for value in values:
+        batch.append(value)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_history(path: str) -> History:
+    """Load stage durations from a report database, or an empty history if it does not exist."""
+    if not os.path.isfile(path):
+        return History()
+    with ReportDB(path) as db:
+        return db.history()
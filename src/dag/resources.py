@@ -0,0 +1,68 @@
+"""Counted resources (cores, memory, licenses) that stages reserve while they run."""
+
+import json
+import os
+from typing import Dict, Iterable
+
+from . import logger as lg
+
+logger = lg.get_logger(__name__)
+
+
+def parse_capacity(spec: str) -> Dict[str, float]:
+    """
+    Parse a capacity table from a JSON file path or a comma-separated
+    ``name=amount`` list, e.g. ``cores=16,mem_gb=64,license.vcs=2``.
+    """
+    if os.path.isfile(spec):
+        with open(spec, encoding="utf-8") as f:
+            return {name: float(amount) for name, amount in json.load(f).items()}
+
+    capacity = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, amount = item.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid resource '{item}', expected name=amount")
+        capacity[name.strip()] = float(amount)
+    return capacity
+
+
+class ResourcePool:
+    """
+    Available amount of each resource in the capacity table.
+    Resources a stage requests but the table does not list are not limited.
+    """
+
+    def __init__(self, capacity: Dict[str, float] = None):
+        self.capacity = dict(capacity or {})
+        self.available = dict(self.capacity)
+
+    def check(self, nodes: Iterable) -> None:
+        """Raise ValueError for a node that could never fit, even on an idle machine."""
+        for node in nodes:
+            for name, amount in node.resources.items():
+                if name in self.capacity and amount > self.capacity[name]:
+                    raise ValueError(
+                        f"Stage '{node.name}' requires {name}={amount:g} "
+                        f"but the capacity is {self.capacity[name]:g}"
+                    )
+
+    def fits(self, node) -> bool:
+        """Return whether the node's requirements are currently available."""
+        return all(
+            amount <= self.available[name]
+            for name, amount in node.resources.items()
+            if name in self.available
+        )
+
+    def acquire(self, node) -> None:
+        """Reserve the node's requirements."""
+        for name, amount in node.resources.items():
+            if name in self.available:
+                self.available[name] -= amount
+
+    def release(self, node) -> None:
+        """Return the node's requirements to the pool."""
+        for name, amount in node.resources.items():
+            if name in self.available:
+                self.available[name] += amount
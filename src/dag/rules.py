@@ -0,0 +1,185 @@
+"""
+Validation rules for post output files.
+
+A stage's ``post`` section may carry a ``rules`` list, for example::
+
+    "rules": [
+        {"type": "require", "pattern": "Simulation complete"},
+        {"type": "forbid", "pattern": "^(UVM_)?FATAL"},
+        {"type": "threshold", "pattern": "(\\d+) error (\\d+) warning", "max": 0},
+        {"type": "count", "pattern": "^Warning-", "max": 10}
+    ]
+
+Patterns are matched line by line. All patterns of a rule set are joined into one
+alternation, so a file is scanned once, straight from a memory map; only the lines
+that hit the combined pattern are checked against each rule individually.
+"""
+
+import functools
+import json
+import mmap
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+REQUIRE = "require"
+FORBID = "forbid"
+THRESHOLD = "threshold"
+COUNT = "count"
+RULE_TYPES = (REQUIRE, FORBID, THRESHOLD, COUNT)
+
+MAX_EVIDENCE = 5
+MAX_LINE_LENGTH = 500
+COUNT_CHUNK = 1 << 24
+
+
+class Rule:
+    """One compiled rule: its kind, pattern and bounds."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        kind = spec.get("type")
+        if kind not in RULE_TYPES:
+            raise ValueError(f"Unknown rule type '{kind}', expected one of {', '.join(RULE_TYPES)}")
+        if not isinstance(spec.get("pattern"), str):
+            raise ValueError(f"Rule {spec} has no 'pattern'")
+        if kind == THRESHOLD and "min" not in spec and "max" not in spec:
+            raise ValueError(f"Threshold rule '{spec['pattern']}' needs 'min' or 'max'")
+        self.kind = kind
+        self.name = spec.get("name", f"{kind} {spec['pattern']}")
+        self.source = spec["pattern"]
+        self.pattern = re.compile(self.source.encode("utf-8"))
+        self.minimum = spec.get("min")
+        self.maximum = spec.get("max")
+
+    def within(self, value: float) -> bool:
+        """Return True if a value (a count or an extracted number) is inside the bounds."""
+        if self.minimum is not None and value < self.minimum:
+            return False
+        return self.maximum is None or value <= self.maximum
+
+    def values(self, match: "re.Match") -> List[float]:
+        """Return the numbers captured by a threshold match (the whole match if no groups)."""
+        groups = match.groups() or (match.group(0),)
+        return [float(g) for g in groups if g is not None]
+
+
+class RuleResult:
+    """Outcome of one rule over one file."""
+
+    def __init__(self, rule: Rule):
+        self.rule = rule
+        self.count = 0
+        self.violations = 0
+        self.evidence: List[Dict[str, Any]] = []
+
+    def add(self, line_number: int, line: bytes, match: "re.Match") -> None:
+        """Record a matching line."""
+        self.count += 1
+        violating = False
+        if self.rule.kind == THRESHOLD:
+            try:
+                violating = not all(self.rule.within(v) for v in self.rule.values(match))
+            except ValueError:
+                violating = True
+            if violating:
+                if not self.violations:
+                    self.evidence.clear()
+                self.violations += 1
+            elif self.violations:
+                return
+        if len(self.evidence) < MAX_EVIDENCE:
+            text = line[:MAX_LINE_LENGTH].decode("utf-8", errors="replace").rstrip("\r")
+            self.evidence.append({"line": line_number, "text": text})
+
+    @property
+    def passed(self) -> bool:
+        """Whether the file satisfies the rule."""
+        kind = self.rule.kind
+        if kind == REQUIRE:
+            return self.count > 0
+        if kind == FORBID:
+            return self.count == 0
+        if kind == THRESHOLD:
+            return self.count > 0 and not self.violations
+        return self.rule.within(self.count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for the collect report."""
+        return {
+            "rule": self.rule.name,
+            "passed": self.passed,
+            "count": self.count,
+            "evidence": self.evidence
+        }
+
+
+class RuleSet:
+    """The rules of one post section, compiled into a single combined matcher."""
+
+    def __init__(self, specs: Sequence[Dict[str, Any]]):
+        self.rules = [Rule(spec) for spec in specs]
+        alternatives = b"|".join(b"(?:" + rule.pattern.pattern + b")" for rule in self.rules)
+        try:
+            self.combined = re.compile(alternatives, re.MULTILINE)
+        except re.error as e:
+            raise ValueError(f"Rules cannot be combined into one pattern: {e}") from e
+
+    def scan(self, data) -> List[RuleResult]:
+        """Evaluate every rule over ``data`` (bytes or an mmap) in one pass."""
+        results = [RuleResult(rule) for rule in self.rules]
+        line_number = 1
+        counted = 0
+        position = 0
+        size = len(data)
+        while position < size:
+            hit = self.combined.search(data, position)
+            if hit is None:
+                break
+            # Rules apply to single lines: only the line the hit starts on is
+            # evaluated, even if the combined pattern matched across a newline.
+            start = data.rfind(b"\n", position, hit.start()) + 1 or position
+            end = data.find(b"\n", hit.start())
+            if end < 0:
+                end = size
+            line_number += _count_newlines(data, counted, start)
+            counted = start
+            line = data[start:end]
+            for result in results:
+                match = result.rule.pattern.search(line)
+                if match:
+                    result.add(line_number, line, match)
+            position = end + 1
+        return results
+
+    def check(self, filename: str) -> Tuple[bool, List[Dict[str, Any]]]:
+        """Scan a file through a memory map and return (passed, per-rule results)."""
+        with open(filename, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files cannot be mapped
+                data = b""
+            try:
+                results = self.scan(data)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        return all(r.passed for r in results), [r.to_dict() for r in results]
+
+
+def _count_newlines(data, start: int, end: int) -> int:
+    """Count newlines in data[start:end] without copying more than a chunk at a time."""
+    total = 0
+    for offset in range(start, end, COUNT_CHUNK):
+        total += data[offset:min(offset + COUNT_CHUNK, end)].count(b"\n")
+    return total
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(key: str) -> RuleSet:
+    return RuleSet(json.loads(key))
+
+
+def compile_rules(specs: Optional[Sequence[Dict[str, Any]]]) -> Optional[RuleSet]:
+    """Return the compiled rule set for a post section's rules, shared between stages."""
+    if not specs:
+        return None
+    return _compile(json.dumps(specs, sort_keys=True))
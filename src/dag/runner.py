@@ -1,183 +1,820 @@
 """DAG runner that executes stages in parallel with respect to their dependencies."""
 
-import time
+import asyncio
+import heapq
 import os
-import sys
-import subprocess
-from concurrent.futures import ProcessPoolExecutor, Future
-from typing import Dict, List, Tuple, Optional
-
+import time
+from array import array
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import (
+    Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Sequence, Set, Tuple, Optional
+)
+
+from . import events
+from .adaptive import AdaptiveLimit
+from .artifacts import ArtifactCache
 from . import logger as lg
+from . import scheduler
+from .execution import CommandInfo, execute_command_async
+from .executors import Executor, LocalExecutor
+from .graph import Graph
+from .history import History
+from .logs import LogCapture
+from .resources import ResourcePool
+from .stamps import StampStore
+from .trace import Trace
 
 logger = lg.get_logger(__name__)
-cwd = os.getcwd()
-
-
-def execute_command(
-    command_info: Tuple[str, str, str, str, str]
-) -> Tuple[str, Optional[str], Optional[str]]:
-    """
-    Executes a stage's run and/or post command in a separate process.
-    Returns (node name, output, post_output).
-    """
-    name, command, directory, post_command, post_directory = command_info
-    try:
-        if command:
-            cmd = f"cd {directory}; {command}"
-            subprocess.run(
-                cmd,
-                shell=True,
-                cwd=cwd,
-                stdout=sys.stdout,
-                stderr=sys.stderr,
-                check=True
-            )
 
-        if post_command:
-            cmd = f"cd {post_directory}; {post_command}"
-            subprocess.run(
-                cmd,
-                shell=True,
-                cwd=cwd,
-                stdout=sys.stdout,
-                stderr=sys.stderr,
-                check=True
-            )
+# Node outcomes
+PENDING = "pending"
+SUCCESS = "success"
+FAILED = "failed"
+SKIPPED = "skipped"
+CANCELLED = "cancelled"
+OUTCOMES = (SUCCESS, FAILED, SKIPPED, CANCELLED)
+
+# Failure policies
+KEEP_GOING = "keep-going"
+FAIL_FAST = "fail-fast"
 
-        return name, None, None
+# Most lightweight nodes dispatched together in one executor slot.
+BATCH_SIZE = 16
 
-    except subprocess.CalledProcessError as e:
-        logger.error("Execution failed for node %s: %s", name, e)
-        return name, None, None
-    except OSError as e:
-        logger.error("OS error for node %s: %s", name, e)
-        return name, None, None
+
+# Shared by every node that declares no resources, instead of one empty dict each.
+_NO_RESOURCES: Mapping[str, float] = MappingProxyType({})
 
 
 class Node:
-    """Represents a single stage in the DAG with dependencies, command, and post steps."""
+    """Represents a single stage in the DAG with its command and post steps."""
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
 
-    def __init__(
-        self,
-        name: str,
-        command: dict = None,
-        in_degree: int = 0,
-        post: dict = None
-    ):
+    __slots__ = (
+        "name", "index", "command", "post", "variables", "inputs", "outputs", "resources",
+        "timeout", "retries", "retry_backoff", "lightweight", "status"
+    )
+
+    def __init__(self, name: str, index: int, data: dict):
         self.name = name
-        self.command = command or {}
-        self.post = post or {}
-        self.in_degree = in_degree
-        self.parents: List[Node] = []
-        self.children: List[Node] = []
-        self.executed = False
-
-    def prepare_command(self) -> Tuple[str, str, str, str, str]:
-        """Prepare command and post-command info for execution."""
-        directory = self.command.get("directory", cwd)
+        self.index = index
+        self.command: dict = data.get("command") or {}
+        self.post: dict = data.get("post") or {}
+        self.variables: dict = data.get("variables") or {}
+        self.inputs: Sequence[str] = data.get("inputs") or ()
+        self.outputs: Sequence[str] = data.get("outputs") or ()
+        self.resources: Mapping[str, float] = data.get("resources") or _NO_RESOURCES
+        self.timeout: Optional[float] = data.get("timeout")
+        self.retries: int = data.get("retries", 0)
+        self.retry_backoff: float = data.get("retry_backoff", 0.0)
+        self.lightweight: bool = data.get("lightweight", False)
+        self.status = PENDING
+
+    @property
+    def executed(self) -> bool:
+        """Whether the node has reached an outcome."""
+        return self.status != PENDING
+
+    def prepare_command(self) -> CommandInfo:
+        """
+        Prepare command and post-command info for execution. Directories stay as
+        declared, defaulting to the one the executor runs stages from.
+        """
+        directory = self.command.get("directory", os.curdir)
         command = self.command.get("command", "")
-        post_directory = self.post.get("directory", cwd)
+        post_directory = self.post.get("directory", os.curdir)
         post_command = self.post.get("command", "")
-        return (self.name, command, directory, post_command, post_directory)
+        return (self.name, command, directory, post_command, post_directory, self.timeout)
 
     def __str__(self):
         return f"Node({self.name})"
 
 
+class NodeMap(Mapping):
+    """Read-only name → Node mapping backed by the graph's id table, in node id order."""
+
+    def __init__(self, graph: Graph, node_list: List[Node]):
+        self._ids = graph.ids
+        self._names = graph.names
+        self._node_list = node_list
+
+    def __getitem__(self, name: str) -> Node:
+        return self._node_list[self._ids[name]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class _Slots:
+    """Numbered concurrency slots of the async engine, the lowest free one taken first."""
+
+    def __init__(self):
+        self._free: List[int] = []
+        self._count = 0
+
+    def take(self) -> int:
+        """Return a free slot."""
+        if self._free:
+            return heapq.heappop(self._free)
+        self._count += 1
+        return self._count - 1
+
+    def release(self, slot: int) -> None:
+        """Free a slot taken before."""
+        heapq.heappush(self._free, slot)
+
+
 class Runner:
     """DAG executor that runs all nodes respecting their dependencies."""
 
-    def __init__(self):
-        self.nodes: Dict[str, Node] = {}
+    def __init__(self, graph: Graph, node_list: List[Node]):
+        self.graph = graph
+        self.node_list = node_list
+        self.nodes: Mapping[str, Node] = NodeMap(graph, node_list)
+        # Per node, the number of parent edges whose parent has not succeeded yet.
+        self._remaining = array("i")
+        # Last captured output lines per node: updated live by the async engine,
+        # on completion by the process engine.
+        self.tails: Dict[str, Sequence[str]] = {}
+        self._trace: Optional[Trace] = None
+        # Failed attempts per node that were retried.
+        self._attempts: Dict[str, int] = {}
 
     @staticmethod
     def create_from_dict(dct: dict) -> "Runner":
-        """Create a Runner instance from a dictionary representation of the DAG."""
-        dag = Runner()
+        """
+        Create a Runner instance from a dictionary representation of the DAG.
+        Raises UnknownDependency or CyclicDependency for an invalid DAG.
+        """
+        graph = Graph.from_dict(dct)
+        return Runner(graph, [Node(name, i, data) for i, (name, data) in enumerate(dct.items())])
 
-        for name, data in dct.items():
-            dag.nodes[name] = Node(name, data.get("command"), 0, data.get("post"))
+    def parents(self, node: Node) -> List[Node]:
+        """Return the parent nodes of a node."""
+        return [self.node_list[i] for i in self.graph.parents(node.index)]
 
-        for name, data in dct.items():
-            node = dag.nodes[name]
-            for child_name in data.get("before", []):
-                child = dag.nodes[child_name]
-                node.children.append(child)
-                child.parents.append(node)
-                child.in_degree = max(child.in_degree, node.in_degree + 1)
+    def children(self, node: Node) -> List[Node]:
+        """Return the child nodes of a node."""
+        return [self.node_list[i] for i in self.graph.children(node.index)]
 
-            for parent_name in data.get("after", []):
-                parent = dag.nodes[parent_name]
-                node.parents.append(parent)
-                parent.children.append(node)
-                node.in_degree = max(node.in_degree, parent.in_degree + 1)
+    def _parents_succeeded(self, node: Node) -> bool:
+        return all(self.node_list[i].status == SUCCESS for i in self.graph.parents(node.index))
 
-        return dag
+    def skip_up_to_date(self, stamps: StampStore, mode: str = "all") -> int:
+        """
+        Mark nodes whose recorded stamp is current, and whose parents are all
+        up to date, as executed so launch does not submit them.
+        Returns the number of skipped nodes.
+        """
+        skipped = 0
+        for i in self.graph.order:
+            node = self.node_list[i]
+            if (self._parents_succeeded(node)
+                    and stamps.is_up_to_date(node, mode, self._parent_names(node))):
+                node.status = SUCCESS
+                skipped += 1
+                logger.info("Up to date: %s", node.name)
+        return skipped
+
+    def _parent_names(self, node: Node) -> List[str]:
+        return [self.graph.names[i] for i in self.graph.parents(node.index)]
+
+    def restore(self, completed: Iterable[str]) -> int:
+        """
+        Mark nodes completed by a previous, interrupted run as executed.
+        Returns the number of restored nodes.
+        """
+        restored = 0
+        for name in completed:
+            node = self.nodes.get(name)
+            if node is not None and not node.executed:
+                node.status = SUCCESS
+                restored += 1
+        return restored
+
+    def _initial_ready(self, ready: scheduler.ReadyQueue) -> None:
+        """
+        Initialise the remaining-dependency counters and push every node that
+        has not run yet and whose parents have all succeeded.
+        """
+        parent_ids = self.graph.parent_ids
+        offsets = self.graph.parent_offsets
+        node_list = self.node_list
+        self._remaining = array("i", bytes(4 * len(node_list)))
+        for node in node_list:
+            i = node.index
+            self._remaining[i] = sum(
+                1 for k in range(offsets[i], offsets[i + 1])
+                if node_list[parent_ids[k]].status != SUCCESS
+            )
+            if not node.executed and self._remaining[i] == 0:
+                self._push_ready(node, ready)
 
-    def _submit_node(
+    def _prepare(
         self,
-        node: Node,
-        executor: ProcessPoolExecutor,
-        mode: str
-    ) -> Future:
-        """Submit a node's execution to the process pool."""
-        name, command, directory, post_command, post_directory = node.prepare_command()
+        schedule: str,
+        history: Optional[History],
+        capacity: Optional[Dict[str, float]],
+        trace: Optional[Trace]
+    ) -> Tuple[ResourcePool, scheduler.ReadyQueue]:
+        """Start a run: check the resource table and queue the nodes that are ready."""
+        pool = ResourcePool(capacity)
+        pool.check(self.node_list)
+        ready = scheduler.ReadyQueue.create(schedule, self.graph, history)
+        self._trace = trace
+        self._attempts = {}
+        self._initial_ready(ready)
+        return pool, ready
+
+    def _push_ready(self, node: Node, ready: scheduler.ReadyQueue) -> None:
+        if self._trace is not None:
+            self._trace.ready(node.name, time.time())
+        ready.push(node)
+
+    def _complete(self, node: Node, returncode: int, ready: scheduler.ReadyQueue) -> List[Node]:
+        """
+        Record a node's outcome. On success, decrement the children's counters and
+        push those that reach zero; on failure, skip every pending descendant.
+        Returns the nodes that were skipped.
+        """
+        graph = self.graph
+        if returncode == 0:
+            node.status = SUCCESS
+            remaining = self._remaining
+            for child in graph.children(node.index):
+                remaining[child] -= 1
+                if remaining[child] == 0 and not self.node_list[child].executed:
+                    self._push_ready(self.node_list[child], ready)
+            return []
+
+        node.status = FAILED
+        skipped = []
+        stack = list(graph.children(node.index))
+        while stack:
+            child = self.node_list[stack.pop()]
+            if child.executed:
+                continue
+            child.status = SKIPPED
+            skipped.append(child)
+            stack.extend(graph.children(child.index))
+        for child in skipped:
+            logger.warning("Skipped: %s (upstream %s failed)", child.name, node.name)
+        return skipped
+
+    def _skip_pending(self) -> List[Node]:
+        """Mark every node that never ran as skipped and return them."""
+        pending = [n for n in self.node_list if not n.executed]
+        for node in pending:
+            node.status = SKIPPED
+        return pending
+
+    def summary(self) -> Dict[str, int]:
+        """Return the number of nodes per outcome."""
+        counts = dict.fromkeys(OUTCOMES, 0)
+        for node in self.node_list:
+            if node.executed:
+                counts[node.status] += 1
+        return counts
+
+    @staticmethod
+    def _command_info(node: Node, mode: str) -> CommandInfo:
+        """Return the node's command tuple with the sections not selected by mode blanked."""
+        name, command, directory, post_command, post_directory, timeout = node.prepare_command()
 
         if mode == "post":
             command = ""
         elif mode == "command":
             post_command = ""
 
-        return executor.submit(
-            execute_command,
-            (name, command, directory, post_command, post_directory)
-        )
+        return (name, command, directory, post_command, post_directory, timeout)
 
-    def launch(self, max_workers: int = 2, mode: str = "all") -> None:
+    @staticmethod
+    def _lightweight(node: Node, history: Optional[History], batch_under: Optional[float]) -> bool:
+        """Whether a node may run in a batch: marked lightweight, or historically short."""
+        if node.timeout is not None:
+            return False
+        if node.lightweight:
+            return True
+        if batch_under is None or history is None:
+            return False
+        duration = history.durations.get(node.name)
+        return duration is not None and duration < batch_under
+
+    def _retry_delay(self, node: Node) -> Optional[float]:
         """
-        Execute all nodes in the DAG using a ProcessPoolExecutor.
-        :param max_workers: The maximum number of worker processes.
-        :param mode: "all" → run + post, "post" → post only, "command" → run only
+        Count a failed attempt of a node. Returns the backoff before its next attempt,
+        doubling after each failure, or None once its retries are used up.
+        """
+        attempt = self._attempts.get(node.name, 0) + 1
+        if attempt > node.retries:
+            return None
+        self._attempts[node.name] = attempt
+        delay = node.retry_backoff * 2 ** (attempt - 1)
+        logger.warning("Retrying %s in %.1fs (retry %d of %d)", node.name, delay, attempt,
+                       node.retries)
+        return delay
+
+    def _restore(
+        self,
+        node: Node,
+        mode: str,
+        artifacts: Optional[ArtifactCache],
+        keys: Dict[str, str],
+        stamps: Optional[StampStore],
+        ready: scheduler.ReadyQueue
+    ) -> bool:
+        """
+        Look a node up in the artifact cache and, on a hit, restore its outputs and
+        complete it as succeeded. On a miss its key is kept in ``keys`` to store its
+        outputs once it succeeds.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        if artifacts is None or node.name in keys:  # a retry was already looked up
+            return False
+        key = artifacts.key(node, mode)
+        if key is None:
+            return False
+        if not artifacts.restore(node, key):
+            keys[node.name] = key
+            return False
+        logger.info("Restored from cache: %s", node.name)
+        if stamps is not None:
+            stamps.record(node, mode, self._parent_names(node))
+        self._complete(node, 0, ready)
+        return True
+
+    def _ended(
+        self,
+        node: Node,
+        elapsed: float,
+        returncode: int,
+        timestamp: float,
+        usage: Optional[Dict[str, Any]],
+        pool: ResourcePool,
+        history: Optional[History]
+    ) -> None:
+        """Release the resources of a node that stopped running and record its timing."""
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        pool.release(node)
+        if history is not None:
+            history.record(node.name, elapsed)
+        if self._trace is not None:
+            self._trace.finished(node.name, timestamp, returncode, usage)
+
+    def _settle(
+        self,
+        node: Node,
+        returncode: int,
+        mode: str,
+        artifacts: Optional[ArtifactCache],
+        keys: Dict[str, str],
+        stamps: Optional[StampStore],
+        ready: scheduler.ReadyQueue
+    ) -> List[Node]:
+        """
+        Complete a node that will not be retried: on success store its outputs in the
+        artifact cache and record its stamp. Returns the nodes skipped by a failure.
         """
-        logger.info("Launching DAG with mode=%s, workers=%d", mode, max_workers)
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        key = keys.pop(node.name, None)
+        if returncode == 0:
+            if key is not None:
+                artifacts.store(node, mode, key)
+            if stamps is not None:
+                stamps.record(node, mode, self._parent_names(node))
+        return self._complete(node, returncode, ready)
 
-        total_nodes = len(self.nodes)
-        completed_count = 0
-        ready = [n for n in self.nodes.values() if n.in_degree == 0]
-        running: Dict[str, Future] = {}
+    def _submit_node(
+        self,
+        node: Node,
+        executor: Executor,
+        mode: str,
+        logs: Optional[LogCapture] = None
+    ) -> Future:
+        """Submit a node's execution to the executor."""
+        return executor.submit(self._command_info(node, mode), logs)
+
+    def _submit_batch(
+        self,
+        nodes: List[Node],
+        executor: Executor,
+        mode: str,
+        logs: Optional[LogCapture] = None
+    ) -> Future:
+        """Submit several lightweight nodes to run one after another in one executor slot."""
+        return executor.submit_batch([self._command_info(node, mode) for node in nodes], logs)
 
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            while completed_count < total_nodes:
+    @staticmethod
+    def _results(future: Future, nodes: List[Node], batched: bool) -> List[Tuple]:
+        """
+        Return the (name, return code, log tail, usage) of each node of a finished
+        submission; nodes whose submission raised get return code -1 and no tail.
+        """
+        try:
+            results = future.result()
+        except Exception as e:  # pylint: disable=broad-except
+            for node in nodes:
+                logger.error("Error in node %s: %s", node.name, e)
+            return [(node.name, -1, None, None) for node in nodes]
+        return results if batched else [results]
+
+    def launch(
+        self,
+        max_workers: int = 2,
+        mode: str = "all",
+        engine: str = "process",
+        schedule: str = scheduler.CRITICAL_PATH,
+        history: Optional[History] = None,
+        stamps: Optional[StampStore] = None,
+        listeners: Sequence[Callable[[events.Event], None]] = (),
+        on_failure: str = KEEP_GOING,
+        capacity: Optional[Dict[str, float]] = None,
+        logs: Optional[LogCapture] = None,
+        executor: Optional[Executor] = None,
+        trace: Optional[Trace] = None,
+        batch_under: Optional[float] = None,
+        batch_size: int = BATCH_SIZE,
+        artifacts: Optional[ArtifactCache] = None,
+        adaptive: Optional[AdaptiveLimit] = None
+    ) -> Dict[str, int]:
+        """
+        Execute all nodes in the DAG.
+        :param max_workers: The maximum number of worker processes, or of concurrently
+            running subprocesses for the async engine. Ignored with ``executor``.
+        :param mode: "all" → run + post, "post" → post only, "command" → run only
+        :param engine: "process" → ProcessPoolExecutor, "async" → asyncio subprocesses
+        :param schedule: "critical-path" → dispatch the ready node with the longest expected
+            remaining path first, "lifo" → dispatch the most recently readied node first
+        :param history: Stage durations used for priorities; updated with the observed times.
+        :param stamps: Up-to-date stamps, recorded for every node that succeeds.
+        :param listeners: Callables receiving every progress event, e.g. Journal.record.
+        :param on_failure: "keep-going" → skip the descendants of a failed node and continue
+            with independent branches, "fail-fast" → stop submitting and cancel running nodes
+        :param capacity: Amount available of each resource; a node is only dispatched
+            while its declared resources fit, smaller ready nodes backfill meanwhile.
+        :param logs: Capture each node's output in its own log file instead of the terminal,
+            keeping the last lines of each in ``tails``.
+        :param executor: Where the process engine runs nodes, up to its capacity at once,
+            e.g. a RemoteExecutor; a LocalExecutor of ``max_workers`` by default.
+            It is shut down when launch returns.
+        :param trace: Record when each node became ready, was dispatched, started and ended,
+            where it ran, and its CPU time and peak RSS.
+        :param batch_under: Also treat nodes whose recorded duration in ``history`` is below
+            this many seconds as lightweight, see below.
+        :param batch_size: Most lightweight nodes run in one batch.
+        :param artifacts: Restore the outputs of nodes found in this cache instead of
+            running them, and store the outputs of nodes that succeed.
+        :param adaptive: Let the load of this host decide how many nodes run at once, up to
+            the executor's capacity; dispatch pauses while it reports memory pressure.
+            Process engine only.
+        :return: The number of nodes per outcome, see summary.
+
+        Ready nodes marked ``lightweight`` (and, with ``batch_under``, historically short
+        ones) without a timeout are dispatched together, up to ``batch_size`` in one
+        executor slot, and run one after another in the worker's long-lived shell.
+        Each still reports its own outcome and timing.
+
+        A node that fails with ``retries`` left is put back in the ready queue after its
+        ``retry_backoff`` (doubled on each attempt) instead of failing; a RETRYING event
+        is emitted for the failed attempt and other ready work keeps running meanwhile.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+        # pylint: disable=too-many-branches,too-many-statements
+        if on_failure not in (KEEP_GOING, FAIL_FAST):
+            raise ValueError(f"Unknown failure policy: '{on_failure}'")
+        if engine == "async":
+            if executor is not None:
+                raise ValueError("The async engine runs stages itself and takes no executor")
+            if adaptive is not None:
+                raise ValueError("Adaptive concurrency needs the process engine")
+            asyncio.run(self._drain(
+                listeners, max_workers=max_workers, mode=mode, schedule=schedule,
+                history=history, stamps=stamps, on_failure=on_failure, capacity=capacity,
+                logs=logs, trace=trace, artifacts=artifacts
+            ))
+            return self.summary()
+        if engine != "process":
+            raise ValueError(f"Unknown engine: '{engine}'")
+
+        if executor is None:
+            executor = LocalExecutor(max_workers)
+        slots = executor.capacity
+        logger.info("Launching DAG with mode=%s, workers=%d, schedule=%s",
+                    mode, slots, schedule)
+
+        pool, ready = self._prepare(schedule, history, capacity, trace)
+        running: Dict[Future, List[Node]] = {}
+        batches: Set[Future] = set()
+        dispatched: Dict[str, float] = {}
+        # Artifact cache keys of running nodes, computed before they ran.
+        keys: Dict[str, str] = {}
+        # (due time, sequence, node) of failed nodes waiting for their backoff.
+        retries: List[Tuple[float, int, Node]] = []
+        aborted = False
+
+        def dispatch(nodes: List[Node], batched: bool) -> None:
+            if not batched:
+                future = self._submit_node(nodes[0], executor, mode, logs)
+            else:
+                # Even a single lightweight node saves a shell start in the batch shell.
+                future = self._submit_batch(nodes, executor, mode, logs)
+                batches.add(future)
+            running[future] = nodes
+            for node in nodes:
+                dispatched[node.name] = time.monotonic()
+                if trace is not None:
+                    trace.dispatched(node.name, time.time())
+                logger.info("Submitted: %s", node.name)
+                self._notify(listeners, events.Event.now(events.SUBMITTED, node.name))
+
+        with executor:
+            while (ready or running or retries) and not aborted:
+                while retries and retries[0][0] <= time.monotonic():
+                    self._push_ready(heapq.heappop(retries)[2], ready)
+
+                # Keep the backlog in the ready queue rather than in the pool's FIFO
+                # so the scheduling policy decides what starts when a worker frees up.
+                # An open batch takes one slot and keeps taking lightweight nodes.
+                limit = slots if adaptive is None else min(slots, adaptive.current(len(running)))
+                batch: List[Node] = []
                 while ready:
-                    node = ready.pop()
-                    if not node.executed:
-                        future = self._submit_node(node, executor, mode)
-                        running[node.name] = future
-                        logger.info("Submitted: %s", node.name)
-
-                time.sleep(0.2)
-
-                completed = [name for name, fut in running.items() if fut.done()]
-                for name in completed:
-                    future = running.pop(name)
-                    completed_count += 1
-                    node = self.nodes[name]
-                    node.executed = True
-
-                    try:
-                        result_name, _, _ = future.result()
-                        logger.info("Completed: %s", result_name)
-                    except Exception as e:
-                        logger.error("Error in node %s: %s", name, e)
-
-                    for child in node.children:
-                        if all(p.executed for p in child.parents) and not child.executed:
-                            ready.append(child)
+                    full = len(running) + bool(batch) >= limit
+                    if full and not batch:
+                        break
+                    node = ready.pop(pool.fits)
+                    if node is None:
+                        break
+                    if node.executed:
+                        continue
+                    if self._restore(node, mode, artifacts, keys, stamps, ready):
+                        self._notify(listeners, events.Event.now(events.FINISHED, node.name, 0))
+                        continue
+                    light = executor.batching and self._lightweight(node, history, batch_under)
+                    if full and not light:
+                        ready.push(node)
+                        break
+                    pool.acquire(node)
+                    if light:
+                        batch.append(node)
+                        if len(batch) >= batch_size:
+                            dispatch(batch, True)
+                            batch = []
+                    else:
+                        dispatch([node], False)
+                if batch:
+                    dispatch(batch, True)
+
+                timeout = retries[0][0] - time.monotonic() if retries else None
+                if adaptive is not None:
+                    # Wake up for the next sample even while no stage finishes.
+                    timeout = adaptive.interval if timeout is None else min(
+                        timeout, adaptive.interval)
+                if not running:
+                    if not retries and not (ready and adaptive is not None and adaptive.paused):
+                        break
+                    time.sleep(max(timeout, 0.0))
+                    continue
+
+                # Block until at least one stage finishes instead of polling,
+                # so newly ready children are submitted without idle delay.
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    nodes = running.pop(future)
+                    batched = future in batches
+                    batches.discard(future)
+                    results = self._results(future, nodes, batched)
+                    for node, (_, returncode, tail, usage) in zip(nodes, results):
+                        elapsed = time.monotonic() - dispatched.pop(node.name)
+                        if batched and usage:
+                            # Batched nodes ran one after another: record their own time.
+                            elapsed = usage["ended"] - usage["started"]
+                        self._ended(node, elapsed, returncode, time.time(), usage, pool, history)
+                        if usage:
+                            # The pool reports when the node actually ran.
+                            self._notify(listeners,
+                                         events.Event(events.STARTED, node.name, usage["started"]))
+                        if tail is not None:
+                            logger.info("%s: %s (%.3fs)", "Failed" if returncode else "Completed",
+                                        node.name, elapsed)
+                            if logs:
+                                self.tails[node.name] = tail
+                        delay = self._retry_delay(node) if returncode else None
+                        if delay is not None:
+                            heapq.heappush(retries, (time.monotonic() + delay, id(node), node))
+                            self._notify(listeners,
+                                         events.Event.now(events.RETRYING, node.name, returncode))
+                            continue
+                        kind = events.FAILED if returncode else events.FINISHED
+                        self._notify(listeners, events.Event.now(kind, node.name, returncode))
+                        for child in self._settle(
+                                node, returncode, mode, artifacts, keys, stamps, ready):
+                            self._notify(listeners, events.Event.now(events.SKIPPED, child.name))
+                        if returncode and on_failure == FAIL_FAST:
+                            aborted = True
+
+                if aborted:
+                    logger.error("Failing fast: cancelling %d running stages", len(running))
+                    executor.cancel()
+                    for nodes in running.values():
+                        for node in nodes:
+                            node.status = CANCELLED
+                            self._notify(listeners, events.Event.now(events.CANCELLED, node.name))
+                    running.clear()
+
+        for node in self._skip_pending():
+            self._notify(listeners, events.Event.now(events.SKIPPED, node.name))
+        logger.info("All DAG stages executed.")
+        return self.summary()
 
+    async def _drain(self, listeners: Sequence[Callable[[events.Event], None]], **options) -> None:
+        """
+        Run the DAG with the async engine, logging every event and passing it to listeners.
+        ``options`` are passed on to stream.
+        """
+        logger.info("Launching DAG with mode=%s, engine=async, concurrency=%d, schedule=%s",
+                    options["mode"], options["max_workers"], options["schedule"])
+        async for event in self.stream(**options):
+            self._notify(listeners, event)
+            if event.kind == events.SUBMITTED:
+                logger.info("Submitted: %s", event.node)
+            elif event.kind == events.FINISHED:
+                logger.info("Completed: %s", event.node)
+            elif event.kind == events.FAILED:
+                logger.error("Error in node %s: exit status %s", event.node, event.returncode)
         logger.info("All DAG stages executed.")
 
+    @staticmethod
+    def _notify(listeners: Sequence[Callable[[events.Event], None]], event: events.Event) -> None:
+        """Pass an event to every listener."""
+        for listener in listeners:
+            listener(event)
+
+    async def stream(
+        self,
+        max_workers: int = 0,
+        mode: str = "all",
+        schedule: str = scheduler.CRITICAL_PATH,
+        history: Optional[History] = None,
+        stamps: Optional[StampStore] = None,
+        on_failure: str = KEEP_GOING,
+        capacity: Optional[Dict[str, float]] = None,
+        logs: Optional[LogCapture] = None,
+        trace: Optional[Trace] = None,
+        artifacts: Optional[ArtifactCache] = None
+    ) -> AsyncIterator[events.Event]:
+        """
+        Execute the DAG on the running event loop and yield progress events as they happen.
+        Stage commands run directly as asyncio subprocesses, without pool workers.
+        :param max_workers: Maximum number of concurrently running stages, 0 for no limit.
+        :param mode: "all" → run + post, "post" → post only, "command" → run only
+        :param schedule: Ready-queue policy, see launch.
+        :param history: Stage durations used for priorities; updated with the observed times.
+        :param stamps: Up-to-date stamps, recorded for every node that succeeds.
+        :param on_failure: Failure policy, see launch.
+        :param capacity: Resource capacity table, see launch.
+        :param logs: Per-node log capture, see launch.
+        :param trace: Per-node timing, see launch. Nodes are attributed to numbered
+            concurrency slots; CPU time and peak RSS are not available.
+        :param artifacts: Artifact cache, see launch.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+        # pylint: disable=too-many-branches
+        queue: asyncio.Queue = asyncio.Queue()
+        limit = max_workers if max_workers > 0 else len(self.nodes)
+        tasks: Dict[str, asyncio.Task] = {}
+
+        pool, ready = self._prepare(schedule, history, capacity, trace)
+        started: Dict[str, float] = {}
+        # Backoff timers of failed nodes waiting to be retried.
+        timers: Dict[str, asyncio.TimerHandle] = {}
+        slots = _Slots()
+        keys: Dict[str, str] = {}
+
+        try:
+            while ready or tasks or timers:
+                while ready and len(tasks) < limit:
+                    node = ready.pop(pool.fits)
+                    if node is None:
+                        break
+                    if node.executed:
+                        continue
+                    if self._restore(node, mode, artifacts, keys, stamps, ready):
+                        yield events.Event.now(events.FINISHED, node.name, 0)
+                        continue
+                    pool.acquire(node)
+                    tasks[node.name] = asyncio.ensure_future(
+                        self._run_async(node, mode, logs, queue, slots)
+                    )
+                    if trace is not None:
+                        trace.dispatched(node.name, time.time())
+                    yield events.Event.now(events.SUBMITTED, node.name)
+
+                if not tasks and not timers:
+                    break
+
+                event = await queue.get()
+                if event is None:
+                    continue
+                node = self.nodes[event.node]
+                delay = self._retry_delay(node) if event.kind == events.FAILED else None
+                if delay is not None:
+                    event = events.Event(events.RETRYING, *event[1:])
+                yield event
+                if event.kind == events.STARTED:
+                    started[event.node] = event.timestamp
+                    continue
+
+                del tasks[node.name]
+                self._ended(node, event.timestamp - started.pop(node.name), event.returncode,
+                            event.timestamp, None, pool, history)
+                if delay is not None:
+                    self._retry_later(node, delay, ready, queue, timers)
+                    continue
+                skipped = self._settle(
+                    node, event.returncode, mode, artifacts, keys, stamps, ready
+                )
+                for child in skipped:
+                    yield events.Event.now(events.SKIPPED, child.name)
+
+                if event.kind == events.FAILED and on_failure == FAIL_FAST:
+                    logger.error("Failing fast: cancelling %d running stages", len(tasks))
+                    for name in self._cancel_tasks(tasks):
+                        yield events.Event.now(events.CANCELLED, name)
+                    break
+
+            for node in self._skip_pending():
+                yield events.Event.now(events.SKIPPED, node.name)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            for timer in timers.values():
+                timer.cancel()
+
+    def _retry_later(
+        self,
+        node: Node,
+        delay: float,
+        ready: scheduler.ReadyQueue,
+        queue: asyncio.Queue,
+        timers: Dict[str, asyncio.TimerHandle]
+    ) -> None:
+        """Put a failed node back in the ready queue after ``delay`` seconds, waking stream."""
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        def retry() -> None:
+            timers.pop(node.name)
+            self._push_ready(node, ready)
+            queue.put_nowait(None)  # wake the loop to dispatch it
+
+        timers[node.name] = asyncio.get_running_loop().call_later(delay, retry)
+
+    def _cancel_tasks(self, tasks: Dict[str, asyncio.Task]) -> List[str]:
+        """Cancel the running tasks of the async engine and return the names of their nodes."""
+        names = list(tasks)
+        for name in names:
+            tasks.pop(name).cancel()
+            self.nodes[name].status = CANCELLED
+        return names
+
+    async def _run_async(
+        self,
+        node: Node,
+        mode: str,
+        logs: Optional[LogCapture],
+        queue: asyncio.Queue,
+        slots: "_Slots"
+    ) -> None:
+        """
+        Run a node as asyncio subprocesses in one of the numbered ``slots`` it is traced
+        on, putting its STARTED and outcome events on ``queue``.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        event = events.Event.now(events.STARTED, node.name)
+        queue.put_nowait(event)
+        slot = slots.take()
+        if self._trace is not None:
+            self._trace.started(node.name, event.timestamp, f"slot {slot}")
+        try:
+            if logs:
+                with logs.open(node.name) as log:
+                    self.tails[node.name] = log.lines
+                    _, returncode = await execute_command_async(
+                        self._command_info(node, mode), log
+                    )
+                    self.tails[node.name] = log.tail()
+            else:
+                _, returncode = await execute_command_async(self._command_info(node, mode))
+        finally:
+            slots.release(slot)
+        kind = events.FAILED if returncode else events.FINISHED
+        queue.put_nowait(events.Event.now(kind, node.name, returncode))
+
     def __str__(self) -> str:
         return "\n".join(
-            f"{n.name}: (in_degree={n.in_degree})"
-            for n in sorted(self.nodes.values(), key=lambda n: n.in_degree)
+            f"{self.graph.names[i]}: (in_degree={self.graph.in_degree(i)})"
+            for i in self.graph.order
         )
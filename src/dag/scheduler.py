@@ -0,0 +1,87 @@
+"""Ready-queue policies deciding which ready node is dispatched next."""
+
+import heapq
+import itertools
+from typing import Callable, Dict, Optional
+
+from .graph import Graph
+from .history import History
+
+CRITICAL_PATH = "critical-path"
+LIFO = "lifo"
+POLICIES = (CRITICAL_PATH, LIFO)
+
+
+def critical_path(graph: Graph, history: Optional[History] = None) -> Dict[str, float]:
+    """
+    Return, for each node, the expected wall time of the longest path from
+    the start of that node to a sink, including the node itself.
+    """
+    history = history or History()
+    ranks = [0.0] * len(graph)
+    for i in reversed(graph.order):
+        tail = max((ranks[child] for child in graph.children(i)), default=0.0)
+        ranks[i] = history.estimate(graph.names[i]) + tail
+    return dict(zip(graph.names, ranks))
+
+
+class ReadyQueue:
+    """
+    Nodes that are ready to be dispatched.
+    With priorities, the node with the highest priority is popped first (ties in
+    insertion order); without, the most recently pushed node is popped first.
+    """
+
+    def __init__(self, priorities: Optional[Dict[str, float]] = None):
+        self.priorities = priorities
+        self._items: list = []
+        self._counter = itertools.count()
+
+    @staticmethod
+    def create(policy: str, graph: Graph, history: Optional[History] = None) -> "ReadyQueue":
+        """Create a ready queue for one of POLICIES."""
+        if policy == CRITICAL_PATH:
+            return ReadyQueue(critical_path(graph, history))
+        if policy == LIFO:
+            return ReadyQueue()
+        raise ValueError(f"Unknown scheduling policy: '{policy}'")
+
+    def push(self, node) -> None:
+        """Add a ready node."""
+        if self.priorities is None:
+            self._items.append(node)
+        else:
+            priority = self.priorities.get(node.name, 0.0)
+            heapq.heappush(self._items, (-priority, next(self._counter), node))
+
+    def pop(self, fits: Optional[Callable[[object], bool]] = None):
+        """
+        Remove and return the next node to dispatch.
+        With ``fits``, return the first node in dispatch order it accepts, so smaller
+        nodes backfill while a larger one waits; None if no ready node fits.
+        """
+        if fits is None:
+            if self.priorities is None:
+                return self._items.pop()
+            return heapq.heappop(self._items)[-1]
+
+        if self.priorities is None:
+            for index in range(len(self._items) - 1, -1, -1):
+                if fits(self._items[index]):
+                    return self._items.pop(index)
+            return None
+
+        passed = []
+        found = None
+        while self._items:
+            item = heapq.heappop(self._items)
+            if fits(item[-1]):
+                found = item[-1]
+                break
+            passed.append(item)
+        for item in passed:
+            heapq.heappush(self._items, item)
+        return found
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,320 @@
+"""
+``workscript serve``: a daemon that runs ``run``/``post`` requests from local clients.
+
+The daemon keeps each merged file it was asked about loaded, with its reachability
+index, until the file changes on disk, and runs every request's stages in one warm
+worker pool whose size limits the stages running at once across all requests.
+
+Clients connect to a Unix socket and speak one JSON object per line: the client
+sends ``{"type": "run", "mode", "args", "cwd", "environment", "level"}`` with its
+parsed arguments; the daemon answers with ``{"type": "log", "level", "message"}``
+records of the run and a final ``{"type": "exit", "code"}``. Relative paths in the
+arguments and in the stages resolve from the client's ``cwd``, and the stages run
+with its ``environment``. Both ends only talk to a peer running as the same user.
+Requests on the same merged file run one after another, since they share its
+history, stamps and journal.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from . import logger as lg
+from . import reach
+from . import store
+from .executors import Executor, SharedExecutor, SharedPool, send_message
+from .graph import Graph
+
+logger = lg.get_logger(__name__)
+
+# Merged files kept loaded, least recently used dropped first.
+MAX_CACHED = 8
+# Arguments holding paths, resolved against the client's directory.
+PATH_ARGS = ("stages", "history", "trace", "log_dir", "artifact_cache")
+
+RunFunction = Callable[
+    [argparse.Namespace, str, Optional["CachedDag"], Optional[Executor], Optional[str]], int
+]
+
+
+def socket_path() -> str:
+    """Return the daemon socket: $WORKSCRIPT_SOCKET, else a per-user one in the runtime dir."""
+    path = os.environ.get("WORKSCRIPT_SOCKET")
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"workscript-{os.getuid()}.sock")
+
+
+def peer_uid(sock: socket.socket) -> Optional[int]:
+    """Return the user of the process at the other end of a Unix socket, None if unknown."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", credentials)
+    return uid
+
+
+def _trusted(sock: socket.socket, path: str) -> bool:
+    """
+    Whether the daemon on ``path`` runs as this user: by its peer credentials, or where
+    the platform has none, by owning the socket in a private directory this user owns.
+    """
+    uid = peer_uid(sock)
+    if uid is not None:
+        return uid == os.getuid()
+    info = os.stat(path)
+    directory = os.stat(os.path.dirname(os.path.abspath(path)))
+    return info.st_uid == directory.st_uid == os.getuid() \
+        and not stat.S_IMODE(directory.st_mode) & 0o077
+
+
+class CachedDag:
+    """A merged file loaded in memory, with its reachability index built on first use."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, path: str):
+        self.source = reach.source_of(path)
+        self.stages: Dict[str, Any] = store.load(path)
+        self._index: Optional[reach.ReachIndex] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> reach.ReachIndex:
+        """Ancestor and descendant labels of the stages."""
+        with self._lock:
+            if self._index is None:
+                self._index = reach.ReachIndex.from_graph(Graph.from_dict(self.stages))
+            return self._index
+
+
+class DagCache:
+    """Merged files by path, reloaded when their size or mtime changes."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, size: int = MAX_CACHED):
+        self.size = size
+        self._entries: "OrderedDict[str, CachedDag]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> CachedDag:
+        """Return the loaded merged file, loading it again if it changed."""
+        path = os.path.abspath(path)
+        source = reach.source_of(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.source == source:
+                self._entries.move_to_end(path)
+                return entry
+        # Load outside the lock so other requests are not held up by a large file.
+        entry = CachedDag(path)
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        logger.info("Loaded %s (%d stages)", path, len(entry.stages))
+        return entry
+
+
+class _Forward(logging.Handler):
+    """Sends the log records of one request's thread to its client."""
+
+    def __init__(self, send: Callable[[Dict[str, Any]], None], level: int):
+        super().__init__(level)
+        self.send = send
+        self.thread = threading.get_ident()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.thread != self.thread:
+            return
+        try:
+            self.send({"type": "log", "level": record.levelno, "message": self.format(record)})
+        except OSError:
+            pass
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Runs one client's request on the shared pool, streaming its log back."""
+
+    def handle(self) -> None:
+        server: DaemonServer = self.server
+        lock = threading.Lock()
+        uid = peer_uid(self.request)
+        if uid is not None and uid != os.getuid():
+            logger.warning("Refused a request from user %d", uid)
+            return
+
+        def send(message: Dict[str, Any]) -> None:
+            send_message(self.wfile, lock, message)
+
+        try:
+            message = json.loads(self.rfile.readline() or b"{}")
+        except ValueError:
+            return
+        if message.get("type") != "run":
+            return
+        args = resolve_paths(argparse.Namespace(**message["args"]), message["cwd"])
+        executor = SharedExecutor(
+            server.pool, message["cwd"], args.max_workers, message.get("environment")
+        )
+        # A client that goes away cancels its queued stages.
+        threading.Thread(target=self._watch_client, args=(executor,), daemon=True).start()
+
+        forward = _Forward(send, message.get("level", logging.WARNING))
+        root = logging.getLogger()
+        root.addHandler(forward)
+        code = 2
+        try:
+            with server.lock(args.stages):
+                code = server.run(
+                    args, message["mode"], server.cache.get(args.stages), executor, message["cwd"]
+                )
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Request failed: %s", e)
+        finally:
+            root.removeHandler(forward)
+        try:
+            send({"type": "exit", "code": code})
+        except OSError:
+            pass
+
+    def _watch_client(self, executor: Executor) -> None:
+        try:
+            while self.rfile.read(1):
+                pass
+        except (OSError, ValueError):
+            pass
+        executor.cancel()
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server sharing one worker pool and merged file cache among requests."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, max_workers: int, run: RunFunction):
+        super().__init__(path, RequestHandler)
+        self.pool = SharedPool(max_workers)
+        self.cache = DagCache()
+        self.run = run
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def lock(self, path: str) -> Iterator[None]:
+        """Hold the lock of one merged file, waiting for the request holding it."""
+        with self._locks_lock:
+            lock = self._locks.setdefault(path, threading.Lock())
+        if not lock.acquire(blocking=False):
+            logger.warning("Waiting for another request on %s", path)
+            lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.shutdown()
+
+
+def _remove_stale(path: str) -> None:
+    """Remove a socket left behind by a daemon that is gone; refuse if one is listening."""
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise RuntimeError(f"A daemon is already listening on {path}")
+
+
+def serve(path: str, max_workers: int, run: RunFunction) -> None:
+    """
+    Run the daemon until interrupted or terminated. ``run`` executes one request,
+    like main.run given the cached merged file and an executor on the shared pool.
+    """
+    root = logging.getLogger()
+    # Records of every level reach the clients' handlers; the console keeps its level.
+    for handler in root.handlers:
+        handler.setLevel(root.level)
+    root.setLevel(logging.DEBUG)
+
+    _remove_stale(path)
+    with DaemonServer(path, max_workers, run) as server:
+        def stop(_signum, _frame) -> None:
+            # shutdown() waits for serve_forever to return, so it cannot run in this thread.
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        logger.warning("Serving on %s with %d workers", path, max_workers)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+def resolve_paths(args: argparse.Namespace, workdir: str) -> argparse.Namespace:
+    """Make the path arguments of a client's request absolute, from its directory."""
+    for key in PATH_ARGS:
+        if getattr(args, key, None):
+            setattr(args, key, os.path.normpath(os.path.join(workdir, getattr(args, key))))
+    resources = getattr(args, "resources", None)
+    if resources and os.path.isfile(os.path.join(workdir, resources)):
+        args.resources = os.path.join(workdir, resources)
+    return args
+
+
+def request(path: str, args: argparse.Namespace, mode: str) -> Optional[int]:
+    """
+    Run a ``run``/``post`` command on the daemon listening on ``path``, logging its
+    records here. Returns its exit code, or None if no daemon is listening or it does
+    not run as this user.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        trusted = _trusted(sock, path)
+    except OSError:
+        sock.close()
+        return None
+    if not trusted:
+        sock.close()
+        logger.warning("Not using the daemon on %s: it does not run as this user", path)
+        return None
+
+    root = logging.getLogger()
+    with sock, sock.makefile("rb") as reader, sock.makefile("wb") as writer:
+        send_message(writer, threading.Lock(), {
+            "type": "run",
+            "mode": mode,
+            "args": vars(args),
+            "cwd": os.getcwd(),
+            "environment": dict(os.environ),
+            "level": root.getEffectiveLevel()
+        })
+        logger.debug("Running through the daemon on %s", path)
+        for line in reader:
+            message = json.loads(line)
+            if message["type"] == "log":
+                root.log(message["level"], "%s", message["message"])
+            elif message["type"] == "exit":
+                return message["code"]
+    logger.error("The daemon on %s closed the connection", path)
+    return 1
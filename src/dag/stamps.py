@@ -0,0 +1,119 @@
+"""Make-style up-to-date checking: a stamp per node recorded after each successful run."""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, List, Optional
+
+from . import logger as lg
+
+logger = lg.get_logger(__name__)
+
+
+def hash_file(path: str) -> str:
+    """Return the sha256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def expand_inputs(patterns: Iterable[str], workdir: Optional[str] = None) -> List[str]:
+    """
+    Expand declared input paths/globs into a sorted list of paths. Relative ones are
+    matched from ``workdir`` if given, and still returned relative to it.
+    """
+    paths = set()
+    prefix = os.path.join(workdir, "") if workdir else ""
+    for pattern in patterns:
+        if prefix and not os.path.isabs(pattern):
+            found = glob.glob(glob.escape(prefix) + pattern, recursive=True)
+            matches = [match[len(prefix):] for match in found]
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        # A plain path that does not exist yet is still part of the stamp.
+        paths.update(matches or [pattern])
+    return sorted(paths)
+
+
+class StampStore:
+    """Last successful stamp per node name, persisted as a JSON file."""
+
+    def __init__(
+        self,
+        stamps: Optional[Dict[str, str]] = None,
+        checksum: bool = False,
+        workdir: Optional[str] = None
+    ):
+        """
+        :param stamps: Recorded stamp per node name.
+        :param checksum: Compare inputs by content hash instead of mtime.
+        :param workdir: Directory relative inputs are found from (default: the current one).
+        """
+        self.stamps: Dict[str, str] = dict(stamps or {})
+        self.checksum = checksum
+        self.workdir = workdir
+
+    @staticmethod
+    def load(path: str, checksum: bool = False, workdir: Optional[str] = None) -> "StampStore":
+        """Load a stamp file, returning an empty store if it does not exist yet."""
+        if not os.path.isfile(path):
+            return StampStore(checksum=checksum, workdir=workdir)
+        with open(path, encoding="utf-8") as f:
+            return StampStore(json.load(f), checksum, workdir)
+
+    def save(self, path: str) -> None:
+        """Write the stamps atomically."""
+        fd, tmp = tempfile.mkstemp(
+            prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or "."
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.stamps, f, indent=4, sort_keys=True)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _input_state(self, path: str) -> str:
+        """Describe the current state of one input file."""
+        if self.workdir:
+            path = os.path.join(self.workdir, path)
+        try:
+            if self.checksum and os.path.isfile(path):
+                return hash_file(path)
+            st = os.stat(path)
+            return f"{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            return "missing"
+
+    def compute(self, node, mode: str, parents: Iterable[str]) -> str:
+        """
+        Return the current stamp of a node: a hash of its resolved sections and
+        variables, the state of its declared inputs and the recorded stamps of its parents.
+        """
+        digest = hashlib.sha256()
+        definition = {
+            "mode": mode,
+            "command": node.command,
+            "post": node.post,
+            "variables": node.variables,
+        }
+        digest.update(json.dumps(definition, sort_keys=True).encode())
+        for path in expand_inputs(node.inputs, self.workdir):
+            digest.update(f"\0{path}\0{self._input_state(path)}".encode())
+        for parent in sorted(set(parents)):
+            digest.update(f"\0{parent}\0{self.stamps.get(parent, '')}".encode())
+        return digest.hexdigest()
+
+    def is_up_to_date(self, node, mode: str, parents: Iterable[str]) -> bool:
+        """Return whether the node's recorded stamp matches its current stamp."""
+        recorded = self.stamps.get(node.name)
+        return recorded is not None and recorded == self.compute(node, mode, parents)
+
+    def record(self, node, mode: str, parents: Iterable[str]) -> None:
+        """Record the node's current stamp after a successful run."""
+        self.stamps[node.name] = self.compute(node, mode, parents)
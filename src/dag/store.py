@@ -0,0 +1,146 @@
+"""
+Reading and writing merged DAG files.
+
+Two formats are supported:
+
+- ``json``: the original pretty-printed JSON object, always loaded as a whole.
+- ``jsonl``: a compact, indexed JSON Lines file. The first line is a header,
+  then one ``{"name": ..., "stage": ...}`` record per node, then an index line
+  mapping each node name to the byte offset and length of its record, and a last
+  line holding the byte offset of the index. Readers memory-map the file and
+  parse only the records they need.
+"""
+
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+JSON = "json"
+JSONL = "jsonl"
+FORMATS = (JSON, JSONL)
+
+HEADER = {"format": "workscript-jsonl", "version": 1}
+_HEADER_LINE = json.dumps(HEADER, separators=(",", ":")).encode() + b"\n"
+
+
+def detect_format(path: str) -> str:
+    """Return the format of a merged file by looking at its first line."""
+    with open(path, "rb") as f:
+        first = f.readline()
+    return JSONL if first == _HEADER_LINE else JSON
+
+
+def write(path: str, stages: Dict[str, Any], fmt: str = JSON) -> None:
+    """Write merged stages in the given format."""
+    if fmt == JSON:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stages, f, indent=4)
+        return
+    if fmt != JSONL:
+        raise ValueError(f"Unknown merged file format: '{fmt}'")
+
+    index: Dict[str, Tuple[int, int]] = {}
+    with open(path, "wb") as f:
+        f.write(_HEADER_LINE)
+        offset = len(_HEADER_LINE)
+        for name, data in stages.items():
+            record = json.dumps({"name": name, "stage": data}, separators=(",", ":")).encode()
+            f.write(record + b"\n")
+            index[name] = (offset, len(record))
+            offset += len(record) + 1
+        f.write(json.dumps({"index": index}, separators=(",", ":")).encode() + b"\n")
+        f.write(f"{offset}\n".encode())
+
+
+class MergedFile:
+    """Read access to a merged file that parses node records on demand for ``jsonl``."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = detect_format(path)
+        self._stages: Optional[Dict[str, Any]] = None
+        self._index: Dict[str, List[int]] = {}
+        self._mmap: Optional[mmap.mmap] = None
+
+        if self.format == JSON:
+            with open(path, encoding="utf-8") as f:
+                self._stages = json.load(f)
+            return
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        end = self._mmap.rfind(b"\n", 0, len(self._mmap) - 1)
+        index_offset = int(self._mmap[end + 1:])
+        self._index = json.loads(self._mmap[index_offset:end])["index"]
+
+    def names(self) -> List[str]:
+        """Return every node name in file order."""
+        if self._stages is not None:
+            return list(self._stages)
+        return list(self._index)
+
+    def __contains__(self, name: str) -> bool:
+        if self._stages is not None:
+            return name in self._stages
+        return name in self._index
+
+    def get(self, name: str) -> Dict[str, Any]:
+        """Return one node's stage definition."""
+        if self._stages is not None:
+            return self._stages[name]
+        offset, length = self._index[name]
+        return json.loads(self._mmap[offset:offset + length])["stage"]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over all nodes in file order."""
+        for name in self.names():
+            yield name, self.get(name)
+
+    def load_all(self) -> Dict[str, Any]:
+        """Return every node, like loading the whole file."""
+        if self._stages is not None:
+            return self._stages
+        return dict(self.items())
+
+    def close(self) -> None:
+        """Release the memory map."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> "MergedFile":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def subset(merged: Union[MergedFile, Dict[str, Any]], names: List[str]) -> Dict[str, Any]:
+    """Load the named nodes of a merged file or of loaded stages, dropping outside edges."""
+    return _drop_outside({name: merged.get(name) for name in names})
+
+
+def _drop_outside(stages: Dict[str, Any]) -> Dict[str, Any]:
+    # Shallow copies, so the stages of a cached merged file are left untouched.
+    return {
+        name: dict(
+            v,
+            before=[b for b in v.get("before", []) if b in stages],
+            after=[a for a in v.get("after", []) if a in stages]
+        )
+        for name, v in stages.items()
+    }
+
+
+def load(path: str) -> Dict[str, Any]:
+    """Load every node of a merged file in either format."""
+    with MergedFile(path) as merged:
+        return merged.load_all()
+
+
+def format_for(path: str, fmt: Optional[str] = None) -> str:
+    """Return the explicit format, or the one implied by the file extension."""
+    if fmt:
+        return fmt
+    return JSONL if os.path.splitext(path)[1] == ".jsonl" else JSON
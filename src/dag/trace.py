@@ -0,0 +1,206 @@
+"""Per-node timing and resource usage of a run, exported as a Chrome trace and a summary."""
+
+import json
+import statistics
+from typing import Any, Dict, List, Optional
+
+from .graph import Graph
+
+SLOWEST = 5
+
+
+class Timing:
+    """When a node became ready, was dispatched, started and ended, and what it used."""
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+
+    __slots__ = (
+        "ready", "dispatched", "started", "ended", "worker", "returncode", "cpu", "max_rss_kb"
+    )
+
+    def __init__(self):
+        self.ready: Optional[float] = None
+        self.dispatched: Optional[float] = None
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+        self.worker: Optional[str] = None
+        self.returncode: Optional[int] = None
+        self.cpu: Optional[float] = None
+        self.max_rss_kb: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        """Whether the node ran to an end."""
+        return self.started is not None and self.ended is not None
+
+    @property
+    def queued(self) -> float:
+        """Seconds between becoming ready and being dispatched."""
+        return (self.dispatched or 0.0) - (self.ready or self.dispatched or 0.0)
+
+    @property
+    def overhead(self) -> float:
+        """Seconds between being dispatched and starting on a worker."""
+        return max(0.0, (self.started or 0.0) - (self.dispatched or self.started or 0.0))
+
+    @property
+    def duration(self) -> float:
+        """Seconds the node ran."""
+        return (self.ended or 0.0) - (self.started or 0.0)
+
+
+class Trace:
+    """
+    Timing of every node of a run, keyed by node name. Times are wall-clock
+    (time.time) so that remote workers' start and end times line up.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, Timing] = {}
+
+    def _timing(self, name: str) -> Timing:
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = Timing()
+        return timing
+
+    def ready(self, name: str, timestamp: float) -> None:
+        """Record that all of a node's parents succeeded."""
+        self._timing(name).ready = timestamp
+
+    def dispatched(self, name: str, timestamp: float) -> None:
+        """Record that a node was handed to an executor."""
+        self._timing(name).dispatched = timestamp
+
+    def started(self, name: str, timestamp: float, worker: str) -> None:
+        """Record that a node started on a worker."""
+        timing = self._timing(name)
+        timing.started = timestamp
+        timing.worker = worker
+
+    def finished(
+        self,
+        name: str,
+        timestamp: float,
+        returncode: int,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Record a node's end. ``usage`` from execute_command replaces the start and end
+        times observed by the scheduler with the worker's own.
+        """
+        timing = self._timing(name)
+        timing.ended = timestamp
+        timing.returncode = returncode
+        if usage:
+            timing.started = usage["started"]
+            timing.ended = usage["ended"]
+            timing.worker = usage["worker"]
+            timing.cpu = usage["cpu"]
+            timing.max_rss_kb = usage["max_rss_kb"]
+        if timing.started is None:
+            timing.started = timing.dispatched
+
+    def chrome_events(self) -> List[Dict[str, Any]]:
+        """
+        Return the run in the Chrome/Perfetto trace-event format: one track per
+        worker with a complete event per node, in microseconds from the first ready node.
+        """
+        complete = {name: t for name, t in self.timings.items() if t.complete}
+        if not complete:
+            return []
+        origin = min(t.ready or t.dispatched or t.started for t in complete.values())
+        workers = sorted({t.worker or "unknown" for t in complete.values()})
+        tids = {worker: i + 1 for i, worker in enumerate(workers)}
+        trace_events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "workscript"}}
+        ]
+        trace_events.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": worker}}
+            for worker, tid in tids.items()
+        )
+        for name, t in complete.items():
+            trace_events.append({
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "pid": 1,
+                "tid": tids[t.worker or "unknown"],
+                "ts": round((t.started - origin) * 1e6),
+                "dur": round(t.duration * 1e6),
+                "args": {
+                    "returncode": t.returncode,
+                    "queued_s": round(t.queued, 6),
+                    "dispatch_overhead_s": round(t.overhead, 6),
+                    "cpu_s": round(t.cpu, 6) if t.cpu is not None else None,
+                    "max_rss_kb": t.max_rss_kb,
+                },
+            })
+        return trace_events
+
+    def save(self, path: str) -> None:
+        """Write the Chrome trace JSON, loadable in chrome://tracing or ui.perfetto.dev."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.chrome_events(), "displayTimeUnit": "ms"}, f)
+
+    def critical_path(self, graph: Graph) -> List[str]:
+        """
+        Return the observed critical path: from the node that ended last, follow
+        the parent that ended last until a node without traced parents.
+        """
+        complete = {name for name, t in self.timings.items() if t.complete}
+        if not complete:
+            return []
+        path = [max(complete, key=lambda name: self.timings[name].ended)]
+        while True:
+            parents = [graph.names[i] for i in graph.parents(graph.ids[path[-1]])]
+            parents = [name for name in parents if name in complete]
+            if not parents:
+                break
+            path.append(max(parents, key=lambda name: self.timings[name].ended))
+        path.reverse()
+        return path
+
+    def summary(self, graph: Graph) -> str:
+        """Return a table of where the makespan went: critical path, workers and scheduling."""
+        # pylint: disable=too-many-locals
+        complete = {name: t for name, t in self.timings.items() if t.complete}
+        if not complete:
+            return "Trace: no stage ran"
+        origin = min(t.ready or t.dispatched or t.started for t in complete.values())
+        makespan = max(t.ended for t in complete.values()) - origin
+        lines = [f"Makespan: {makespan:.3f}s over {len(complete)} stages"]
+
+        path = self.critical_path(graph)
+        running = sum(complete[name].duration for name in path)
+        lines.append(f"Critical path: {len(path)} stages, {running:.3f}s running, "
+                     f"{makespan - running:.3f}s waiting")
+        lines.append(f"  {'stage':<40} {'ready':>9} {'queued':>8} {'run':>9}")
+        for name in path:
+            t = complete[name]
+            lines.append(f"  {name:<40} {(t.ready or t.dispatched) - origin:>8.3f}s "
+                         f"{t.queued:>7.3f}s {t.duration:>8.3f}s")
+
+        busy: Dict[str, List[float]] = {}
+        for t in complete.values():
+            busy.setdefault(t.worker or "unknown", []).append(t.duration)
+        lines.append(f"Workers: {len(busy)}")
+        lines.append(f"  {'worker':<40} {'stages':>6} {'busy':>9} {'util':>6}")
+        for worker, durations in sorted(busy.items()):
+            total = sum(durations)
+            utilization = 100 * total / makespan if makespan else 0.0
+            lines.append(f"  {worker:<40} {len(durations):>6} {total:>8.3f}s "
+                         f"{utilization:>5.1f}%")
+
+        queued = [t.queued for t in complete.values()]
+        overhead = [t.overhead for t in complete.values()]
+        lines.append(f"Scheduler: queued mean {statistics.mean(queued):.3f}s "
+                     f"max {max(queued):.3f}s, dispatch to start mean "
+                     f"{statistics.mean(overhead) * 1e3:.1f}ms max {max(overhead) * 1e3:.1f}ms")
+
+        lines.append("Slowest stages:")
+        for name, t in sorted(complete.items(), key=lambda item: -item[1].duration)[:SLOWEST]:
+            usage = ""
+            if t.cpu is not None:
+                usage = f" cpu {t.cpu:.3f}s, peak rss {t.max_rss_kb / 1024:.1f} MiB"
+            lines.append(f"  {name:<40} {t.duration:>8.3f}s exit {t.returncode}{usage}")
+        return "\n".join(lines)
@@ -0,0 +1,327 @@
+"""
+``workscript watch``: keep a merged DAG loaded and re-run the stages affected by file changes.
+
+Each stage's command directory (not recursive) and the directories of its declared
+``inputs`` are watched with inotify, or by polling where inotify is not available.
+A burst of changes is debounced into one set of touched stages; those stages and
+their descendants are re-run, and any of them still running are cancelled first.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import logger as lg
+from .execution import execute_command_async
+from .logs import LogCapture
+from .runner import FAILED, PENDING, SKIPPED, SUCCESS, Node, Runner
+from .stamps import expand_inputs
+
+logger = lg.get_logger(__name__)
+
+# inotify(7) event masks
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+FileState = Dict[str, Tuple[int, int]]
+
+
+def _directory_state(directory: str) -> FileState:
+    """Return (mtime, size) of every file directly inside a directory."""
+    state = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return state
+
+
+class InotifyWatcher:
+    """Reports changed paths in the watched directories through inotify."""
+
+    def __init__(self, directories: Iterable[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories: Dict[int, str] = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self._fd)
+                raise OSError(error, f"Cannot watch {directory}: {os.strerror(error)}")
+            self.directories[wd] = directory
+
+    def start(self, queue: asyncio.Queue) -> None:
+        """Put each batch of changed paths on the queue as it is read."""
+        asyncio.get_running_loop().add_reader(self._fd, self._read, queue)
+
+    def _read(self, queue: asyncio.Queue) -> None:
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped: treat every watched directory as changed.
+                paths.update(os.path.join(d, "") for d in self.directories.values())
+            elif wd in self.directories:
+                paths.add(os.path.join(self.directories[wd], os.fsdecode(name)))
+        if paths:
+            queue.put_nowait(paths)
+
+    def close(self) -> None:
+        """Stop watching."""
+        try:
+            asyncio.get_running_loop().remove_reader(self._fd)
+        except RuntimeError:
+            pass
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Reports changed paths by comparing directory listings every ``interval`` seconds."""
+
+    def __init__(self, directories: Iterable[str], interval: float = 1.0):
+        self.directories = list(directories)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, queue: asyncio.Queue) -> None:
+        """Put each batch of changed paths on the queue as it is found."""
+        self._task = asyncio.ensure_future(self._poll(queue))
+
+    async def _poll(self, queue: asyncio.Queue) -> None:
+        states = {d: _directory_state(d) for d in self.directories}
+        while True:
+            await asyncio.sleep(self.interval)
+            paths = set()
+            for directory in self.directories:
+                state = _directory_state(directory)
+                old = states[directory]
+                paths.update(p for p in state.keys() | old.keys() if state.get(p) != old.get(p))
+                states[directory] = state
+            if paths:
+                queue.put_nowait(paths)
+
+    def close(self) -> None:
+        """Stop polling."""
+        if self._task is not None:
+            self._task.cancel()
+
+
+def create_watcher(directories: Iterable[str], polling: bool = False, interval: float = 1.0):
+    """Return an inotify watcher, or a polling one if asked for or if inotify fails."""
+    directories = sorted(set(directories))
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify unavailable (%s), polling every %.1fs", e, interval)
+    return PollingWatcher(directories, interval)
+
+
+class WatchSession:
+    """
+    Keeps the DAG loaded, runs it once, then re-runs the stages touched by file
+    changes and their descendants. A running stage is not invalidated by changes in
+    its own directory, which are taken as its output; edits to its declared inputs
+    or to an upstream stage do cancel it.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        dag: Runner,
+        max_workers: int = 1,
+        logs: Optional[LogCapture] = None,
+        debounce: float = 0.3,
+        polling: bool = False,
+        interval: float = 1.0
+    ):
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self.dag = dag
+        self.max_workers = max(1, max_workers)
+        self.logs = logs
+        self.debounce = debounce
+        self.polling = polling
+        self.interval = interval
+        self.position = {i: k for k, i in enumerate(dag.graph.order)}
+        self.directory_nodes: Dict[str, List[int]] = {}
+        self.input_patterns: Dict[int, List[str]] = {}
+        for node in dag.node_list:
+            directory = node.command.get("directory")
+            if directory:
+                self.directory_nodes.setdefault(os.path.abspath(directory), []).append(node.index)
+            if node.inputs:
+                self.input_patterns[node.index] = [os.path.abspath(p) for p in node.inputs]
+        self.snapshots: Dict[int, FileState] = {}
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.runs = 0
+
+    def watched_directories(self) -> Set[str]:
+        """Return the existing directories that hold stage directories and inputs."""
+        directories = set(self.directory_nodes)
+        for patterns in self.input_patterns.values():
+            for path in expand_inputs(patterns):
+                directories.add(os.path.dirname(path))
+        return {d for d in directories if os.path.isdir(d)}
+
+    def _state(self, node: Node) -> FileState:
+        state = {}
+        directory = node.command.get("directory")
+        if directory:
+            state.update(_directory_state(os.path.abspath(directory)))
+        for path in expand_inputs(self.input_patterns.get(node.index, ())):
+            try:
+                stat = os.stat(path)
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                state[path] = (0, -1)
+        return state
+
+    def touched(self, paths: Iterable[str]) -> Set[int]:
+        """Return the stages whose watched files really changed since their last run."""
+        candidates: Dict[int, bool] = {}  # index -> changed through a declared input
+        for path in paths:
+            for i in self.directory_nodes.get(os.path.dirname(path), ()):
+                candidates.setdefault(i, False)
+            for i, patterns in self.input_patterns.items():
+                if any(fnmatch.fnmatch(path, pattern) for pattern in patterns):
+                    candidates[i] = True
+        touched = set()
+        for i, through_input in candidates.items():
+            if i in self.tasks and not through_input:
+                continue
+            node = self.dag.node_list[i]
+            if through_input or self._state(node) != self.snapshots.get(i):
+                touched.add(i)
+        return touched
+
+    def _descendants(self, roots: Iterable[int]) -> Set[int]:
+        seen = set(roots)
+        stack = list(seen)
+        while stack:
+            for child in self.dag.graph.children(stack.pop()):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        return seen
+
+    def invalidate(self, touched: Iterable[int]) -> None:
+        """Mark stages and their descendants to run again, cancelling stale runs."""
+        for i in sorted(self._descendants(touched), key=self.position.get):
+            node = self.dag.node_list[i]
+            task = self.tasks.pop(i, None)
+            if task is not None:
+                task.cancel()
+                logger.warning("Cancelled stale run of %s", node.name)
+            node.status = PENDING
+
+    def _runnable(self) -> List[Node]:
+        node_list = self.dag.node_list
+        return [
+            node for node in node_list
+            if node.status == PENDING and node.index not in self.tasks
+            and all(node_list[p].status == SUCCESS for p in self.dag.graph.parents(node.index))
+        ]
+
+    def _skip_descendants(self, node: Node) -> None:
+        for i in self._descendants([node.index]) - {node.index}:
+            child = self.dag.node_list[i]
+            if child.status == PENDING and i not in self.tasks:
+                child.status = SKIPPED
+                logger.warning("Skipped: %s (upstream %s failed)", child.name, node.name)
+
+    async def _run_node(self, node: Node, done: asyncio.Queue) -> None:
+        command_info = Runner._command_info(node, "all")  # pylint: disable=protected-access
+        if self.logs:
+            with self.logs.open(node.name) as log:
+                _, returncode = await execute_command_async(command_info, log)
+        else:
+            _, returncode = await execute_command_async(command_info)
+        done.put_nowait((node.index, returncode, asyncio.current_task()))
+
+    async def _debounce(self, changes: asyncio.Queue, output: asyncio.Queue) -> None:
+        while True:
+            paths = set(await changes.get())
+            while True:
+                try:
+                    paths.update(await asyncio.wait_for(changes.get(), self.debounce))
+                except asyncio.TimeoutError:
+                    break
+            output.put_nowait(("changes", paths))
+
+    async def run(self) -> None:
+        """Run the DAG, then watch and re-run until cancelled."""
+        for node in self.dag.node_list:
+            node.status = PENDING
+            self.snapshots[node.index] = self._state(node)
+        directories = self.watched_directories()
+        watcher = create_watcher(directories, self.polling, self.interval)
+        changes: asyncio.Queue = asyncio.Queue()
+        inbox: asyncio.Queue = asyncio.Queue()
+        watcher.start(changes)
+        debouncer = asyncio.ensure_future(self._debounce(changes, inbox))
+        logger.warning("Watching %d directories (%s)", len(directories), type(watcher).__name__)
+        idle = False
+        try:
+            while True:
+                for node in self._runnable()[:self.max_workers - len(self.tasks)]:
+                    logger.info("Submitted: %s", node.name)
+                    self.tasks[node.index] = asyncio.ensure_future(self._run_node(node, inbox))
+                if not self.tasks and not idle:
+                    logger.warning("Idle: %s", ", ".join(
+                        f"{k}={v}" for k, v in self.dag.summary().items()))
+                idle = not self.tasks
+                message = await inbox.get()
+                if message[0] == "changes":
+                    touched = self.touched(message[1])
+                    if touched:
+                        logger.warning("Changed: %s", ", ".join(
+                            sorted(self.dag.node_list[i].name for i in touched)))
+                        self.invalidate(touched)
+                    continue
+                index, returncode, task = message
+                if self.tasks.get(index) is not task:
+                    continue  # a cancelled run that finished anyway
+                del self.tasks[index]
+                node = self.dag.node_list[index]
+                node.status = FAILED if returncode else SUCCESS
+                self.snapshots[index] = self._state(node)
+                self.runs += 1
+                if returncode:
+                    logger.error("Error in node %s: exit status %s", node.name, returncode)
+                    self._skip_descendants(node)
+                else:
+                    logger.info("Completed: %s", node.name)
+        finally:
+            debouncer.cancel()
+            watcher.close()
+            for task in self.tasks.values():
+                task.cancel()
@@ -0,0 +1,188 @@
+"""``workscript worker``: an agent that runs node commands for remote coordinators."""
+
+import functools
+import hmac
+import json
+import multiprocessing
+import queue
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import logger as lg
+from .execution import CommandInfo, execute_in, init_worker
+from .executors import send_message, terminate_pool
+from .logs import LogCapture
+
+logger = lg.get_logger(__name__)
+
+# In pool processes: queue of the ids of jobs as they begin.
+_started: Optional[multiprocessing.Queue] = None  # pylint: disable=invalid-name
+
+
+def _init_pool(started: multiprocessing.Queue) -> None:
+    """Pool initializer; ``started`` receives the id of every job as it begins."""
+    global _started  # pylint: disable=global-statement
+    _started = started
+    init_worker()
+
+
+def _run_job(
+    job: int,
+    workdir: str,
+    command_info: CommandInfo,
+    logs: Optional[LogCapture]
+) -> Tuple[str, int, List[str], Dict[str, Any]]:
+    """Announce a job, then run it like execute_in."""
+    _started.put(job)
+    return execute_in(workdir, command_info, logs)
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one coordinator connection with its own pool, whose stages take their
+    slots from the ``capacity`` shared by all coordinators of the worker.
+    When the coordinator cancels or disconnects, its running stages are killed.
+    """
+
+    def setup(self) -> None:
+        super().setup()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.closed = threading.Event()
+        # Held while submitting, so no job reaches the pool once the connection closes.
+        self.submitting = threading.Lock()
+
+    def authenticate(self, peer: str) -> bool:
+        """Answer the coordinator's hello if it carries the shared token."""
+        try:
+            hello = json.loads(self.rfile.readline() or b"{}")
+        except ValueError:
+            hello = {}
+        token = str(hello.get("token", "")).encode("utf-8")
+        if hello.get("type") != "hello" or not hmac.compare_digest(token, self.server.token):
+            logger.warning("Refused coordinator %s: invalid token", peer)
+            self.send({"type": "error", "message": "invalid token"})
+            return False
+        self.send({"type": "hello", "capacity": self.server.capacity,
+                   "host": socket.gethostname()})
+        return True
+
+    def forward_started(self, started: multiprocessing.Queue) -> None:
+        """Send ``started`` for every job the pool begins, until the connection closes."""
+        while not self.closed.is_set():
+            try:
+                job = started.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.send({"type": "started", "id": job})
+
+    def dispatch(self, pool: ProcessPoolExecutor, jobs: "queue.Queue[dict]") -> None:
+        """Submit the coordinator's jobs to its pool as slots of the worker free up."""
+        slots = self.server.slots
+        while True:
+            message = jobs.get()
+            while not slots.acquire(timeout=0.2):
+                if self.closed.is_set():
+                    return
+            with self.submitting:
+                if self.closed.is_set():
+                    slots.release()
+                    return
+                logs = LogCapture(**message["logs"]) if message["logs"] else None
+                future = pool.submit(
+                    _run_job, message["id"], message["cwd"], tuple(message["command"]), logs
+                )
+                self.pending.add(future)
+            future.add_done_callback(
+                functools.partial(self._finished, message["id"], message["command"][0])
+            )
+
+    def send(self, message: dict) -> None:
+        """Send a status message, ignoring a coordinator that already went away."""
+        try:
+            send_message(self.wfile, self.lock, message)
+        except OSError:
+            pass
+
+    def handle(self) -> None:
+        server: WorkerServer = self.server
+        host, port = self.client_address[:2]
+        peer = f"{host}:{port}"
+        if not self.authenticate(peer):
+            return
+        logger.info("Coordinator %s connected", peer)
+        started: multiprocessing.Queue = multiprocessing.Queue()
+        pool = ProcessPoolExecutor(
+            max_workers=server.capacity, initializer=_init_pool, initargs=(started,)
+        )
+        jobs: "queue.Queue[dict]" = queue.Queue()
+        threading.Thread(target=self.forward_started, args=(started,), daemon=True).start()
+        threading.Thread(target=self.dispatch, args=(pool, jobs), daemon=True).start()
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if message["type"] == "cancel":
+                    logger.warning("Coordinator %s cancelled %d stages", peer, len(self.pending))
+                    break
+                if message["type"] == "run":
+                    jobs.put(message)
+        except (OSError, ValueError) as e:
+            logger.error("Connection to %s failed: %s", peer, e)
+        finally:
+            with self.submitting:
+                self.closed.set()
+            if self.pending:
+                terminate_pool(pool)
+            else:
+                pool.shutdown(wait=True)
+            logger.info("Coordinator %s disconnected", peer)
+
+    def _finished(self, job: int, name: str, future: Future) -> None:
+        self.pending.discard(future)
+        self.server.slots.release()
+        if future.cancelled():
+            return
+        try:
+            _, returncode, tail, usage = future.result()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Error in node %s: %s", name, e)
+            returncode, tail, usage = -1, [], None
+        self.server.count_completed()
+        self.send({"type": "finished", "id": job, "name": name,
+                   "returncode": returncode, "tail": list(tail), "usage": usage})
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    """
+    TCP server accepting coordinators that present ``token``; the stages of all of
+    them share ``capacity`` slots.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, capacity: int, token: str):
+        super().__init__(address, WorkerHandler)
+        self.capacity = capacity
+        self.token = token.encode("utf-8")
+        self.slots = threading.BoundedSemaphore(capacity)
+        self.completed = 0
+        self._completed_lock = threading.Lock()
+
+    def count_completed(self) -> None:
+        """Count a stage run for any coordinator; called from the connections' threads."""
+        with self._completed_lock:
+            self.completed += 1
+
+
+def serve(host: str, port: int, capacity: int, token: str) -> None:
+    """Run a worker for coordinators presenting ``token`` until interrupted."""
+    with WorkerServer((host, port), capacity, token) as server:
+        logger.warning("Worker listening on %s:%d with %d slots", host, port, capacity)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,22 @@
+"""Fixtures shared by the unit tests."""
+
+import tempfile
+import unittest
+
+
+def stage(command: str, directory: str, after=None) -> dict:
+    """Return a merged-style stage entry running ``command`` in ``directory``."""
+    return {
+        "command": {"directory": directory, "command": command},
+        "post": {},
+        "before": [],
+        "after": after or [],
+    }
+
+
+class TempDirTestCase(unittest.TestCase):
+    """A test case with a fresh temporary directory, ``self.tmp``, for every test."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.tmp.cleanup)
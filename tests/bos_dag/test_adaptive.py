@@ -0,0 +1,109 @@
+"""Unit tests for adaptive concurrency."""
+
+import os
+import tempfile
+import unittest
+
+from src.dag import adaptive
+from src.dag.adaptive import AdaptiveLimit, Sample, SystemMonitor
+from src.dag.runner import Runner
+
+from .helpers import stage
+
+GIB = 2**30
+IDLE = Sample(load=0.2, busy=0.2, iowait=0.0, mem_available=8 * GIB, mem_total=16 * GIB)
+BUSY = Sample(load=1.2, busy=0.9, iowait=0.05, mem_available=8 * GIB, mem_total=16 * GIB)
+OVERLOADED = Sample(load=2.0, busy=1.0, iowait=0.0, mem_available=8 * GIB, mem_total=16 * GIB)
+
+
+class FakeMonitor:
+    """Returns the given samples in turn."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, *samples):
+        self.samples = list(samples)
+
+    def sample(self) -> Sample:
+        """Return the next sample, repeating the last one."""
+        return self.samples.pop(0) if len(self.samples) > 1 else self.samples[0]
+
+
+class TestAdaptive(unittest.TestCase):
+    """Test /proc sampling, the limit controller and its use by the runner."""
+
+    def limit(self, low=1, high=8, floor=0) -> AdaptiveLimit:
+        """Return a controller that samples on every call."""
+        return AdaptiveLimit(low, high, floor, interval=0.0, monitor=FakeMonitor(IDLE))
+
+    def test_monitor_reads_proc(self):
+        """Load per CPU, CPU shares since the previous sample and memory come from /proc."""
+        with tempfile.TemporaryDirectory() as proc:
+            def write(name, text):
+                with open(os.path.join(proc, name), "w", encoding="ascii") as f:
+                    f.write(text)
+
+            write("loadavg", "3.00 1.00 0.50 2/100 1234\n")
+            write("meminfo", "MemTotal:       16384 kB\nMemAvailable:    4096 kB\n")
+            write("stat", "cpu  100 0 100 700 100 0 0 0 0 0\ncpu0 1 2 3 4 5\n")
+            monitor = SystemMonitor(proc, cpus=4)
+            write("stat", "cpu  150 0 150 750 150 0 0 0 0 0\n")
+            sample = monitor.sample()
+        self.assertEqual(0.75, sample.load)
+        self.assertEqual((0.5, 0.25), (sample.busy, sample.iowait))
+        self.assertEqual((4096 * 1024, 16384 * 1024), (sample.mem_available, sample.mem_total))
+
+    def test_hysteresis(self):
+        """The limit moves only after consecutive samples agree, and holds in between."""
+        limit = self.limit()
+        limit.update(IDLE, running=1)
+        self.assertEqual(1, limit.limit)
+        limit.update(IDLE, running=1)
+        self.assertEqual(2, limit.limit)
+        for sample in (IDLE, BUSY, IDLE, BUSY):
+            limit.update(sample, running=2)
+        self.assertEqual(2, limit.limit)
+
+    def test_raise_needs_full_slots_and_stays_in_range(self):
+        """An idle machine with free slots keeps the limit; it never leaves min..max."""
+        limit = self.limit(2, 3)
+        for _ in range(4):
+            limit.update(IDLE, running=0)
+        self.assertEqual(2, limit.limit)
+        for _ in range(10):
+            limit.update(IDLE, running=limit.limit)
+        self.assertEqual(3, limit.limit)
+        for _ in range(10):
+            limit.update(OVERLOADED, running=3)
+        self.assertEqual(2, limit.limit)
+
+    def test_lowers_by_a_quarter(self):
+        """Overload lowers the limit by a quarter of it at a time."""
+        limit = self.limit(1, 16)
+        limit.limit = 16
+        limit.update(OVERLOADED, running=16)
+        limit.update(OVERLOADED, running=16)
+        self.assertEqual(12, limit.limit)
+
+    def test_pause_below_memory_floor(self):
+        """Dispatch pauses below the floor and resumes once memory recovers past it."""
+        limit = self.limit(floor=4 * GIB)
+        low = IDLE._replace(mem_available=3 * GIB)
+        limit.monitor = FakeMonitor(low, IDLE._replace(mem_available=int(4.5 * GIB)), IDLE)
+        self.assertEqual(0, limit.current(running=1))
+        self.assertEqual(0, limit.current(running=1))
+        self.assertEqual(1, limit.current(running=1))
+
+    def test_runner_respects_limit(self):
+        """The runner completes the DAG under an adaptive limit, pausing while told to."""
+        with tempfile.TemporaryDirectory() as tmp:
+            dct = {f"t:{i}": stage("true", tmp) for i in range(4)}
+            low = IDLE._replace(mem_available=0)
+            limit = AdaptiveLimit(1, 2, GIB, interval=0.01, monitor=FakeMonitor(low, IDLE))
+            summary = Runner.create_from_dict(dct).launch(max_workers=2, adaptive=limit)
+        self.assertEqual(4, summary["success"])
+        self.assertFalse(limit.paused)
+
+    def test_thresholds_band(self):
+        """Samples between the raise and lower thresholds hold the limit."""
+        self.assertEqual(0, AdaptiveLimit._verdict(BUSY))  # pylint: disable=protected-access
+        self.assertLess(adaptive.RAISE_LOAD, adaptive.LOWER_LOAD)
@@ -0,0 +1,115 @@
+"""Unit tests for the content-addressed artifact cache."""
+
+import os
+import time
+
+from src.dag.artifacts import ArtifactCache
+from src.dag.runner import Runner
+
+from .helpers import TempDirTestCase
+
+
+def stage(directory: str, command: str = "cat ../in.txt > out.txt; echo run >> ../runs.txt"):
+    """Return a merged stage writing ``out.txt`` in ``directory`` from the shared input."""
+    return {
+        "command": {"directory": directory, "command": command},
+        "post": {},
+        "before": [],
+        "after": [],
+        "inputs": [os.path.join(directory, "..", "in.txt")],
+        "outputs": [os.path.join(directory, "out.txt")],
+    }
+
+
+class TestArtifactCache(TempDirTestCase):
+    """Test keys, restores, concurrent stores and eviction."""
+
+    def setUp(self):
+        super().setUp()
+        self.work = os.path.join(self.tmp.name, "work")
+        for target in ("t1", "t2", "t3"):
+            os.makedirs(os.path.join(self.work, target))
+        self.write("in.txt", "data\n")
+        self.cache = ArtifactCache(os.path.join(self.tmp.name, "cache"))
+
+    def write(self, name: str, text: str) -> None:
+        """Write a file under the work directory."""
+        with open(os.path.join(self.work, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def read(self, name: str) -> str:
+        """Read a file under the work directory."""
+        with open(os.path.join(self.work, name), encoding="utf-8") as f:
+            return f.read()
+
+    def launch(self, targets) -> dict:
+        """Run one stage per target with the cache and return the summary."""
+        dct = {f"{t}:A": stage(os.path.join(self.work, t)) for t in targets}
+        return Runner.create_from_dict(dct).launch(max_workers=1, artifacts=self.cache)
+
+    def test_targets_share_entries(self):
+        """A target running the same command on the same inputs restores the stored output."""
+        self.launch(["t1"])
+        self.assertEqual({"hits": 0, "misses": 1, "stored": 1}, self.cache.summary())
+
+        summary = self.launch(["t2"])
+        self.assertEqual(1, summary["success"])
+        self.assertEqual("data\n", self.read("t2/out.txt"))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual("run\n", self.read("runs.txt"))
+
+    def test_changed_input_misses(self):
+        """Changing the content of a declared input changes the key."""
+        self.launch(["t1"])
+        self.write("in.txt", "other\n")
+        self.launch(["t2"])
+        self.assertEqual({"hits": 0, "misses": 2, "stored": 2}, self.cache.summary())
+        self.assertEqual("other\n", self.read("t2/out.txt"))
+
+    def test_declared_outputs_enter_key(self):
+        """Stages differing only in their declared outputs do not share entries."""
+        nodes = Runner.create_from_dict({
+            "t1:A": stage(os.path.join(self.work, "t1")),
+            "t2:A": stage(os.path.join(self.work, "t2")),
+        }).nodes
+        nodes["t2:A"].outputs = [os.path.join(self.work, "t2", "other.txt")]
+        self.assertNotEqual(self.cache.key(nodes["t1:A"], "all"),
+                            self.cache.key(nodes["t2:A"], "all"))
+
+    def test_stages_without_outputs_are_not_cached(self):
+        """Only stages declaring outputs get a key."""
+        node = Runner.create_from_dict({"t1:A": stage(self.work)}).nodes["t1:A"]
+        node.outputs = ()
+        self.assertIsNone(self.cache.key(node, "all"))
+
+    def test_concurrent_store_keeps_first_entry(self):
+        """A second process storing the same key leaves the first entry in place."""
+        runs = Runner.create_from_dict({"t1:A": stage(os.path.join(self.work, "t1"))})
+        runs.launch(max_workers=1)
+        node = runs.nodes["t1:A"]
+        key = self.cache.key(node, "all")
+        other = ArtifactCache(self.cache.directory)
+        self.cache.store(node, "all", key)
+        other.store(node, "all", key)
+        self.assertEqual((1, 0), (self.cache.stored, other.stored))
+        self.assertEqual([], os.listdir(self.cache.tmp))
+
+    def test_evicts_least_recently_used(self):
+        """Eviction drops the entries used longest ago until the cache fits."""
+        nodes = []
+        for i, target in enumerate(("t1", "t2", "t3")):
+            runs = Runner.create_from_dict({
+                f"{target}:A": stage(os.path.join(self.work, target), f"echo {i} > out.txt")
+            })
+            runs.launch(max_workers=1, artifacts=self.cache)
+            nodes.append(runs.nodes[f"{target}:A"])
+            time.sleep(0.01)
+        keys = [self.cache.key(node, "all") for node in nodes]
+        # Using the oldest entry again makes the second one the least recently used.
+        self.assertTrue(self.cache.restore(nodes[0], keys[0]))
+
+        self.cache.max_bytes = 4
+        self.assertEqual(1, self.cache.evict())
+        self.assertTrue(self.cache.restore(nodes[0], keys[0]))
+        self.assertFalse(self.cache.restore(nodes[1], keys[1]))
+        self.assertTrue(self.cache.restore(nodes[2], keys[2]))
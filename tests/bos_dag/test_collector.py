@@ -0,0 +1,79 @@
+"""Unit tests for collecting post output files."""
+
+import json
+import os
+import unittest
+
+from src.dag import collector, store  # Make sure PYTHONPATH includes project root
+
+from .helpers import TempDirTestCase
+
+
+class TestCollector(TempDirTestCase):
+    """Test parallel, streaming collect."""
+
+    def setUp(self):
+        super().setUp()
+        self.stages = {}
+        for i in range(20):
+            name = f"t:S{i}"
+            self.stages[name] = {
+                "command": {}, "before": [], "after": [], "variables": {},
+                "post": {"directory": self.tmp.name, "output": f"S{i}.txt"}
+            }
+            if i % 5:
+                with open(os.path.join(self.tmp.name, f"S{i}.txt"), "w", encoding="utf-8") as f:
+                    f.write(f"line {i}\n" * 3)
+        self.stages["t:NOPOST"] = {
+            "command": {}, "post": {}, "before": [], "after": [], "variables": {}
+        }
+        self.merged = os.path.join(self.tmp.name, "merged.jsonl")
+        store.write(self.merged, self.stages, store.JSONL)
+        self.output = os.path.join(self.tmp.name, "analyzed.json")
+
+    def collect(self, **options) -> dict:
+        """Collect into the output file and load it back."""
+        with store.MergedFile(self.merged) as merged:
+            collector.collect(merged, self.output, jobs=3, **options)
+        with open(self.output, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_streamed_output_in_node_order(self):
+        """Entries come out in node order, with missing files reported as failed."""
+        outputs = self.collect()
+
+        self.assertEqual([f"t:S{i}" for i in range(20)], list(outputs))
+        self.assertEqual("failed", outputs["t:S0"]["status"])
+        self.assertEqual("unverified", outputs["t:S1"]["status"])
+        self.assertEqual("line 1\n" * 3, outputs["t:S1"]["content"])
+
+    def test_matches_json_dump(self):
+        """The streamed file is byte-identical to json.dump with indent=4."""
+        outputs = self.collect()
+        with open(self.output, encoding="utf-8") as f:
+            self.assertEqual(json.dumps(outputs, indent=4), f.read())
+
+    def test_head_and_tail(self):
+        """A size cap keeps the beginning or the end of each file."""
+        self.assertEqual("line", self.collect(max_bytes=4)["t:S1"]["content"])
+
+        entry = self.collect(max_bytes=7, mode=collector.TAIL)["t:S1"]
+        self.assertEqual("line 1\n", entry["content"])
+        self.assertEqual(collector.TAIL, entry["truncated"])
+
+    def test_rules(self):
+        """Stages with rules are marked passed or failed with evidence."""
+        self.stages["t:S1"]["post"]["rules"] = [{"type": "require", "pattern": "line 1"}]
+        self.stages["t:S2"]["post"]["rules"] = [{"type": "forbid", "pattern": "line"}]
+        store.write(self.merged, self.stages, store.JSONL)
+        outputs = self.collect()
+
+        self.assertEqual("passed", outputs["t:S1"]["status"])
+        self.assertEqual(3, outputs["t:S1"]["rules"][0]["count"])
+        self.assertEqual("failed", outputs["t:S2"]["status"])
+        self.assertEqual({"line": 1, "text": "line 2"}, outputs["t:S2"]["rules"][0]["evidence"][0])
+        self.assertEqual("unverified", outputs["t:S3"]["status"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Unit tests for remote execution on several localhost workers."""
+
+import os
+import threading
+import time
+import unittest
+
+from src.dag import runner
+from src.dag.executors import RemoteExecutor, parse_workers
+from src.dag.logs import LogCapture
+from src.dag.runner import Runner  # Make sure PYTHONPATH includes project root
+from src.dag.worker import WorkerServer
+
+from .helpers import TempDirTestCase, stage
+
+TOKEN = "secret"
+
+
+class TestRemoteExecutor(TempDirTestCase):
+    """Test running a DAG on workers listening on localhost."""
+
+    def setUp(self):
+        super().setUp()
+        self.servers = [WorkerServer(("127.0.0.1", 0), capacity, TOKEN) for capacity in (2, 1)]
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addresses = [server.server_address for server in self.servers]
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def test_parse_workers(self):
+        """Addresses default to the worker port."""
+        self.assertEqual([("a", 7071), ("b", 9000)], parse_workers("a, b:9000"))
+
+    def test_wrong_token_is_refused(self):
+        """A coordinator without the shared token cannot connect."""
+        with self.assertRaisesRegex(ConnectionError, "invalid token"):
+            RemoteExecutor(self.addresses, token="guess")
+
+    def test_fan_out(self):
+        """Independent stages spread over all workers; dependencies still hold."""
+        dct = {f"t:S{i}": stage(f"sleep 0.2; echo S{i} >> order.txt", self.tmp.name)
+               for i in range(6)}
+        dct["t:last"] = stage("echo last >> order.txt", self.tmp.name, list(dct))
+        executor = RemoteExecutor(self.addresses, token=TOKEN)
+        self.assertEqual(3, executor.capacity)
+
+        runs = Runner.create_from_dict(dct)
+        summary = runs.launch(executor=executor)
+
+        self.assertEqual(7, summary[runner.SUCCESS])
+        with open(os.path.join(self.tmp.name, "order.txt"), encoding="utf-8") as f:
+            self.assertEqual("last", f.read().split()[-1])
+        self.assertEqual({f"{host}:{port}" for host, port in self.addresses},
+                         set(executor.assignments.values()))
+        self.assertEqual(7, sum(server.completed for server in self.servers))
+
+    def test_failure_and_logs(self):
+        """Return codes and log tails come back from the worker."""
+        dct = {"t:bad": stage("echo broken; exit 3", self.tmp.name)}
+        runs = Runner.create_from_dict(dct)
+        logs = LogCapture(os.path.join(self.tmp.name, "logs"))
+
+        summary = runs.launch(executor=RemoteExecutor(self.addresses, token=TOKEN), logs=logs)
+
+        self.assertEqual(1, summary[runner.FAILED])
+        self.assertIn("broken", runs.tails["t:bad"])
+        self.assertTrue(os.path.isfile(logs.path_for("t:bad")))
+
+    def test_fail_fast_cancels_remote_stages(self):
+        """Fail-fast kills the stages still running on the workers."""
+        dct = {
+            "t:bad": stage("exit 1", self.tmp.name),
+            "t:slow": stage("sleep 30", self.tmp.name),
+        }
+        start = time.monotonic()
+        summary = Runner.create_from_dict(dct).launch(
+            executor=RemoteExecutor(self.addresses, token=TOKEN), on_failure=runner.FAIL_FAST
+        )
+
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual((1, 1), (summary[runner.FAILED], summary[runner.CANCELLED]))
+
+    def test_batch_runs_one_after_another(self):
+        """A batch runs each node through submit and resolves to their results in order."""
+        executor = RemoteExecutor(self.addresses, token=TOKEN)
+        infos = [(f"t:{i}", f"echo {i} >> order.txt; exit {i}", self.tmp.name, "", "", None)
+                 for i in range(3)]
+        results = executor.submit_batch(infos).result(timeout=10)
+        executor.shutdown()
+
+        self.assertEqual([("t:0", 0), ("t:1", 1), ("t:2", 2)], [r[:2] for r in results])
+        with open(os.path.join(self.tmp.name, "order.txt"), encoding="utf-8") as f:
+            self.assertEqual(["0", "1", "2"], f.read().split())
+
+    def test_capacity_is_shared_by_coordinators(self):
+        """Two coordinators on a one-slot worker never run stages at the same time."""
+        command = "mkdir busy.d || exit 9; sleep 0.2; rmdir busy.d"
+        executors = [RemoteExecutor(self.addresses[1:], token=TOKEN) for _ in range(2)]
+        futures = [executor.submit((f"t:{i}", command, self.tmp.name, "", "", None))
+                   for i, executor in enumerate(executors * 2)]
+
+        self.assertEqual([0] * 4, [future.result(timeout=10)[1] for future in futures])
+        for executor in executors:
+            executor.shutdown()
+        self.assertEqual(4, self.servers[1].completed)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
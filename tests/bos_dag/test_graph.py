@@ -0,0 +1,42 @@
+"""Unit tests for the integer-indexed DAG core."""
+
+import unittest
+
+from src.dag import exceptions
+from src.dag.graph import Graph  # Make sure PYTHONPATH includes project root
+
+
+def stages(edges: dict) -> dict:
+    """Build merged-style stages from a {name: [parents]} mapping."""
+    return {name: {"before": [], "after": parents} for name, parents in edges.items()}
+
+
+class TestGraph(unittest.TestCase):
+    """Test graph construction and validation."""
+
+    def test_adjacency_and_order(self):
+        """Before and after edges both end up in the CSR adjacency."""
+        dct = stages({"A": [], "B": ["A"], "C": []})
+        dct["C"]["before"] = ["B"]
+        graph = Graph.from_dict(dct)
+
+        self.assertEqual([graph.ids["B"]], list(graph.children(graph.ids["A"])))
+        self.assertEqual(sorted([graph.ids["A"], graph.ids["C"]]),
+                         sorted(graph.parents(graph.ids["B"])))
+        self.assertEqual(2, graph.in_degree(graph.ids["B"]))
+        order = [graph.names[i] for i in graph.order]
+        self.assertEqual("B", order[-1])
+
+    def test_unknown_dependency(self):
+        """A reference to a missing stage is reported with the referring stage."""
+        with self.assertRaises(exceptions.UnknownDependency) as ctx:
+            Graph.from_dict(stages({"A": ["X"]}))
+        self.assertEqual(("A", "X"), (ctx.exception.stage, ctx.exception.dependency))
+
+    def test_cycle(self):
+        """A cycle is reported with the stages on it."""
+        with self.assertRaises(exceptions.CyclicDependency) as ctx:
+            Graph.from_dict(stages({"A": [], "B": ["A", "D"], "C": ["B"], "D": ["C"]}))
+        cycle = ctx.exception.cycle
+        self.assertEqual({"B", "C", "D"}, set(cycle))
+        self.assertEqual(cycle[0], cycle[-1])
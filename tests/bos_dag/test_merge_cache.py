@@ -0,0 +1,59 @@
+"""Unit tests for the incremental merge cache."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.dag import builder, merge_cache
+from src.dag.builder import Builder  # Make sure PYTHONPATH includes project root
+
+
+class TestMergeCache(unittest.TestCase):
+    """Test merge reuses unchanged targets."""
+
+    def test_only_changed_targets_are_expanded(self):
+        """A changed target entry misses; the others are spliced from the cache in order."""
+        stages = {
+            "A": {
+                "run": {"directory": "${PATH}", "command": "./run"},
+                "variables": {"PATH": "A/@{target}"}
+            },
+            "B": {"variables": {"PATH": "@{A.PATH}"}, "after": ["A"]}
+        }
+        targets = [{"target": "t1"}, {"target": "t2"}, {"target": "t3"}]
+
+        with tempfile.TemporaryDirectory() as directory:
+            merge_cache.build(stages, targets, merge_cache.MergeCache(directory))
+
+            targets[1] = {"target": "t2", "overrides": {"A": {"variables": {"PATH": "X"}}}}
+            cache = merge_cache.MergeCache(directory)
+            output, _ = merge_cache.build(stages, targets, cache)
+
+        self.assertEqual((2, 1), (cache.hits, cache.misses))
+        self.assertEqual(list(Builder(stages, targets).build().items()), list(output.items()))
+
+    def test_prune_keeps_unrelated_files(self):
+        """Pruning removes stale entries only, not other JSON files in the directory."""
+        stages = {"A": {"run": {"command": "./run"}}}
+        with tempfile.TemporaryDirectory() as directory:
+            other = os.path.join(directory, "stages.json")
+            with open(other, "w", encoding="utf-8") as f:
+                f.write("{}")
+            cache = merge_cache.MergeCache(directory)
+            merge_cache.build(stages, [{"target": "t1"}], cache)
+            _, keys = merge_cache.build(stages, [{"target": "t2"}], cache)
+            self.assertEqual(1, cache.prune(keys))
+            remaining = sorted(os.listdir(directory))
+        self.assertEqual(sorted(["stages.json", f"{keys[0]}.json"]), remaining)
+
+    def test_entries_of_older_builder_are_not_reused(self):
+        """Entries cached under an older Builder output version miss."""
+        stages = {"A": {"run": {"command": "./run"}}}
+        self.assertEqual(builder.OUTPUT_VERSION, merge_cache.CACHE_VERSION)
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch.object(merge_cache, "CACHE_VERSION", builder.OUTPUT_VERSION - 1):
+                merge_cache.build(stages, [{"target": "t1"}], merge_cache.MergeCache(directory))
+            cache = merge_cache.MergeCache(directory)
+            merge_cache.build(stages, [{"target": "t1"}], cache)
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
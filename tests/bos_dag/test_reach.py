@@ -0,0 +1,96 @@
+"""Unit tests for the reachability index and stage selection."""
+
+import os
+import random
+
+from src.dag import reach, store
+from src.dag.graph import Graph
+
+from .helpers import TempDirTestCase
+from .test_store import stage
+
+
+def walk(start: int, step) -> set:
+    """Return the nodes reachable from ``start`` by repeatedly following ``step``."""
+    seen = {start}
+    stack = [start]
+    while stack:
+        for i in step(stack.pop()):
+            if i not in seen:
+                seen.add(i)
+                stack.append(i)
+    return seen
+
+
+class TestReach(TempDirTestCase):
+    """Test interval labels, selectors and the on-disk cache."""
+
+    def setUp(self):
+        super().setUp()
+        # Two targets: A -> B -> C and A -> D, with t2:A also waiting for t1:B.
+        self.stages = {}
+        for target in ("t1", "t2"):
+            self.stages.update({
+                f"{target}:A": stage(),
+                f"{target}:B": stage([f"{target}:A"]),
+                f"{target}:C": stage([f"{target}:B"]),
+                f"{target}:D": stage([f"{target}:A"]),
+            })
+        self.stages["t2:A"]["after"] = ["t1:B"]
+        self.index = reach.ReachIndex.from_graph(Graph.from_dict(self.stages))
+
+    def select(self, **selectors) -> list:
+        """Return the names selected from the test stages."""
+        return reach.select(self.index, **selectors)
+
+    def test_labels_match_graph_walk(self):
+        """Descendants and ancestors from the labels equal those of a plain walk."""
+        rng = random.Random(7)
+        for _ in range(50):
+            count = rng.randint(1, 60)
+            stages = {
+                f"n{i}": stage([f"n{j}" for j in range(i) if rng.random() < 0.1])
+                for i in range(count)
+            }
+            graph = Graph.from_dict(stages)
+            index = reach.ReachIndex.from_graph(graph)
+            for i in range(count):
+                self.assertEqual(walk(i, graph.children), index.descendants([i]))
+                self.assertEqual(walk(i, graph.parents), index.ancestors([i]))
+
+    def test_only_with_deps_and_children(self):
+        """--only selects exact names or globs, extended upstream or downstream."""
+        self.assertEqual(["t1:B", "t2:B"], self.select(only="*:B"))
+        self.assertEqual(["t1:A", "t1:B", "t1:C"], self.select(only="t1:C", with_deps=True))
+        self.assertEqual(
+            ["t1:B", "t1:C", "t2:A", "t2:B", "t2:C", "t2:D"],
+            self.select(only="t1:B", with_children=True)
+        )
+        self.assertRaises(ValueError, self.select, only="t3:*")
+        self.assertRaises(ValueError, self.select, only="t1:X")
+
+    def test_start_end_range(self):
+        """--start/--end select downstream, upstream, or the paths between them."""
+        self.assertEqual(["t1:C", "t2:C"], self.select(start="*:C"))
+        self.assertEqual(["t1:A", "t1:D"], self.select(end="t1:D"))
+        self.assertEqual(
+            ["t1:A", "t1:B", "t2:A", "t2:B", "t2:C"], self.select(start="t1:A", end="t2:C")
+        )
+        self.assertEqual([], self.select(start="t1:D", end="t1:C"))
+
+    def test_cached_index(self):
+        """The index is saved next to the merged file and rebuilt when the file changes."""
+        merged = os.path.join(self.tmp.name, "merged.jsonl")
+        cached = os.path.join(self.tmp.name, "merged.reach")
+        store.write(merged, self.stages, store.JSONL)
+
+        index = reach.open_index(merged, cached)
+        self.assertTrue(os.path.exists(cached))
+        loaded = reach.ReachIndex.load(cached, reach.source_of(merged))
+        self.assertEqual(index.names, loaded.names)
+        self.assertEqual(index.descendants([0]), loaded.descendants([0]))
+
+        del self.stages["t1:D"]
+        store.write(merged, self.stages, store.JSONL)
+        os.utime(merged, ns=(0, 0))
+        self.assertNotIn("t1:D", reach.open_index(merged, cached).names)
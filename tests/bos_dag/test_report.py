@@ -0,0 +1,83 @@
+"""Unit tests for the SQLite report database."""
+
+import json
+import os
+import unittest
+
+from src.dag import events, report  # Make sure PYTHONPATH includes project root
+from src.dag.journal import Journal
+
+from .helpers import TempDirTestCase
+
+
+class TestReport(TempDirTestCase):
+    """Test ingesting journals and collect results."""
+
+    def setUp(self):
+        super().setUp()
+        self.db_path = os.path.join(self.tmp.name, "report.db")
+
+    def write_journal(self, records) -> str:
+        """Write (kind, node, timestamp, returncode) records as a journal."""
+        path = os.path.join(self.tmp.name, "merged.journal")
+        with Journal(path) as journal:
+            for record in records:
+                journal.record(events.Event(*record))
+        return path
+
+    def test_journal_and_collect_merge(self):
+        """Journal timing and collect status of one run end up in the same row."""
+        journal = self.write_journal([
+            (events.SUBMITTED, "t1:A", 100.0),
+            (events.FINISHED, "t1:A", 104.0, 0),
+            (events.SUBMITTED, "t1:B", 104.0),
+            (events.FAILED, "t1:B", 105.0, 2),
+        ])
+        analyzed = os.path.join(self.tmp.name, "analyzed.json")
+        with open(analyzed, "w", encoding="utf-8") as f:
+            json.dump({"t1:A": {"status": "passed", "filename": "a.log", "rules": []}}, f)
+
+        with report.ReportDB(self.db_path) as db:
+            db.ingest("run1", report.journal_rows(journal))
+            db.ingest("run1", report.analyzed_rows(analyzed))
+            (row,) = db.stage_history("t1", "A")
+            (failed,) = db.stage_history("t1", "B")
+
+        self.assertEqual(("run1", events.FINISHED, 4.0, "passed", "a.log"),
+                         (row["run_id"], row["run_status"], row["duration"],
+                          row["post_status"], row["filename"]))
+        self.assertEqual((events.FAILED, 2), (failed["run_status"], failed["returncode"]))
+
+    def test_duration_from_last_start(self):
+        """A node's duration covers its last run, not its wait in the queue or retries."""
+        journal = self.write_journal([
+            (events.SUBMITTED, "t:A", 100.0),
+            (events.STARTED, "t:A", 102.0),
+            (events.RETRYING, "t:A", 103.0, 1),
+            (events.STARTED, "t:A", 106.0),
+            (events.FINISHED, "t:A", 107.5, 0),
+        ])
+        self.assertEqual(1.5, report.journal_rows(journal)["t:A"]["duration"])
+
+    def test_history_uses_latest_success(self):
+        """The history view holds each stage's latest successful duration."""
+        with report.ReportDB(self.db_path) as db:
+            db.ingest("run1", {"t:A": {"run_status": events.FINISHED, "duration": 3.0}})
+            db.ingest("run2", {"t:A": {"run_status": events.FAILED, "duration": 1.0},
+                               "t:B": {"run_status": events.FINISHED, "duration": 7.0}})
+            self.assertEqual(["run1", "run2"], db.runs())
+
+        history = report.load_history(self.db_path)
+        self.assertEqual({"t:A": 3.0, "t:B": 7.0}, history.durations)
+
+    def test_batches(self):
+        """Runs larger than a batch are written completely."""
+        rows = {f"t:S{i}": {"run_status": events.FINISHED} for i in range(report.BATCH_SIZE + 10)}
+        with report.ReportDB(self.db_path) as db:
+            self.assertEqual(len(rows), db.ingest("run1", rows))
+            (count,) = db.connection.execute("SELECT COUNT(*) FROM stages").fetchone()
+        self.assertEqual(len(rows), count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Unit tests for post output validation rules."""
+
+import os
+import tempfile
+import unittest
+
+from src.dag import rules  # Make sure PYTHONPATH includes project root
+
+LOG = b"""\
+Compiling design
+Warning-[LINT] unused signal
+Warning-[LINT] width mismatch
+UVM_ERROR count: 0
+Simulation complete
+0 error 2 warning
+"""
+
+
+class TestRules(unittest.TestCase):
+    """Test rule evaluation over a log."""
+
+    def scan(self, *specs) -> list:
+        """Scan the sample log with the given rules."""
+        return rules.RuleSet(specs).scan(LOG)
+
+    def test_require_and_forbid(self):
+        """Required patterns must appear; forbidden ones must not."""
+        require, forbid = self.scan(
+            {"type": "require", "pattern": "^Simulation complete$"},
+            {"type": "forbid", "pattern": "FATAL"},
+        )
+        self.assertTrue(require.passed)
+        self.assertEqual([{"line": 5, "text": "Simulation complete"}], require.evidence)
+        self.assertTrue(forbid.passed)
+
+        (forbid,) = self.scan({"type": "forbid", "pattern": "width"})
+        self.assertFalse(forbid.passed)
+        self.assertEqual(3, forbid.evidence[0]["line"])
+
+    def test_threshold(self):
+        """Every number captured by a threshold rule must be within its bounds."""
+        errors, both, missing = self.scan(
+            {"type": "threshold", "pattern": r"(\d+) error", "max": 0},
+            {"type": "threshold", "pattern": r"(\d+) error (\d+) warning", "max": 0},
+            {"type": "threshold", "pattern": r"(\d+) timing violations", "max": 0},
+        )
+        self.assertTrue(errors.passed)
+        self.assertFalse(both.passed)
+        self.assertEqual("0 error 2 warning", both.evidence[0]["text"])
+        self.assertFalse(missing.passed)
+
+    def test_count_and_overlapping_rules(self):
+        """Rules matching the same line are all counted."""
+        count, lint = self.scan(
+            {"type": "count", "pattern": "^Warning-", "max": 1},
+            {"type": "count", "pattern": "LINT", "min": 2, "max": 2},
+        )
+        self.assertEqual(2, count.count)
+        self.assertFalse(count.passed)
+        self.assertTrue(lint.passed)
+
+    def test_rules_apply_to_single_lines(self):
+        """A pattern that could span lines does not match across them or hide the next line."""
+        spanning, unused = self.scan(
+            {"type": "forbid", "pattern": r"design\s+Warning"},
+            {"type": "require", "pattern": "unused"},
+        )
+        self.assertTrue(spanning.passed)
+        self.assertEqual([{"line": 2, "text": "Warning-[LINT] unused signal"}], unused.evidence)
+
+    def test_check_file(self):
+        """Files are scanned through a memory map; empty files are handled."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "out.log")
+            ruleset = rules.compile_rules([{"type": "require", "pattern": "complete"}])
+            with open(path, "wb") as f:
+                f.write(LOG)
+            self.assertTrue(ruleset.check(path)[0])
+            with open(path, "wb"):
+                pass
+            self.assertFalse(ruleset.check(path)[0])
+
+    def test_invalid_rule(self):
+        """Unknown rule types are rejected."""
+        with self.assertRaises(ValueError):
+            rules.RuleSet([{"type": "maybe", "pattern": "x"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
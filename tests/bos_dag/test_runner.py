@@ -0,0 +1,270 @@
+"""Unit tests for DAG Runner scheduling and execution."""
+
+import asyncio
+import gzip
+import os
+import time
+
+from src.dag import events
+from src.dag.history import History
+from src.dag.journal import Journal
+from src.dag.logs import LogCapture
+from src.dag.stamps import StampStore
+from src.dag import runner
+from src.dag.runner import Runner  # Make sure PYTHONPATH includes project root
+
+from .helpers import TempDirTestCase, stage
+
+
+class TestRunner(TempDirTestCase):
+    """Test DAG Runner execution order."""
+
+    def setUp(self):
+        super().setUp()
+        self.log = os.path.join(self.tmp.name, "order.txt")
+
+    def read_order(self) -> list:
+        """Return the stage names in the order they wrote to the log."""
+        with open(self.log, encoding="utf-8") as f:
+            return f.read().split()
+
+    def test_chain_runs_in_dependency_order(self):
+        """Each stage of a chain starts only after its parent completed."""
+        dct = {
+            "t:A": stage("echo A >> order.txt", self.tmp.name),
+            "t:B": stage("echo B >> order.txt", self.tmp.name, ["t:A"]),
+            "t:C": stage("echo C >> order.txt", self.tmp.name, ["t:B"]),
+        }
+        runs = Runner.create_from_dict(dct)
+        runs.launch(max_workers=2)
+
+        self.assertEqual(["A", "B", "C"], self.read_order())
+        self.assertTrue(all(n.executed for n in runs.nodes.values()))
+
+    def test_async_engine_runs_in_dependency_order(self):
+        """The async engine honours dependencies like the process pool does."""
+        dct = {
+            "t:A": stage("echo A >> order.txt", self.tmp.name),
+            "t:B": stage("echo B >> order.txt", self.tmp.name, ["t:A"]),
+            "t:C": stage("echo C >> order.txt", self.tmp.name, ["t:B"]),
+        }
+        Runner.create_from_dict(dct).launch(max_workers=2, engine="async")
+
+        self.assertEqual(["A", "B", "C"], self.read_order())
+
+    def test_stream_events(self):
+        """Each node reports submitted, started and finished/failed events in order."""
+        dct = {
+            "t:ok": stage("true", self.tmp.name),
+            "t:bad": stage("exit 3", self.tmp.name, ["t:ok"]),
+        }
+
+        async def consume():
+            return [e async for e in Runner.create_from_dict(dct).stream()]
+
+        received = asyncio.run(consume())
+        kinds = [(e.kind, e.node) for e in received]
+
+        self.assertEqual([
+            (events.SUBMITTED, "t:ok"),
+            (events.STARTED, "t:ok"),
+            (events.FINISHED, "t:ok"),
+            (events.SUBMITTED, "t:bad"),
+            (events.STARTED, "t:bad"),
+            (events.FAILED, "t:bad"),
+        ], kinds)
+        self.assertEqual(3, received[-1].returncode)
+        self.assertEqual(sorted(e.timestamp for e in received), [e.timestamp for e in received])
+
+    def test_incremental_skips_up_to_date_stages(self):
+        """Unchanged stages are skipped; a changed input re-runs the stage and its children."""
+        source = os.path.join(self.tmp.name, "source.txt")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("v1")
+        dct = {
+            "t:A": stage("echo A >> order.txt", self.tmp.name),
+            "t:B": stage("echo B >> order.txt", self.tmp.name, ["t:A"]),
+            "t:C": stage("echo C >> order.txt", self.tmp.name),
+        }
+        dct["t:B"]["inputs"] = [source]
+        stamps = StampStore(checksum=True)
+
+        def run_incremental():
+            runs = Runner.create_from_dict(dct)
+            runs.skip_up_to_date(stamps)
+            runs.launch(max_workers=1, stamps=stamps)
+
+        run_incremental()
+        run_incremental()
+        self.assertEqual(["A", "B", "C"], sorted(self.read_order()))
+
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("v2")
+        dct["t:A"]["command"]["command"] = "echo A2 >> order.txt"
+        run_incremental()
+        self.assertEqual(["A2", "B"], self.read_order()[3:])
+
+    def test_resume_from_journal(self):
+        """A resumed run skips nodes the journal recorded as finished."""
+        journal_path = os.path.join(self.tmp.name, "merged.journal")
+        dct = {
+            "t:A": stage("echo A >> order.txt", self.tmp.name),
+            "t:B": stage("echo B >> order.txt", self.tmp.name, ["t:A"]),
+            "t:C": stage("exit 1", self.tmp.name, ["t:B"]),
+        }
+        with Journal(journal_path) as journal:
+            Runner.create_from_dict(dct).launch(max_workers=1, listeners=[journal.record])
+        # Simulate a crash in the middle of writing a record.
+        with open(journal_path, "a", encoding="utf-8") as f:
+            f.write('{"kind": "fini')
+
+        self.assertEqual({"t:A", "t:B"}, Journal.completed(journal_path))
+
+        dct["t:C"] = stage("echo C >> order.txt", self.tmp.name, ["t:B"])
+        runs = Runner.create_from_dict(dct)
+        self.assertEqual(2, runs.restore(Journal.completed(journal_path)))
+        runs.launch(max_workers=1)
+        self.assertEqual(["A", "B", "C"], self.read_order())
+
+    def test_keep_going_skips_descendants_of_failed_node(self):
+        """Descendants of a failed node are skipped while independent branches run."""
+        dct = {
+            "t:A": stage("exit 1", self.tmp.name),
+            "t:B": stage("echo B >> order.txt", self.tmp.name, ["t:A"]),
+            "t:C": stage("echo C >> order.txt", self.tmp.name, ["t:B"]),
+            "t:D": stage("echo D >> order.txt", self.tmp.name),
+        }
+        for engine in ("process", "async"):
+            runs = Runner.create_from_dict(dct)
+            with self.assertLogs(runner.logger, "INFO") as logged:
+                summary = runs.launch(max_workers=2, engine=engine)
+
+            self.assertEqual({"success": 1, "failed": 1, "skipped": 2, "cancelled": 0}, summary)
+            self.assertEqual(runner.SKIPPED, runs.nodes["t:C"].status)
+            completed = [line for line in logged.output if "Completed: " in line]
+            self.assertEqual(1, len(completed))
+            self.assertIn("t:D", completed[0])
+        self.assertEqual(["D", "D"], self.read_order())
+
+    def test_fail_fast_cancels_running_nodes(self):
+        """With fail-fast, running nodes are cancelled and nothing new is submitted."""
+        dct = {
+            "t:slow": stage("sleep 30", self.tmp.name),
+            "t:bad": stage("sleep 0.2; exit 1", self.tmp.name),
+            "t:next": stage("echo next >> order.txt", self.tmp.name, ["t:slow"]),
+        }
+        for engine in ("process", "async"):
+            runs = Runner.create_from_dict(dct)
+            start = time.monotonic()
+            summary = runs.launch(max_workers=2, engine=engine, on_failure=runner.FAIL_FAST)
+
+            self.assertLess(time.monotonic() - start, 10)
+            self.assertEqual({"success": 0, "failed": 1, "skipped": 1, "cancelled": 1}, summary)
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_resources_limit_concurrency(self):
+        """Stages sharing a single license never overlap, even with free workers."""
+        command = "echo start >> order.txt; sleep 0.2; echo end >> order.txt"
+        dct = {f"t:{i}": stage(command, self.tmp.name) for i in range(3)}
+        for data in dct.values():
+            data["resources"] = {"license.vcs": 1}
+
+        for engine in ("process", "async"):
+            Runner.create_from_dict(dct).launch(
+                max_workers=3, engine=engine, capacity={"license.vcs": 1}
+            )
+        self.assertEqual(["start", "end"] * 6, self.read_order())
+
+    def test_log_capture(self):
+        """Each node's output goes to its own log file; only the last lines stay in memory."""
+        dct = {"t:A": stage("seq 1 1000; exit 2", self.tmp.name)}
+        dct["t:A"]["post"] = {"directory": self.tmp.name, "command": "echo post"}
+        for engine in ("process", "async"):
+            logs = LogCapture(os.path.join(self.tmp.name, engine), compress=True, tail_lines=3)
+            runs = Runner.create_from_dict(dct)
+            runs.launch(max_workers=1, engine=engine, logs=logs)
+
+            self.assertEqual(["998", "999", "1000"], list(runs.tails["t:A"]))
+            with gzip.open(logs.path_for("t:A"), "rt", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertEqual(1001, len(lines))
+            self.assertTrue(lines[0].startswith("=== cd "))
+
+    def test_timeout_kills_process_group(self):
+        """A stage over its timeout is killed with its children and exits with 124."""
+        dct = {
+            "t:slow": stage("(sleep 30; echo late >> order.txt) & sleep 30", self.tmp.name),
+            "t:next": stage("echo next >> order.txt", self.tmp.name, ["t:slow"]),
+        }
+        dct["t:slow"]["timeout"] = 0.5
+        for engine in ("process", "async"):
+            received = []
+            runs = Runner.create_from_dict(dct)
+            start = time.monotonic()
+            summary = runs.launch(max_workers=2, engine=engine, listeners=[received.append])
+
+            self.assertLess(time.monotonic() - start, 10)
+            self.assertEqual({"success": 0, "failed": 1, "skipped": 1, "cancelled": 0}, summary)
+            failed = [e for e in received if e.kind == events.FAILED]
+            self.assertEqual([("t:slow", 124)], [(e.node, e.returncode) for e in failed])
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_retry_until_success(self):
+        """A flaky stage is retried after its backoff without holding up other ready work."""
+        flaky = "echo try >> tries.txt; [ $(wc -l < tries.txt) -ge 3 ]"
+        dct = {
+            "t:flaky": stage(flaky, self.tmp.name),
+            "t:child": stage("echo child >> order.txt", self.tmp.name, ["t:flaky"]),
+            "t:other": stage("echo other >> order.txt", self.tmp.name),
+        }
+        dct["t:flaky"].update(retries=3, retry_backoff=0.1)
+        for engine in ("process", "async"):
+            tries = os.path.join(self.tmp.name, "tries.txt")
+            if os.path.exists(tries):
+                os.remove(tries)
+            received = []
+            summary = Runner.create_from_dict(dct).launch(
+                max_workers=1, engine=engine, listeners=[received.append]
+            )
+
+            self.assertEqual({"success": 3, "failed": 0, "skipped": 0, "cancelled": 0}, summary)
+            retried = [e.node for e in received if e.kind == events.RETRYING]
+            self.assertEqual(["t:flaky", "t:flaky"], retried)
+            started = [e.node for e in received if e.kind == events.STARTED]
+            self.assertEqual(3, started.count("t:flaky"))
+        self.assertEqual(["other", "child"] * 2, self.read_order())
+
+    def test_retries_exhausted(self):
+        """A stage failing more often than its retries allow fails after the last attempt."""
+        dct = {"t:bad": stage("echo try >> order.txt; exit 1", self.tmp.name)}
+        dct["t:bad"]["retries"] = 2
+        for engine in ("process", "async"):
+            summary = Runner.create_from_dict(dct).launch(max_workers=1, engine=engine)
+            self.assertEqual(1, summary["failed"])
+        self.assertEqual(["try"] * 6, self.read_order())
+
+    def test_lightweight_nodes_share_a_shell(self):
+        """Lightweight nodes run in one shell session but keep their own outcome and log."""
+        dct = {f"t:{i}": stage("echo $$ >> order.txt", self.tmp.name) for i in range(6)}
+        dct["t:bad"] = stage("echo broken; exit 4", self.tmp.name)
+        dct["t:after"] = stage("echo $$ >> order.txt", self.tmp.name, ["t:0"])
+        for data in dct.values():
+            data["lightweight"] = True
+        received = []
+        logs = LogCapture(os.path.join(self.tmp.name, "logs"))
+        runs = Runner.create_from_dict(dct)
+        summary = runs.launch(max_workers=1, logs=logs, listeners=[received.append])
+
+        self.assertEqual({"success": 7, "failed": 1, "skipped": 0, "cancelled": 0}, summary)
+        self.assertEqual(1, len(set(self.read_order())))
+        self.assertEqual("broken", runs.tails["t:bad"][-1])
+        failed = [(e.node, e.returncode) for e in received if e.kind == events.FAILED]
+        self.assertEqual([("t:bad", 4)], failed)
+
+    def test_short_history_batches(self):
+        """With batch_under, nodes recorded as short are batched; others run on their own."""
+        dct = {f"t:{i}": stage("echo $$ >> order.txt", self.tmp.name) for i in range(4)}
+        history = History({"t:0": 0.01, "t:1": 0.01, "t:2": 0.01, "t:3": 5.0})
+        Runner.create_from_dict(dct).launch(max_workers=1, history=history, batch_under=0.5)
+
+        self.assertEqual(2, len(set(self.read_order())))
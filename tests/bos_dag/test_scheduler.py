@@ -0,0 +1,64 @@
+"""Unit tests for critical-path scheduling priorities."""
+
+import unittest
+
+from src.dag import scheduler
+from src.dag.history import History
+from src.dag.resources import ResourcePool, parse_capacity
+from src.dag.runner import Runner  # Make sure PYTHONPATH includes project root
+
+
+def dag(edges: dict) -> Runner:
+    """Build a Runner from a {name: [parents]} mapping of no-op stages."""
+    return Runner.create_from_dict({
+        name: {"command": {}, "post": {}, "before": [], "after": parents}
+        for name, parents in edges.items()
+    })
+
+
+class TestScheduler(unittest.TestCase):
+    """Test ready-queue ordering."""
+
+    def test_critical_path_uses_recorded_durations(self):
+        """A node's rank is its duration plus the longest rank among its children."""
+        runs = dag({"t:A": [], "t:B": ["t:A"], "t:C": ["t:A"], "t:D": ["t:B", "t:C"]})
+        history = History({"t:A": 1.0, "t:B": 5.0, "t:C": 2.0, "t:D": 3.0})
+
+        ranks = scheduler.critical_path(runs.graph, history)
+
+        self.assertEqual({"t:A": 9.0, "t:B": 8.0, "t:C": 5.0, "t:D": 3.0}, ranks)
+
+    def test_unknown_stages_use_median(self):
+        """Stages without history fall back to the median of known durations."""
+        history = History({"t:A": 1.0, "t:B": 3.0, "t:C": 10.0})
+        self.assertEqual(3.0, history.estimate("t:new"))
+        self.assertEqual(History.DEFAULT_DURATION, History().estimate("t:new"))
+
+    def test_ready_queue_policies(self):
+        """Critical-path pops the longest remaining path first, lifo the latest push."""
+        runs = dag({"t:short": [], "t:long": [], "t:tail": ["t:long"]})
+        history = History({"t:short": 4.0, "t:long": 2.0, "t:tail": 3.0})
+        roots = [runs.nodes["t:long"], runs.nodes["t:short"]]
+
+        for policy, expected in ((scheduler.CRITICAL_PATH, "t:long"), (scheduler.LIFO, "t:short")):
+            ready = scheduler.ReadyQueue.create(policy, runs.graph, history)
+            for node in roots:
+                ready.push(node)
+            self.assertEqual(expected, ready.pop().name)
+
+    def test_backfill_with_resources(self):
+        """A node that does not fit is passed over for a smaller one, and kept queued."""
+        runs = dag({"t:big": [], "t:small": []})
+        runs.nodes["t:big"].resources = {"cores": 8}
+        runs.nodes["t:small"].resources = {"cores": 1}
+        pool = ResourcePool({"cores": 4})
+        ready = scheduler.ReadyQueue({"t:big": 2.0, "t:small": 1.0})
+        ready.push(runs.nodes["t:big"])
+        ready.push(runs.nodes["t:small"])
+
+        self.assertRaises(ValueError, pool.check, runs.nodes.values())
+        self.assertEqual("t:small", ready.pop(pool.fits).name)
+        self.assertIsNone(ready.pop(pool.fits))
+        self.assertEqual(1, len(ready))
+        self.assertEqual({"cores": 4.0, "license.vcs": 2.0},
+                         parse_capacity("cores=4, license.vcs=2"))
@@ -0,0 +1,106 @@
+"""Unit tests for the serve daemon and its clients."""
+
+import os
+import threading
+from unittest import mock
+
+from src.dag import main, serve, store
+from src.dag.parser import parser
+
+from .helpers import TempDirTestCase, stage
+
+
+class TestServe(TempDirTestCase):
+    """Test run requests sent to a daemon listening on a temporary socket."""
+
+    def setUp(self):
+        super().setUp()
+        self.socket = os.path.join(self.tmp.name, "serve.sock")
+        self.merged = os.path.join(self.tmp.name, "merged.json")
+        self.stages = {
+            "t:A": stage("echo A >> order.txt", self.tmp.name),
+            "t:B": stage("echo B >> order.txt", self.tmp.name, ["t:A"]),
+            "t:C": stage("exit 3", self.tmp.name),
+        }
+        store.write(self.merged, self.stages)
+        self.server = serve.DaemonServer(self.socket, 2, main.run)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, *argv) -> int:
+        """Send a run request with the given options to the daemon."""
+        args = parser.parse_args(["run", "-s", self.merged, *argv])
+        return serve.request(self.socket, args, "all")
+
+    def read_order(self) -> list:
+        """Return the stage names in the order they wrote to the log."""
+        with open(os.path.join(self.tmp.name, "order.txt"), encoding="utf-8") as f:
+            return f.read().split()
+
+    def test_requests_share_cached_dag(self):
+        """Requests run on the daemon's pool and reuse the loaded merged file until it changes."""
+        self.assertEqual(0, self.request("--only", "t:B", "--with-deps"))
+        cached = self.server.cache.get(self.merged)
+        self.assertEqual(1, self.request())
+        self.assertIs(cached, self.server.cache.get(self.merged))
+        self.assertEqual(["A", "B", "A", "B"], self.read_order())
+
+        del self.stages["t:C"]
+        store.write(self.merged, self.stages)
+        os.utime(self.merged, ns=(0, 0))
+        self.assertEqual(0, self.request())
+        self.assertNotIn("t:C", self.server.cache.get(self.merged).stages)
+
+    def test_no_daemon(self):
+        """Without a listening daemon the client reports that it did not run anything."""
+        args = parser.parse_args(["run", "-s", self.merged])
+        self.assertIsNone(serve.request(os.path.join(self.tmp.name, "none.sock"), args, "all"))
+
+    def test_paths_resolve_from_client_directory(self):
+        """Relative options, stage directories and inputs resolve from the client's cwd."""
+        with open(os.path.join(self.tmp.name, "rel.json"), "w", encoding="utf-8") as f:
+            f.write('{"t:A": {"command": {"command": "echo run >> runs.txt"}, "post": {},'
+                    ' "before": [], "after": [], "inputs": ["in*.txt"]}}')
+
+        def run_from_tmp() -> int:
+            with open(os.path.join(self.tmp.name, "in.txt"), "a", encoding="utf-8") as f:
+                f.write("change\n")
+            args = parser.parse_args(["run", "-s", "rel.json", "--incremental", "--checksum"])
+            with mock.patch.object(serve.os, "getcwd", return_value=self.tmp.name):
+                return serve.request(self.socket, args, "all")
+
+        self.assertEqual(0, run_from_tmp())
+        self.assertEqual(0, run_from_tmp())
+        with open(os.path.join(self.tmp.name, "runs.txt"), encoding="utf-8") as f:
+            self.assertEqual(["run", "run"], f.read().split())
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp.name, "rel.stamps.json")))
+
+    def test_stages_run_with_client_environment(self):
+        """Stages see the client's environment, batched or not, not the daemon's."""
+        self.stages["t:E"] = stage('echo "$WORKSCRIPT_TEST" >> env.txt', self.tmp.name)
+        store.write(self.merged, self.stages)
+        for value in ("first", "second"):
+            with mock.patch.dict(os.environ, {"WORKSCRIPT_TEST": value}):
+                self.request("--only", "t:E")
+        self.assertNotIn("WORKSCRIPT_TEST", os.environ)
+        with open(os.path.join(self.tmp.name, "env.txt"), encoding="utf-8") as f:
+            self.assertEqual(["first", "second"], f.read().split())
+
+    def test_daemon_of_another_user_is_not_used(self):
+        """A daemon running as someone else gets no request; the client runs in-process."""
+        args = parser.parse_args(["run", "-s", self.merged])
+        with mock.patch.object(serve, "peer_uid", return_value=os.getuid() + 1):
+            self.assertIsNone(serve.request(self.socket, args, "all"))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "order.txt")))
+
+    def test_fail_fast_runs_in_process(self):
+        """--fail-fast runs skip the daemon, which cannot stop running stages."""
+        args = parser.parse_args(["run", "-s", self.merged, "--fail-fast"])
+        with mock.patch.object(main.serve, "request") as request, \
+                mock.patch.object(main, "run", return_value=0) as run:
+            self.assertEqual(0, main.dispatch(args))
+        request.assert_not_called()
+        run.assert_called_once_with(args, "all")
@@ -0,0 +1,34 @@
+"""Unit tests for reading and writing merged DAG files."""
+
+import os
+
+from src.dag import store  # Make sure PYTHONPATH includes project root
+
+from .helpers import TempDirTestCase
+
+
+def stage(after=None) -> dict:
+    """Return a minimal merged-style stage entry."""
+    return {"command": {}, "post": {}, "before": [], "after": after or [], "variables": {}}
+
+
+class TestStore(TempDirTestCase):
+    """Test merged file formats."""
+
+    def setUp(self):
+        super().setUp()
+        self.stages = {
+            "t:A": stage(),
+            "t:B": stage(["t:A"]),
+            "t:C": stage(["t:B"]),
+            "t:D": stage(["t:A"]),
+        }
+
+    def test_formats_round_trip(self):
+        """Both formats load back to the same stages, in order."""
+        for fmt in store.FORMATS:
+            path = os.path.join(self.tmp.name, f"merged.{fmt}")
+            store.write(path, self.stages, fmt)
+
+            self.assertEqual(fmt, store.detect_format(path))
+            self.assertEqual(list(self.stages.items()), list(store.load(path).items()))
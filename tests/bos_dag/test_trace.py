@@ -0,0 +1,57 @@
+"""Unit tests for per-node run tracing."""
+
+import unittest
+
+from src.dag.runner import Runner  # Make sure PYTHONPATH includes project root
+from src.dag.trace import Trace
+
+from .helpers import TempDirTestCase, stage
+
+
+class TestTrace(TempDirTestCase):
+    """Test timing, usage and the trace exports."""
+
+    def setUp(self):
+        super().setUp()
+        self.dct = {
+            "t:A": stage("sleep 0.1", self.tmp.name),
+            "t:B": stage("sleep 0.3", self.tmp.name, ["t:A"]),
+            "t:C": stage("true", self.tmp.name, ["t:A"]),
+        }
+
+    def check_order(self, trace: Trace) -> None:
+        """Every node went through ready, dispatched, started and ended in order."""
+        self.assertEqual(set(self.dct), set(trace.timings))
+        for timing in trace.timings.values():
+            self.assertLessEqual(timing.ready, timing.dispatched)
+            self.assertLessEqual(timing.started, timing.ended)
+            self.assertEqual(0, timing.returncode)
+            self.assertIsNotNone(timing.worker)
+
+    def test_process_engine(self):
+        """The process engine records CPU time and peak RSS from wait4."""
+        trace = Trace()
+        runs = Runner.create_from_dict(self.dct)
+        runs.launch(max_workers=2, trace=trace)
+
+        self.check_order(trace)
+        self.assertGreater(trace.timings["t:A"].max_rss_kb, 0)
+        self.assertIsNotNone(trace.timings["t:A"].cpu)
+        self.assertEqual(["t:A", "t:B"], trace.critical_path(runs.graph))
+        self.assertIn("Critical path: 2 stages", trace.summary(runs.graph))
+
+        stages = [e for e in trace.chrome_events() if e["ph"] == "X"]
+        self.assertEqual(3, len(stages))
+        self.assertGreaterEqual(stages[1]["ts"], stages[0]["ts"] + stages[0]["dur"])
+
+    def test_async_engine(self):
+        """The async engine records timing per concurrency slot."""
+        trace = Trace()
+        Runner.create_from_dict(self.dct).launch(max_workers=2, engine="async", trace=trace)
+
+        self.check_order(trace)
+        self.assertEqual({"slot 0", "slot 1"}, {t.worker for t in trace.timings.values()})
+
+
+if __name__ == "__main__":
+    unittest.main()
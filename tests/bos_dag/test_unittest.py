@@ -59,3 +59,87 @@ class TestDAG(unittest.TestCase):
         builder = Builder(dct, targets)
         output = builder.build()
         self.assertEqual(expected, output[":B"]["variables"]["variable1"])
+
+    def test_inputs_substitution(self):
+        """Test declared inputs are expanded and only serialized when present."""
+        dct = {
+            "A": {
+                "variables": {
+                    "PATH": "work/@{target}"
+                },
+                "inputs": ["${PATH}/filelist.f"]
+            },
+            "B": {}
+        }
+        builder = Builder(dct, [{"target": "t"}])
+        output = builder.build()
+        self.assertEqual(["work/t/filelist.f"], output["t:A"]["inputs"])
+        self.assertNotIn("inputs", output["t:B"])
+
+    def test_resources_override(self):
+        """Test per-target resource overrides are merged into the stage resources."""
+        dct = {
+            "A": {
+                "resources": {"cores": 8, "license.vcs": 1}
+            }
+        }
+        targets = [{"target": "t", "overrides": {"A": {"resources": {"cores": 2}}}}]
+        output = Builder(dct, targets).build()
+        self.assertEqual({"cores": 2, "license.vcs": 1}, output["t:A"]["resources"])
+
+    def test_post_rules_pass_through(self):
+        """Test post rules are copied as-is while the other post fields are rendered."""
+        rules = [{"type": "forbid", "pattern": "^Error-"}]
+        dct = {
+            "A": {
+                "variables": {"OUT": "@{target}.log"},
+                "post": {"output": "${OUT}", "rules": rules}
+            }
+        }
+        output = Builder(dct, [{"target": "t"}]).build()
+        self.assertEqual({"output": "t.log", "rules": rules}, output["t:A"]["post"])
+
+    def test_policy_override(self):
+        """Test timeout and retries are copied to every target and replaced per target."""
+        dct = {"A": {"timeout": 3600, "retries": 1}}
+        targets = [
+            {"target": "t1"},
+            {"target": "t2", "overrides": {"A": {"timeout": 60, "retry_backoff": 5}}},
+        ]
+        output = Builder(dct, targets).build()
+        self.assertEqual((3600, 1), (output["t1:A"]["timeout"], output["t1:A"]["retries"]))
+        self.assertNotIn("retry_backoff", output["t1:A"])
+        self.assertEqual((60, 1, 5), tuple(
+            output["t2:A"][key] for key in ("timeout", "retries", "retry_backoff")
+        ))
+
+    def test_chained_cross_reference(self):
+        """Test references to references resolve regardless of stage order."""
+        dct = {
+            "A": {"variables": {"PATH": "@{B.PATH}"}, "run": {"command": "cd ${PATH}"}},
+            "B": {"variables": {"PATH": "@{C.PATH}"}},
+            "C": {"variables": {"PATH": "work/@{target}"}}
+        }
+        output = Builder(dct, [{"target": "t"}]).build()
+        self.assertEqual("work/t", output["t:A"]["variables"]["PATH"])
+        self.assertEqual("cd work/t", output["t:A"]["command"]["command"])
+
+    def test_parallel_build_matches_serial(self):
+        """Test expanding targets across processes gives the same output."""
+        dct = {
+            "A": {
+                "run": {"directory": "${PATH}", "command": "${CMD}"},
+                "variables": {"PATH": "A/@{target}", "CMD": "./run"}
+            },
+            "B": {
+                "variables": {"PATH": "@{A.PATH}"},
+                "post": {"directory": "${PATH}", "output": "out.txt"},
+                "after": ["A"]
+            }
+        }
+        targets = [{"target": f"t{i}"} for i in range(10)]
+        targets[3]["overrides"] = {"A": {"variables": {"CMD": "./other"}}}
+        serial = Builder(dct, targets).build()
+        parallel = Builder(dct, targets, jobs=2).build()
+        self.assertEqual(list(serial.items()), list(parallel.items()))
+        self.assertEqual("./other", serial["t3:A"]["command"]["command"])
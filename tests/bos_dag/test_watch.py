@@ -0,0 +1,117 @@
+"""Unit tests for watch mode."""
+
+import asyncio
+import os
+import time
+import unittest
+
+from src.dag.runner import Runner  # Make sure PYTHONPATH includes project root
+from src.dag.watch import WatchSession
+
+from .helpers import TempDirTestCase
+
+
+class TestWatch(TempDirTestCase):
+    """Test re-running the stages affected by file changes."""
+
+    def setUp(self):
+        super().setUp()
+        self.order = os.path.join(self.tmp.name, "order.txt")
+        for name in "abc":
+            os.mkdir(os.path.join(self.tmp.name, name))
+
+    def stage(self, name: str, command: str, after=None, inputs=None) -> dict:
+        """Return a stage running in its own directory and logging its name."""
+        data = {
+            "command": {"directory": os.path.join(self.tmp.name, name.lower()),
+                        "command": f"{command}echo {name} >> {self.order}"},
+            "post": {},
+            "after": after or [],
+        }
+        if inputs:
+            data["inputs"] = inputs
+        return data
+
+    def read_order(self) -> list:
+        """Return the stage names in the order they completed."""
+        if not os.path.exists(self.order):
+            return []
+        with open(self.order, encoding="utf-8") as f:
+            return f.read().split()
+
+    def touch(self, *parts) -> None:
+        """Write a file below the temporary directory."""
+        with open(os.path.join(self.tmp.name, *parts), "a", encoding="utf-8") as f:
+            f.write(f"{time.time()}\n")
+
+    async def wait_until(self, count: int) -> None:
+        """Wait until ``count`` stage runs were logged."""
+        deadline = time.monotonic() + 10
+        while len(self.read_order()) < count:
+            self.assertLess(time.monotonic(), deadline, self.read_order())
+            await asyncio.sleep(0.05)
+
+    def run_scenario(self, session: WatchSession, scenario) -> None:
+        """Run the session alongside a scenario coroutine, then stop it."""
+        async def main():
+            task = asyncio.ensure_future(session.run())
+            try:
+                await scenario()
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        asyncio.run(main())
+
+    def check_rerun_descendants(self, polling: bool) -> None:
+        """
+        A change re-runs the touched stage and its descendants only; the stage's
+        own output in its directory does not trigger it again.
+        """
+        dag = Runner.create_from_dict({
+            "t:A": self.stage("A", "date > out.log; "),
+            "t:B": self.stage("B", "", ["t:A"]),
+            "t:C": self.stage("C", ""),
+        })
+        session = WatchSession(dag, max_workers=2, debounce=0.1, polling=polling, interval=0.1)
+
+        async def scenario():
+            await self.wait_until(3)
+            await asyncio.sleep(0.3)
+            self.touch("a", "design.v")
+            self.touch("a", "design.v")
+            await self.wait_until(5)
+            await asyncio.sleep(0.5)
+
+        self.run_scenario(session, scenario)
+        self.assertEqual(["A", "B"], self.read_order()[3:])
+
+    def test_inotify(self):
+        """Changes are picked up through inotify."""
+        self.check_rerun_descendants(polling=False)
+
+    def test_polling(self):
+        """Changes are picked up by polling."""
+        self.check_rerun_descendants(polling=True)
+
+    def test_stale_run_cancelled(self):
+        """Changing a running stage's input cancels and restarts it before its children."""
+        source = os.path.join(self.tmp.name, "c", "rtl.v")
+        self.touch("c", "rtl.v")
+        dag = Runner.create_from_dict({
+            "t:A": self.stage("A", "sleep 1; ", inputs=[source]),
+            "t:B": self.stage("B", "", ["t:A"]),
+        })
+        session = WatchSession(dag, debounce=0.1)
+
+        async def scenario():
+            await asyncio.sleep(0.4)
+            self.touch("c", "rtl.v")
+            await self.wait_until(2)
+            await asyncio.sleep(0.3)
+
+        self.run_scenario(session, scenario)
+        self.assertEqual(["A", "B"], self.read_order())
+
+
+if __name__ == "__main__":
+    unittest.main()